@@ -65,133 +65,191 @@ from oemof.tools import helpers
 
 import oemof.solph as solph
 import oemof.outputlib as outputlib
-import oemof.graph as grph
-import networkx as nx
 
 import logging
 import os
+import sys
+import time
 import pandas as pd
-import pprint as pp
-import timeit
-start_time = timeit.default_timer()
 
-try:
-    import matplotlib.pyplot as plt
-except ImportError:
-    plt = None
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from model_tools import model_report, profiling, results_store, solver as sweep_solver, sparse_lp
 
-solver = 'cbc'
+import flexchp_builder
+
+solver = 'cbc'  # 'highs' solves the model in memory, falls back to cbc
 debug = False  # Set number_of_timesteps to 3 to get a readable lp-file.
 number_of_time_steps = 8760 # 24*7*8  # 8 weeks, every hour
 solver_verbose = False  # show/hide solver output
-
-# initiate the logger (see the API docs for more information)
-logger.define_logging(logfile='flex_CHB_A1.log',
-                      screen_level=logging.INFO,
-                      file_level=logging.DEBUG)
-
-logging.info('Initialize the energy system')
-date_time_index = pd.date_range('1/1/2030', periods=number_of_time_steps,
-                                freq='H')
-
-energysystem = solph.EnergySystem(timeindex=date_time_index)
-
-# Read data file
-try:
-    filename = os.path.join(os.path.dirname(__file__), 'demand_profile_A_nominal_20180912.csv')
-except:
-    print('ERROR: __file__ is not defined')
-    filename = 'demand_profile_A_nominal_20180912.csv'
-data = pd.read_csv(filename)
-
-##########################################################################
-# Create oemof object
-##########################################################################
-
-logging.info('Create oemof objects')
-
-bgas = solph.Bus(label="natural_gas")
-bel = solph.Bus(label="electricity")
-bth = solph.Bus(label='heat')
-
-energysystem.add(bgas, bel, bth)
-
-energysystem.add(solph.Sink(label='excess_bel', inputs={bel: solph.Flow(variable_costs=0)}))
-energysystem.add(solph.Sink(label='excess_bth', inputs={bth: solph.Flow(variable_costs=0)}))
-energysystem.add(solph.Source(label='shortage_bel', outputs={bel: solph.Flow(variable_costs=100)}))
-energysystem.add(solph.Source(label='shortage_bth', outputs={bth: solph.Flow(variable_costs=100)}))
-energysystem.add(solph.Source(label='rgas', outputs={bgas: solph.Flow(
-    nominal_value=100000, summed_max=1e8, variable_costs=22)}))  # [MWh_th], [EUR/MWh_th]
-energysystem.add(solph.Source(label='residual_el', outputs={bel: solph.Flow(
-    actual_value=data['neg_residual'], nominal_value=150, fixed=True)}))  # [MW_el], [EUR/MWh_el]
-energysystem.add(solph.Sink(label='demand_el', inputs={bel: solph.Flow(
-    actual_value=data['demand_el'], fixed=True, nominal_value=1200)}))  # [MW_el]
-energysystem.add(solph.Sink(label='demand_th', inputs={bth: solph.Flow(
-    actual_value=data['demand_th'], fixed=True, nominal_value=1000)}))  # [MW_th]
-
-energysystem.add(solph.Transformer(
-    label="CHP",
-    inputs={bgas: solph.Flow()},
-    outputs={bel: solph.Flow(nominal_value=1200, variable_costs=1),  # [MW_th], [-]
-             bth: solph.Flow(nominal_value=650, variable_costs=1)},  # [MW_el], [-]
-    conversion_factors={bel: 0.60, bth: 0.25}))  # eta_el=60% und Brennstoffausnutzungsgrad omega = 85% --> eta_th=25%
-
-energysystem.add(solph.Transformer(
-    label='boiler',
-    inputs={bgas: solph.Flow()},
-    outputs={bth: solph.Flow(nominal_value=650, variable_costs=1)},  # [MW_th], [-]
-    conversion_factors={bth: 0.9}))
-
-energysystem.add(solph.Transformer(
-    label='P2H',
-    inputs={bel: solph.Flow()},
-    outputs={bth: solph.Flow(nominal_value=150, variable_costs=0)},  # [MW_th], [-]
-    conversion_factors={bth: 0.99}))
-
-storage_th = solph.components.GenericStorage(
-    nominal_capacity=500,  # [MWh_th]
-    label='storage_th',
-    inputs={bth: solph.Flow(nominal_value=500, variable_costs=0)},  # [MW_th]
-    outputs={bth: solph.Flow(nominal_value=500)},  # [MW_th]
-    capacity_loss=0.001, initial_capacity=0,
-    inflow_conversion_factor=1, outflow_conversion_factor=0.99)
-
-energysystem.add(storage_th)
-
-##########################################################################
-# Optimise the energy system and plot the results
-##########################################################################
-
-logging.info('Optimise the energy system')
-
-model = solph.Model(energysystem)
-
-if debug:
-    filename = os.path.join(
-        helpers.extend_basic_path('lp_files'), 'flexCHB_A1.lp')
-    logging.info('Store lp-file in {0}.'.format(filename))
-    model.write(filename, io_options={'symbolic_solver_labels': True})
-
-# if tee_switch is true solver messages will be displayed
-logging.info('Solve the optimization problem')
-model.solve(solver=solver, solve_kwargs={'tee': solver_verbose})
-
-logging.info('Store the energy system with the results.')
-
-energysystem.results['main'] = outputlib.processing.results(model)
-energysystem.results['meta'] = outputlib.processing.meta_results(model)
-
-energysystem.dump(dpath="dumps", filename="flexCHB_A1_dumps.oemof")
-
-stop_time = timeit.default_timer()
-run_time_in_sec = stop_time - start_time
-print("***Run Time***")
-if run_time_in_sec < 60:
-    print("%6.2f" %run_time_in_sec, "seconds")
-elif run_time_in_sec >= 60:
-    run_time_in_min = run_time_in_sec/60
-    residual_seconds = run_time_in_sec%60
-    print("%6.0f" %run_time_in_min, "min,", "%6.0f" %residual_seconds, "s")
-else:
-    print("%12.2f" %run_time_in_sec, "seconds")
-
+check_scaling = False  # check the coefficients for bad scaling before solving
+lp_backend = 'solph'  # 'sparse' builds the LP as scipy.sparse matrices and solves it with HiGHS
+
+
+def read_input():
+    r"""
+    Reads the demand profiles.
+
+    Returns
+    -------
+    inputs : dict
+        'data', the keyword arguments of `create_energysystem` besides the
+        timeindex.
+    """
+    return {'data': flexchp_builder.read_demand()}
+
+
+def create_energysystem(data, timeindex, initial_capacity=None, share_of_year=1):
+    r"""
+    Creates the energy system.
+
+    Parameters
+    ----------
+    data : pd.DataFrame
+        Demand profiles, one row per timestep of timeindex.
+
+    timeindex : pd.DatetimeIndex
+
+    initial_capacity : dict
+        Initial capacity of the storages by label, relative to their
+        nominal capacity.
+
+    share_of_year : float
+        Share of the modeled year, the summed maximum of the gas supply is
+        scaled with it.
+
+    Returns
+    -------
+    energysystem : solph.EnergySystem
+    """
+    initial_capacity = initial_capacity or {}
+
+    energysystem = solph.EnergySystem(timeindex=timeindex)
+
+    ##########################################################################
+    # Create oemof object
+    ##########################################################################
+
+    logging.info('Create oemof objects')
+
+    bgas = solph.Bus(label="natural_gas")
+    bel = solph.Bus(label="electricity")
+    bth = solph.Bus(label='heat')
+
+    energysystem.add(bgas, bel, bth)
+
+    energysystem.add(solph.Sink(label='excess_bel', inputs={bel: solph.Flow(variable_costs=0)}))
+    energysystem.add(solph.Sink(label='excess_bth', inputs={bth: solph.Flow(variable_costs=0)}))
+    energysystem.add(solph.Source(label='shortage_bel', outputs={bel: solph.Flow(variable_costs=100)}))
+    energysystem.add(solph.Source(label='shortage_bth', outputs={bth: solph.Flow(variable_costs=100)}))
+    energysystem.add(solph.Source(label='rgas', outputs={bgas: solph.Flow(
+        nominal_value=100000, summed_max=1e8 * share_of_year, variable_costs=22)}))  # [MWh_th], [EUR/MWh_th]
+    energysystem.add(solph.Source(label='residual_el', outputs={bel: solph.Flow(
+        actual_value=data['neg_residual'], nominal_value=150, fixed=True)}))  # [MW_el], [EUR/MWh_el]
+    energysystem.add(solph.Sink(label='demand_el', inputs={bel: solph.Flow(
+        actual_value=data['demand_el'], fixed=True, nominal_value=1200)}))  # [MW_el]
+    energysystem.add(solph.Sink(label='demand_th', inputs={bth: solph.Flow(
+        actual_value=data['demand_th'], fixed=True, nominal_value=1000)}))  # [MW_th]
+
+    energysystem.add(solph.Transformer(
+        label="CHP",
+        inputs={bgas: solph.Flow()},
+        outputs={bel: solph.Flow(nominal_value=1200, variable_costs=1),  # [MW_th], [-]
+                 bth: solph.Flow(nominal_value=650, variable_costs=1)},  # [MW_el], [-]
+        conversion_factors={bel: 0.60, bth: 0.25}))  # eta_el=60% und Brennstoffausnutzungsgrad omega = 85% --> eta_th=25%
+
+    energysystem.add(solph.Transformer(
+        label='boiler',
+        inputs={bgas: solph.Flow()},
+        outputs={bth: solph.Flow(nominal_value=650, variable_costs=1)},  # [MW_th], [-]
+        conversion_factors={bth: 0.9}))
+
+    energysystem.add(solph.Transformer(
+        label='P2H',
+        inputs={bel: solph.Flow()},
+        outputs={bth: solph.Flow(nominal_value=150, variable_costs=0)},  # [MW_th], [-]
+        conversion_factors={bth: 0.99}))
+
+    storage_th = solph.components.GenericStorage(
+        nominal_capacity=500,  # [MWh_th]
+        label='storage_th',
+        inputs={bth: solph.Flow(nominal_value=500, variable_costs=0)},  # [MW_th]
+        outputs={bth: solph.Flow(nominal_value=500)},  # [MW_th]
+        capacity_loss=0.001, initial_capacity=initial_capacity.get('storage_th', 0),
+        inflow_conversion_factor=1, outflow_conversion_factor=0.99)
+
+    energysystem.add(storage_th)
+
+    return energysystem
+
+
+if __name__ == '__main__':
+    profiling.start('flexCHB_A1')
+
+    # initiate the logger (see the API docs for more information)
+    logger.define_logging(logfile='flex_CHB_A1.log',
+                          screen_level=logging.INFO,
+                          file_level=logging.DEBUG)
+
+    logging.info('Initialize the energy system')
+    date_time_index = pd.date_range('1/1/2030', periods=number_of_time_steps,
+                                    freq='H')
+
+    with profiling.phase('data load'):
+        inputs = read_input()
+    with profiling.phase('energy system build'):
+        energysystem = create_energysystem(timeindex=date_time_index, **inputs)
+
+    ##########################################################################
+    # Optimise the energy system and plot the results
+    ##########################################################################
+
+    logging.info('Optimise the energy system')
+
+    unsupported = sparse_lp.get_unsupported(energysystem) if lp_backend == 'sparse' else []
+    if unsupported:
+        logging.warning('Build the model with solph, the sparse LP does not support: {0}'.format(
+            ', '.join(unsupported)))
+
+    if lp_backend == 'sparse' and not unsupported:
+        with profiling.phase('model construction'):
+            lp = sparse_lp.build_lp(energysystem)
+        logging.info('Solve the optimization problem')
+        with profiling.phase('solver'):
+            solution = sparse_lp.solve_lp(lp, disp=solver_verbose)
+
+        logging.info('Store the energy system with the results.')
+
+        with profiling.phase('results processing'):
+            energysystem.results = sparse_lp.get_results(lp, solution)
+    else:
+        with profiling.phase('model construction'):
+            model = solph.Model(energysystem)
+
+        if debug:
+            filename = os.path.join(
+                helpers.extend_basic_path('lp_files'), 'flexCHB_A1.lp')
+            logging.info('Store lp-file in {0}.'.format(filename))
+            with profiling.phase('lp write'):
+                model.write(filename, io_options={'symbolic_solver_labels': True})
+
+        # if tee_switch is true solver messages will be displayed
+        logging.info('Solve the optimization problem')
+        report = model_report.check_model(
+            model, 'flexCHB_A1', os.path.join("dumps", "flexCHB_A1_model_report.json"),
+            coefficients=check_scaling, solver=solver)
+        with profiling.phase('solver'):
+            starttime = time.time()
+            solved_with = sweep_solver.solve_model(model, solver, solve_kwargs={'tee': solver_verbose})
+            model_report.record_solve_time(report, time.time() - starttime, solved_with)
+
+        logging.info('Store the energy system with the results.')
+
+        with profiling.phase('results processing'):
+            energysystem.results['main'] = outputlib.processing.results(model)
+            energysystem.results['meta'] = outputlib.processing.meta_results(model)
+
+    with profiling.phase('dump'):
+        energysystem.dump(dpath="dumps", filename="flexCHB_A1_dumps.oemof")
+        results_store.write_results(energysystem.results, os.path.join("dumps", "flexCHB_A1_dumps.results"))
+
+    profiling.write(os.path.join("dumps", "flexCHB_A1_profile.json"))
@@ -0,0 +1,412 @@
+# -*- coding: utf-8 -*-
+
+"""
+General description
+-------------------
+
+Builder of the flexCHP energy systems of System A.
+
+The parameter table `data_public/parameter.csv` is compiled once into a
+`SystemDefinition`: the values are converted to float and checked against
+their valid ranges, e.g. a wacc or a capacity loss between 0 and 1. The
+definition is kept in memory and pickled to System_A/cache/, keyed by the
+content of the table, so later runs and all variants built in one process
+skip parsing it.
+
+`build_energysystem` creates the energy system of a definition. The
+variants of the apps are flags:
+
+* invest=False: dispatch of the combined cycle CHP (GenericCHP) and the
+  storages with the nominal values of the table (app_flexCHP.py).
+* invest=True: investment in an extraction turbine CHP and both storages
+  with the annuities of capex, life time and wacc of the table
+  (app_flexCHP_invest.py).
+
+Every variant checks that the table contains the parameters it needs:
+
+    definition = flexchp_builder.load_definition()
+    data = flexchp_builder.read_demand()
+    dispatch = flexchp_builder.build_energysystem(definition, data, timeindex)
+    invest = flexchp_builder.build_energysystem(definition, data, timeindex, invest=True)
+
+"""
+
+from collections import namedtuple
+import hashlib
+import logging
+import os
+import pickle
+import sys
+
+import numpy as np
+import pandas as pd
+
+import oemof.solph as solph
+from oemof.tools import economics
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from model_tools import timeseries_store
+
+
+PARAMETER_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                              'data_public', 'parameter.csv')
+DEMAND_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                           'demand_profile_A_nominal_20180912.csv')
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache')
+
+# valid ranges of the parameters by prefix of their name
+RANGES = [('wacc_', 0, 1),
+          ('capacity_loss_', 0, 1),
+          ('init_capacity_', 0, 1),
+          ('conversion_factor_', 0, None),
+          ('conv_factor_', 0, None),
+          ('inflow_conv_factor_', 0, None),
+          ('outflow_conv_factor_', 0, None),
+          ('nom_val_', 0, None),
+          ('nom_capacity_', 0, None),
+          ('sum_max_', 0, None),
+          ('capex_', 0, None),
+          ('life_time_', 1, None)]
+
+COMMON_PARAMETERS = [
+    'var_costs_excess_bel', 'var_costs_excess_bth', 'var_costs_shortage_bel',
+    'var_costs_shortage_bth', 'nom_val_gas', 'sum_max_gas', 'var_costs_gas',
+    'nom_val_neg_residual', 'nom_val_demand_el', 'nom_val_demand_th',
+    'nom_val_out_boiler', 'var_costs_boiler', 'conversion_factor_boiler',
+    'nom_val_p2h_out_bth', 'var_costs_p2h_out_bth', 'conversion_factor_p2h',
+    'capacity_loss_storage_th', 'inflow_conv_factor_storage_th',
+    'outflow_conv_factor_storage_th', 'capacity_loss_storage_el',
+    'inflow_conv_factor_storage_el', 'outflow_conv_factor_storage_el']
+
+DISPATCH_PARAMETERS = COMMON_PARAMETERS + [
+    'nom_capacity_storage_th', 'init_capacity_storage_th',
+    'var_costs_input_bth_storage_th', 'var_costs_output_bth_storage_th',
+    'nom_val_input_bth_storage_th', 'nom_val_output_bth_storage_th',
+    'nom_capacity_storage_el', 'init_capacity_storage_el',
+    'var_costs_input_bel_storage_el', 'var_costs_output_bel_storage_el',
+    'nom_val_input_bel_storage_el', 'nom_val_output_bel_storage_el']
+
+INVEST_PARAMETERS = COMMON_PARAMETERS + [
+    'var_costs_chp_out_el', 'var_costs_chp_out_th', 'conversion_factor_chp_bel',
+    'conversion_factor_chp_bth', 'conv_factor_full_cond_chp'] + [
+    '{0}_{1}'.format(kind, component)
+    for component in ['chp', 'storage_th', 'storage_el']
+    for kind in ['capex', 'life_time', 'wacc']]
+
+# combined cycle extraction turbine of the dispatch variant
+GENERIC_CHP = {'H_L_FG_share_max': 0.19,
+               'P_max_woDH': 200,
+               'P_min_woDH': 80,
+               'Eta_el_max_woDH': 0.53,
+               'Eta_el_min_woDH': 0.43,
+               'Q_CW_min': 30,
+               'Beta': 0.19}
+
+SystemDefinition = namedtuple('SystemDefinition', ['parameters', 'units', 'digest'])
+
+# definitions of this process by path, modification time and size
+_definitions = {}
+
+
+def _parse(filename):
+    r"""
+    Reads the parameter table and converts the values to float.
+    """
+    # the first two lines describe the table
+    table = pd.read_csv(filename, header=2, index_col='var_name')
+    if table.index.duplicated().any():
+        raise ValueError('Duplicate parameters in {0}: {1}'.format(
+            filename, ', '.join(table.index[table.index.duplicated()])))
+
+    values = pd.to_numeric(table['value'], errors='coerce')
+    invalid = values.index[values.isnull()]
+    if len(invalid):
+        raise ValueError('Parameters without a numeric value in {0}: {1}'.format(
+            filename, ', '.join(invalid)))
+
+    return ({name: float(value) for name, value in values.items()},
+            {name: (None if pd.isnull(unit) else str(unit))
+             for name, unit in table['unit'].items()})
+
+
+def validate(parameters, required=()):
+    r"""
+    Checks that the required parameters exist and that all parameters are
+    in their valid range.
+
+    Raises
+    ------
+    ValueError
+        With all missing and invalid parameters.
+    """
+    errors = ['{0} is missing'.format(name) for name in required if name not in parameters]
+    for name, value in sorted(parameters.items()):
+        for prefix, lower, upper in RANGES:
+            if not name.startswith(prefix):
+                continue
+            if value < lower or (upper is not None and value > upper):
+                errors.append('{0} = {1} is not in [{2}, {3}]'.format(
+                    name, value, lower, 'inf' if upper is None else upper))
+            break
+
+    if errors:
+        raise ValueError('Invalid parameters: {0}.'.format('; '.join(errors)))
+
+
+def load_definition(filename=PARAMETER_FILE, cache_dir=CACHE_DIR):
+    r"""
+    Returns the definition of the parameter table.
+
+    Parameters
+    ----------
+    filename : path
+        Parameter table with the columns 'var_name', 'value' and 'unit'
+        below two lines of description.
+
+    cache_dir : path
+        Directory of the pickled definitions, None to always parse the
+        table.
+
+    Returns
+    -------
+    definition : SystemDefinition
+        'parameters' and 'units' by name and the 'digest' of the table.
+    """
+    filename = os.path.abspath(filename)
+    stat = os.stat(filename)
+    key = (filename, stat.st_mtime, stat.st_size)
+    if key in _definitions:
+        return _definitions[key]
+
+    with open(filename, 'rb') as f:
+        digest = hashlib.sha1(f.read()).hexdigest()
+
+    cache_file = (os.path.join(cache_dir, 'parameter_{0}.pkl'.format(digest))
+                  if cache_dir is not None else None)
+    if cache_file is not None and os.path.exists(cache_file):
+        with open(cache_file, 'rb') as f:
+            definition = pickle.load(f)
+    else:
+        parameters, units = _parse(filename)
+        validate(parameters)
+        definition = SystemDefinition(parameters, units, digest)
+        if cache_file is not None:
+            if not os.path.exists(cache_dir):
+                os.makedirs(cache_dir)
+            with open(cache_file, 'wb') as f:
+                pickle.dump(definition, f, protocol=pickle.HIGHEST_PROTOCOL)
+        logging.info('Compiled the parameters of {0}.'.format(filename))
+
+    _definitions[key] = definition
+
+    return definition
+
+
+def read_demand(filename=DEMAND_FILE):
+    r"""
+    Reads the demand profiles with the columns 'demand_el', 'demand_th' and
+    'neg_residual'. The profiles are read through the time series store.
+    """
+    return timeseries_store.read_csv(filename)
+
+
+def as_sequence(value):
+    r"""
+    Returns a parameter of a component for all timesteps.
+
+    A scalar becomes a solph sequence, which returns the value for every
+    timestep without storing it, so a constant parameter does not grow with
+    the number of timesteps. A sequence becomes a float array.
+    """
+    if np.isscalar(value):
+        return solph.plumbing.sequence(value)
+
+    return np.asarray(value, dtype=float)
+
+
+def _compact(value):
+    r"""
+    Returns the value of a constant solph sequence, otherwise the values as
+    float array.
+    """
+    if hasattr(value, 'default') and not value.default_changed:
+        return value.default
+
+    return np.asarray(value, dtype=float)
+
+
+def set_chp_alphas(chp):
+    r"""
+    Calculates the coefficients alpha of the fuel consumption of a
+    GenericCHP for all timesteps at once.
+
+    oemof solves a linear system for every index of the electrical
+    parameters and gets their number from their length, which is zero for
+    the sequences of `as_sequence`. If all parameters are constant, the
+    alphas are constant sequences as well.
+    """
+    flow = list(chp.electrical_output.values())[0]
+    P_min, P_max = _compact(flow.P_min_woDH), _compact(flow.P_max_woDH)
+    Eta_min, Eta_max = _compact(flow.Eta_el_min_woDH), _compact(flow.Eta_el_max_woDH)
+
+    # H_L_FG(P) = alpha_0 + alpha_1 * P through both points of operation
+    alpha_1 = (P_max / Eta_max - P_min / Eta_min) / (P_max - P_min)
+    alpha_0 = P_min / Eta_min - alpha_1 * P_min
+
+    chp._alphas = [as_sequence(alpha_0), as_sequence(alpha_1)]
+
+
+def _annuity(p, component):
+    return economics.annuity(p['capex_' + component], p['life_time_' + component],
+                             p['wacc_' + component])
+
+
+def build_energysystem(definition, data, timeindex, invest=False, initial_capacity=None,
+                       share_of_year=1):
+    r"""
+    Creates the energy system of a definition.
+
+    Parameters
+    ----------
+    definition : SystemDefinition
+        Return value of `load_definition`.
+
+    data : pd.DataFrame
+        Demand profiles, one row per timestep of timeindex.
+
+    timeindex : pd.DatetimeIndex
+
+    invest : bool
+        Invest in the CHP and the storages instead of the dispatch with
+        given nominal values.
+
+    initial_capacity : dict
+        Initial capacity of the storages by label, relative to their
+        nominal capacity. Defaults to the parameters. Not used with invest.
+
+    share_of_year : float
+        Share of the modeled year, the summed maximum of the gas supply is
+        scaled with it.
+
+    Returns
+    -------
+    energysystem : solph.EnergySystem
+    """
+    p = definition.parameters
+    validate(p, INVEST_PARAMETERS if invest else DISPATCH_PARAMETERS)
+    initial_capacity = initial_capacity or {}
+
+    energysystem = solph.EnergySystem(timeindex=timeindex)
+
+    logging.info('Create oemof objects')
+
+    bgas = solph.Bus(label="natural_gas")
+    bel = solph.Bus(label="electricity")
+    bth = solph.Bus(label='heat')
+
+    energysystem.add(bgas, bel, bth)
+
+    # Sources and sinks
+    energysystem.add(solph.Sink(
+        label='excess_bel',
+        inputs={bel: solph.Flow(variable_costs=p['var_costs_excess_bel'])}))
+    energysystem.add(solph.Sink(
+        label='excess_bth',
+        inputs={bth: solph.Flow(variable_costs=p['var_costs_excess_bth'])}))
+    energysystem.add(solph.Source(
+        label='shortage_bel',
+        outputs={bel: solph.Flow(variable_costs=p['var_costs_shortage_bel'])}))
+    energysystem.add(solph.Source(
+        label='shortage_bth',
+        outputs={bth: solph.Flow(variable_costs=p['var_costs_shortage_bth'])}))
+    energysystem.add(solph.Source(
+        label='rgas',
+        outputs={bgas: solph.Flow(nominal_value=p['nom_val_gas'],
+                                  summed_max=p['sum_max_gas'] * share_of_year,
+                                  variable_costs=p['var_costs_gas'])}))
+    energysystem.add(solph.Source(
+        label='residual_el',
+        outputs={bel: solph.Flow(actual_value=data['neg_residual'],
+                                 nominal_value=p['nom_val_neg_residual'],
+                                 fixed=True)}))
+    energysystem.add(solph.Sink(
+        label='demand_el',
+        inputs={bel: solph.Flow(actual_value=data['demand_el'],
+                                nominal_value=p['nom_val_demand_el'],
+                                fixed=True)}))
+    energysystem.add(solph.Sink(
+        label='demand_th',
+        inputs={bth: solph.Flow(actual_value=data['demand_th'],
+                                nominal_value=p['nom_val_demand_th'],
+                                fixed=True)}))
+
+    if invest:
+        energysystem.add(solph.components.ExtractionTurbineCHP(
+            label="CHP",
+            inputs={bgas: solph.Flow()},
+            outputs={bel: solph.Flow(variable_costs=p['var_costs_chp_out_el'],
+                                     investment=solph.Investment(
+                                         ep_costs=_annuity(p, 'chp'))),
+                     bth: solph.Flow(variable_costs=p['var_costs_chp_out_th'])},
+            conversion_factors={bel: p['conversion_factor_chp_bel'],
+                                bth: p['conversion_factor_chp_bth']},
+            conversion_factor_full_condensation={bel: p['conv_factor_full_cond_chp']}))
+    else:
+        #  combined_cycle_extraction_turbine
+        chp = solph.components.GenericCHP(
+            label='CHP',
+            fuel_input={bgas: solph.Flow(
+                H_L_FG_share_max=as_sequence(GENERIC_CHP['H_L_FG_share_max']))},
+            electrical_output={bel: solph.Flow(
+                P_max_woDH=as_sequence(GENERIC_CHP['P_max_woDH']),
+                P_min_woDH=as_sequence(GENERIC_CHP['P_min_woDH']),
+                Eta_el_max_woDH=as_sequence(GENERIC_CHP['Eta_el_max_woDH']),
+                Eta_el_min_woDH=as_sequence(GENERIC_CHP['Eta_el_min_woDH']))},
+            heat_output={bth: solph.Flow(
+                Q_CW_min=as_sequence(GENERIC_CHP['Q_CW_min']))},
+            Beta=as_sequence(GENERIC_CHP['Beta']),
+            back_pressure=False)
+        set_chp_alphas(chp)
+        energysystem.add(chp)
+
+    energysystem.add(solph.Transformer(
+        label='boiler',
+        inputs={bgas: solph.Flow()},
+        outputs={bth: solph.Flow(nominal_value=p['nom_val_out_boiler'],
+                                 variable_costs=p['var_costs_boiler'])},
+        conversion_factors={bth: p['conversion_factor_boiler']}))
+
+    energysystem.add(solph.Transformer(
+        label='P2H',
+        inputs={bel: solph.Flow()},
+        outputs={bth: solph.Flow(nominal_value=p['nom_val_p2h_out_bth'],
+                                 variable_costs=p['var_costs_p2h_out_bth'])},
+        conversion_factors={bth: p['conversion_factor_p2h']}))
+
+    for label, bus, kind in [('storage_th', bth, 'bth'), ('storage_el', bel, 'bel')]:
+        if invest:
+            storage = solph.components.GenericStorage(
+                label=label,
+                inputs={bus: solph.Flow()},
+                outputs={bus: solph.Flow()},
+                capacity_loss=p['capacity_loss_' + label],
+                inflow_conversion_factor=p['inflow_conv_factor_' + label],
+                outflow_conversion_factor=p['outflow_conv_factor_' + label],
+                investment=solph.Investment(ep_costs=_annuity(p, label)))
+        else:
+            storage = solph.components.GenericStorage(
+                nominal_capacity=p['nom_capacity_' + label],
+                label=label,
+                inputs={bus: solph.Flow(
+                    nominal_value=p['nom_val_input_{0}_{1}'.format(kind, label)],
+                    variable_costs=p['var_costs_input_{0}_{1}'.format(kind, label)])},
+                outputs={bus: solph.Flow(
+                    nominal_value=p['nom_val_output_{0}_{1}'.format(kind, label)],
+                    variable_costs=p['var_costs_output_{0}_{1}'.format(kind, label)])},
+                capacity_loss=p['capacity_loss_' + label],
+                initial_capacity=initial_capacity.get(label, p['init_capacity_' + label]),
+                inflow_conversion_factor=p['inflow_conv_factor_' + label],
+                outflow_conversion_factor=p['outflow_conv_factor_' + label])
+        energysystem.add(storage)
+
+    return energysystem
@@ -0,0 +1,268 @@
+# -*- coding: utf-8 -*-
+
+"""
+General description
+-------------------
+
+Rolling horizon dispatch of the flexCHP models.
+
+Instead of one problem for the whole year, the dispatch is optimised in
+windows of a few days one after another. Every window looks ahead by the
+overlap, but only the results of the window without the overlap are kept.
+The content of the storages at the end of the kept part is the initial
+content of the next window.
+
+In oemof 0.2 the initial capacity of a storage is also its content in the
+last timestep of the optimisation. So the storage has to be refilled at the
+end of the overlap, which is discarded, and is free at the end of the kept
+part. The summed maximum of the gas supply of every window is scaled with
+the share of the year of its kept part, so that the kept parts together do
+not use more gas than the whole year. As the overlap has to be supplied from
+this budget as well, the gas is limited more strictly than in a run of the
+whole year.
+
+The objective of the stitched results only contains the costs of the kept
+parts, the costs of the discarded overlaps are not counted.
+
+The results of all windows are stitched together onto the nodes of the first
+window and dumped like the results of the apps, so they can be analysed with
+plot_and_analyse_results_flexCHP.py.
+
+Usage: rolling_horizon.py [flexCHP|A1] [--window HOURS] [--overlap HOURS]
+                          [--backend solph|sparse]
+
+"""
+
+import argparse
+import importlib
+import logging
+import os
+import sys
+
+import pandas as pd
+
+from oemof.tools import logger
+import oemof.solph as solph
+import oemof.outputlib as outputlib
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from model_tools import profiling, results_store, solver as sweep_solver, sparse_lp
+
+
+APPS = {'flexCHP': 'app_flexCHP',
+        'A1': 'app_flexCHP_A1'}
+
+
+def get_windows(number_of_time_steps, window, overlap):
+    r"""
+    Returns the windows of the rolling horizon.
+
+    Returns
+    -------
+    windows : list of tuple
+        Position of the first timestep, after the last kept timestep and
+        after the last timestep of the overlap of every window.
+    """
+    if window <= 0 or overlap < 0:
+        raise ValueError('The window has to be positive and the overlap must not be negative.')
+
+    return [(start,
+             min(start + window, number_of_time_steps),
+             min(start + window + overlap, number_of_time_steps))
+            for start in range(0, number_of_time_steps, window)]
+
+
+def get_storage_contents(energysystem, results, position):
+    r"""
+    Returns the content of all storages at a position, relative to their
+    nominal capacity like the initial capacity of oemof.
+    """
+    contents = {}
+    for node in energysystem.nodes:
+        if not isinstance(node, solph.components.GenericStorage):
+            continue
+        if not node.nominal_capacity:
+            contents[node.label] = 0
+            continue
+        capacity = results[(node, None)]['sequences']['capacity'].iloc[position]
+        contents[node.label] = capacity / node.nominal_capacity
+
+    return contents
+
+
+def get_kept_costs(energysystem, results, kept):
+    r"""
+    Returns the variable costs of the flows in the first kept timesteps of
+    a window.
+    """
+    costs = 0
+    for key, flow in energysystem.flows().items():
+        if key not in results:
+            continue
+        values = results[key]['sequences']['flow'].values
+        costs += sum(values[t] * flow.variable_costs[t] for t in range(kept))
+
+    return costs
+
+
+def stitch_results(energysystem, window_results):
+    r"""
+    Joins the results of all windows to the results of one year.
+
+    The keys of the results of the later windows are replaced by the nodes
+    with the same labels of energysystem.
+
+    Parameters
+    ----------
+    energysystem : solph.EnergySystem
+        Energy system of the first window.
+
+    window_results : list of tuple
+        Results of every window and the number of kept timesteps.
+
+    Returns
+    -------
+    results : dict
+    """
+    nodes = {str(node.label): node for node in energysystem.nodes}
+    sequences = {}
+    scalars = {}
+    for results, kept in window_results:
+        for key, value in results.items():
+            key = (nodes[str(key[0])], nodes[str(key[1])] if key[1] is not None else None)
+            sequences.setdefault(key, []).append(value['sequences'].iloc[:kept])
+            scalars.setdefault(key, value['scalars'])
+
+    return {key: {'sequences': pd.concat(sequences[key]), 'scalars': scalars[key]}
+            for key in sequences}
+
+
+def run_rolling_horizon(create_energysystem, data, timeindex, window, overlap,
+                        solver='cbc', solver_verbose=False, backend='solph', **kwargs):
+    r"""
+    Optimises the dispatch in a rolling horizon.
+
+    Parameters
+    ----------
+    create_energysystem : callable
+        Function that creates the energy system from the data, the timeindex,
+        the initial capacity of the storages by label and the share of the
+        year, e.g. `app_flexCHP.create_energysystem`.
+
+    data : pd.DataFrame
+        Profiles of the whole year, one row per timestep of timeindex.
+
+    timeindex : pd.DatetimeIndex
+
+    window : int
+        Number of kept timesteps of every window.
+
+    overlap : int
+        Number of timesteps every window looks ahead.
+
+    backend : str
+        'solph' to build the windows with `solph.Model`, 'sparse' to build
+        them with `sparse_lp` if all components are supported.
+
+    kwargs :
+        Further keyword arguments of create_energysystem.
+
+    Returns
+    -------
+    energysystem : solph.EnergySystem
+        Energy system of the first window with the results of the whole
+        timeindex.
+    """
+    windows = get_windows(len(timeindex), window, overlap)
+    initial_capacity = None
+    first_energysystem = None
+    window_results = []
+    objective = 0
+    meta = None
+
+    for number, (start, end_kept, end) in enumerate(windows):
+        logging.info('Optimise window {0} of {1} ({2} to {3})'.format(
+            number + 1, len(windows), timeindex[start], timeindex[end_kept - 1]))
+
+        with profiling.phase('energy system build'):
+            energysystem = create_energysystem(
+                data=data.iloc[start:end].reset_index(drop=True),
+                timeindex=timeindex[start:end],
+                initial_capacity=initial_capacity,
+                share_of_year=(end_kept - start) / len(timeindex),
+                **kwargs)
+        if first_energysystem is None:
+            first_energysystem = energysystem
+
+        if backend == 'sparse' and not sparse_lp.get_unsupported(energysystem):
+            with profiling.phase('model construction'):
+                lp = sparse_lp.build_lp(energysystem)
+            with profiling.phase('solver'):
+                solution = sparse_lp.solve_lp(lp, disp=solver_verbose)
+            with profiling.phase('results processing'):
+                energysystem.results = sparse_lp.get_results(lp, solution)
+                results, meta = energysystem.results['main'], energysystem.results['meta']
+        else:
+            with profiling.phase('model construction'):
+                model = solph.Model(energysystem)
+            with profiling.phase('solver'):
+                sweep_solver.solve_model(model, solver, solve_kwargs={'tee': solver_verbose})
+            with profiling.phase('results processing'):
+                results = outputlib.processing.results(model)
+                meta = outputlib.processing.meta_results(model)
+
+        window_results.append((results, end_kept - start))
+        initial_capacity = get_storage_contents(energysystem, results, end_kept - start - 1)
+        objective += get_kept_costs(energysystem, results, end_kept - start)
+
+    meta['objective'] = objective
+    meta['rolling_horizon'] = {'window': window, 'overlap': overlap, 'windows': len(windows)}
+
+    first_energysystem.timeindex = timeindex
+    with profiling.phase('results processing'):
+        first_energysystem.results['main'] = stitch_results(first_energysystem, window_results)
+    first_energysystem.results['meta'] = meta
+
+    return first_energysystem
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Optimise the dispatch of a flexCHP model in a rolling horizon.')
+    parser.add_argument('app', nargs='?', default='flexCHP', choices=sorted(APPS),
+                        help='model to optimise')
+    parser.add_argument('--window', type=int, default=168,
+                        help='number of kept timesteps of every window')
+    parser.add_argument('--overlap', type=int, default=24,
+                        help='number of timesteps every window looks ahead')
+    parser.add_argument('--backend', default='solph', choices=['solph', 'sparse'],
+                        help='build the LP with solph or as sparse matrices')
+    parser.add_argument('--dump', default='flexCHB_A1_dumps',
+                        help='filename of the dump without extension')
+    args = parser.parse_args()
+
+    profiling.start('rolling_horizon_' + args.app)
+
+    logger.define_logging(logfile='flex_CHB_rolling_horizon.log',
+                          screen_level=logging.INFO,
+                          file_level=logging.DEBUG)
+
+    app = importlib.import_module(APPS[args.app])
+    date_time_index = pd.date_range('1/1/2030', periods=app.number_of_time_steps,
+                                    freq='H')
+
+    with profiling.phase('data load'):
+        inputs = app.read_input()
+
+    energysystem = run_rolling_horizon(
+        app.create_energysystem, timeindex=date_time_index,
+        window=args.window, overlap=args.overlap,
+        solver=app.solver, solver_verbose=app.solver_verbose, backend=args.backend,
+        **inputs)
+
+    logging.info('Store the energy system with the results.')
+    with profiling.phase('dump'):
+        energysystem.dump(dpath="dumps", filename=args.dump + ".oemof")
+        results_store.write_results(energysystem.results, os.path.join("dumps", args.dump + ".results"))
+
+    profiling.write(os.path.join("dumps", args.dump + "_profile.json"))
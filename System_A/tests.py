@@ -0,0 +1,30 @@
+import pandas as pd
+import oemof.solph as solph
+from rolling_horizon import get_windows, stitch_results
+
+
+def test_rolling_horizon_windows():
+    assert get_windows(10, 4, 2) == [(0, 4, 6), (4, 8, 10), (8, 10, 10)]
+    assert get_windows(8, 4, 0) == [(0, 4, 4), (4, 8, 8)]
+
+
+def create_window(flow):
+    energysystem = solph.EnergySystem(
+        timeindex=pd.date_range('1/1/2017', periods=len(flow), freq='h'))
+    bus = solph.Bus(label='bus')
+    source = solph.Source(label='source', outputs={bus: solph.Flow()})
+    energysystem.add(bus, source)
+    results = {(source, bus): {'sequences': pd.DataFrame({'flow': flow}),
+                               'scalars': pd.Series(dtype=float)}}
+    return energysystem, results
+
+
+def test_stitch_results_of_kept_timesteps():
+    energysystem, first = create_window([1., 2., 3.])
+    _, second = create_window([4., 5., 6.])
+
+    results = stitch_results(energysystem, [(first, 2), (second, 1)])
+
+    source, bus = energysystem.groups['source'], energysystem.groups['bus']
+    assert list(results) == [(source, bus)]
+    assert list(results[(source, bus)]['sequences']['flow']) == [1., 2., 4.]
@@ -0,0 +1,240 @@
+"""
+Command line interface of the System B analysis.
+
+Usage: cli.py <command> [options]
+
+Commands:
+
+  run <experiment_config>          Run the whole pipeline, see main.py.
+  solve <experiment_config>        Build and solve the model.
+  postprocess <experiment_config>  Calculate the kpis of the solved model.
+  plot <experiment_config>         Plot the results of the solved model.
+  startup [--all-systems]          Measure the cold-start time of the
+                                   commands.
+
+Every command imports only the modules it uses, so neither `solve` nor
+`postprocess` imports matplotlib. `postprocess` and
+`plot` import oemof.solph (and with it pyomo) and oemof.outputlib only
+when they run, to restore and view the results of the dump, which holds
+solph nodes. These deferred imports are listed in COMMANDS.
+
+`startup` starts every command with --import-only in a new interpreter,
+which imports the modules of the command and its deferred imports and
+exits, and reports the elapsed time and the heavy libraries that have been
+imported. So the time is the cold start of the real command up to the
+point where it reads its input. With --all-systems, the entry points of
+ENTRY_POINTS of the other systems are measured the same way by importing
+them. They solve models and need solph right away, so they have no lazy
+imports. The Summer School and Desalination scripts run their model at
+import and are not measured.
+
+"""
+
+__copyright__ = "Reiner Lemoine Institut"
+__license__ = "GPLv3"
+__author__ = "c-moeller, jnnr"
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+
+# module, function and the modules imported only when it runs of every
+# command
+COMMANDS = {'run': ('main', 'main', ['preprocess', 'model_dessau', 'postprocess', 'plot',
+                                     'oemof.outputlib']),
+            'solve': ('model_dessau', 'run_model_dessau', []),
+            'postprocess': ('postprocess', 'postprocess', ['oemof.solph', 'oemof.outputlib']),
+            'plot': ('plot', 'create_plots', ['oemof.solph', 'oemof.outputlib'])}
+
+# directory relative to the repository and module of the entry points of
+# the other systems
+ENTRY_POINTS = {'System_A/app_flexCHP': ('System_A', 'app_flexCHP'),
+                'System_A/app_flexCHP_A1': ('System_A', 'app_flexCHP_A1'),
+                'System_A/rolling_horizon': ('System_A', 'rolling_horizon'),
+                'Oman/main_2': (os.path.join('System_C', 'Oman', 'src'), 'main_2')}
+
+REPOSITORY = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+# libraries that are reported by `startup` if a command imports them
+HEAVY_MODULES = ['oemof.solph', 'pyomo.environ', 'matplotlib.pyplot', 'networkx',
+                 'oemof_visio', 'scipy.optimize']
+
+
+def import_command(command):
+    r"""
+    Imports the function of a command.
+    """
+    import importlib
+
+    module_name, func_name, _ = COMMANDS[command]
+
+    return getattr(importlib.import_module(module_name), func_name)
+
+
+def import_deferred(command):
+    r"""
+    Imports the modules that a command imports only when it runs.
+    """
+    import importlib
+
+    for module_name in COMMANDS[command][2]:
+        importlib.import_module(module_name)
+
+
+def run_command(command, config_path, **kwargs):
+    r"""
+    Runs a command for an experiment config.
+
+    Parameters
+    ----------
+    command : str
+        Key of COMMANDS.
+
+    config_path : path
+        Path of the experiment config
+
+    kwargs
+        Options of the pipeline, only used by 'run'.
+    """
+    from oemof.tools import logger
+    import helpers
+
+    sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+    from model_tools import profiling
+
+    config_path, results_dir = helpers.setup_experiment(config_path)
+    func = import_command(command)
+    if command == 'run':
+        return func(config_path, results_dir, **kwargs)
+
+    logger.define_logging(logpath=os.path.join(results_dir, 'optimisation_results'))
+    profiling.start('system_b_' + command)
+    result = func(config_path=config_path, results_dir=results_dir)
+    profiling.write(os.path.join(results_dir, 'profile_{0}.json'.format(command)))
+
+    return result
+
+
+def get_imported_heavy_modules():
+    return [name for name in HEAVY_MODULES if name in sys.modules]
+
+
+# imports a module given as argument and prints the heavy modules
+IMPORT_SCRIPT = ('import importlib, json, sys; sys.path.insert(0, "."); '
+                 'importlib.import_module(sys.argv[1]); '
+                 'print(json.dumps([name for name in sys.argv[2:] if name in sys.modules]))')
+
+
+def _time_start(command_line, cwd, repeat):
+    times = []
+    for _ in range(repeat):
+        starttime = time.time()
+        output = subprocess.check_output(command_line, cwd=cwd)
+        times.append(time.time() - starttime)
+
+    return {'seconds': min(times),
+            'heavy_modules': json.loads(output.decode().splitlines()[-1])}
+
+
+def measure_startup(commands=('solve', 'postprocess', 'plot'), repeat=3, entry_points=()):
+    r"""
+    Measures the cold-start time of commands, i.e. the time from starting
+    the interpreter until the modules of the command and its deferred
+    imports are imported.
+
+    Parameters
+    ----------
+    commands : list of str
+        Keys of COMMANDS.
+
+    repeat : int
+        Number of starts per command, the fastest one is reported.
+
+    entry_points : list of str
+        Keys of ENTRY_POINTS, whose modules are imported in their directory.
+
+    Returns
+    -------
+    timings : dict
+        'seconds' and the imported 'heavy_modules' of every command.
+    """
+    timings = {}
+    for command in commands:
+        timings[command] = _time_start(
+            [sys.executable, os.path.abspath(__file__), command, '--import-only'],
+            os.path.dirname(os.path.abspath(__file__)), repeat)
+    for name in entry_points:
+        directory, module_name = ENTRY_POINTS[name]
+        timings[name] = _time_start(
+            [sys.executable, '-c', IMPORT_SCRIPT, module_name] + HEAVY_MODULES,
+            os.path.join(REPOSITORY, directory), repeat)
+
+    return timings
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description='Run the System B analysis.')
+    subparsers = parser.add_subparsers(dest='command')
+    subparsers.required = True
+
+    run_parser = subparsers.add_parser('run', help='run the whole pipeline')
+    run_parser.add_argument('--from', dest='from_stage', metavar='STAGE',
+                            help='run STAGE and all stages depending on it')
+    run_parser.add_argument('--only', nargs='+', metavar='STAGE',
+                            help='run only the given stages')
+    run_parser.add_argument('--concurrent', action='store_true',
+                            help='run independent stages at the same time')
+    for command, help_text in [('solve', 'build and solve the model'),
+                               ('postprocess', 'calculate the kpis of the solved model'),
+                               ('plot', 'plot the results of the solved model')]:
+        subparsers.add_parser(command, help=help_text)
+    for command in COMMANDS:
+        subparser = subparsers.choices[command]
+        subparser.add_argument('config_path', nargs='?', help='experiment config to run')
+        subparser.add_argument('--import-only', action='store_true',
+                               help='only import the modules of the command, used by startup')
+
+    startup_parser = subparsers.add_parser(
+        'startup', help='measure the cold-start time of the commands')
+    startup_parser.add_argument('--repeat', type=int, default=3,
+                                help='number of starts per command')
+    startup_parser.add_argument('--output', help='write the timings to this json file')
+    startup_parser.add_argument('--all-systems', action='store_true',
+                                help='also measure the entry points of the other systems')
+
+    args = parser.parse_args(args)
+
+    if args.command == 'startup':
+        timings = measure_startup(
+            repeat=args.repeat, entry_points=sorted(ENTRY_POINTS) if args.all_systems else ())
+        for command, timing in timings.items():
+            print('{0:<25} {1:6.2f} sec  {2}'.format(
+                command, timing['seconds'], ', '.join(timing['heavy_modules']) or '-'))
+        if args.output:
+            with open(args.output, 'w') as f:
+                json.dump(timings, f, indent=1)
+        return timings
+
+    if args.import_only:
+        import_command(args.command)
+        import_deferred(args.command)
+        print(json.dumps(get_imported_heavy_modules()))
+        return None
+
+    if args.config_path is None:
+        parser.error('the experiment config is required')
+
+    kwargs = {}
+    if args.command == 'run':
+        kwargs = {'from_stage': args.from_stage, 'only': args.only,
+                  'concurrent': args.concurrent}
+
+    return run_command(args.command, args.config_path, **kwargs)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,9 +1,17 @@
 import sys
 import os
+import hashlib
+import json
 
-def setup_experiment():
+def setup_experiment(config_path=None):
     r"""
 
+    Parameters
+    ----------
+    config_path: path
+        Path to experiment config file. If None, it is taken from
+        the first command line argument.
+
     Returns
     -------
     config_path: path
@@ -17,11 +25,12 @@ def setup_experiment():
     abs_path = os.path.dirname(os.path.abspath(os.path.join(__file__, '..')))
 
     # take command line arguments
-    try:
-        config_path = sys.argv[1]
-    except:
-        print('Please specify which experiment config to run as a command line argument.')
-        sys.exit(1)
+    if config_path is None:
+        try:
+            config_path = sys.argv[1]
+        except:
+            print('Please specify which experiment config to run as a command line argument.')
+            sys.exit(1)
 
     # Get absolute path of config file.
     config_path = os.path.abspath(config_path)
@@ -38,4 +47,67 @@ def setup_experiment():
         os.makedirs(results_dir + '/plots')
         os.makedirs(results_dir + '/presentation')
 
-    return config_path, results_dir
\ No newline at end of file
+    return config_path, results_dir
+
+def get_cache_dir(name):
+    r"""
+    Returns the directory of a cache and creates it if it does not exist.
+
+    Parameters
+    ----------
+    name : str
+        Name of the cache, e.g. 'model'.
+
+    Returns
+    -------
+    cache_dir : path
+        Absolute path of the cache directory.
+    """
+    abs_path = os.path.dirname(os.path.abspath(os.path.join(__file__, '..')))
+    cache_dir = os.path.join(abs_path, 'cache', name)
+
+    if not os.path.exists(cache_dir):
+        os.makedirs(cache_dir)
+
+    return cache_dir
+
+
+def hash_content(*items, files=()):
+    r"""
+    Creates a sha256 hash of python objects and files.
+
+    Dictionaries are hashed independent of the order of their keys. All
+    other objects are hashed by their representation, also strings that
+    happen to be the name of a file.
+
+    Parameters
+    ----------
+    items : dict, or any object with a stable representation
+
+    files : list of path
+        Files that are hashed by their content. A file that does not exist
+        is hashed by its path.
+
+    Returns
+    -------
+    hexdigest : str
+    """
+    sha = hashlib.sha256()
+    for item in items:
+        if isinstance(item, dict):
+            sha.update(json.dumps(item, sort_keys=True, default=str).encode())
+        else:
+            sha.update(repr(item).encode())
+        # separate the items so that ('ab', 'c') != ('a', 'bc')
+        sha.update(b'\0')
+    sha.update(b'\1')
+    for filename in files:
+        if os.path.isfile(filename):
+            with open(filename, 'rb') as f:
+                for block in iter(lambda: f.read(1 << 20), b''):
+                    sha.update(block)
+        else:
+            sha.update(repr(filename).encode())
+        sha.update(b'\0')
+
+    return sha.hexdigest()
@@ -1,6 +1,19 @@
 """
 This script runs the whole workflow of the analysis
 
+Usage: main.py <experiment_config> [options]
+
+Options:
+
+      --from=STAGE         Run STAGE and all stages depending on it.
+      --only=STAGE ...     Run only the given stages.
+      --concurrent         Run independent stages at the same time.
+
+Without options, all stages run whose inputs changed since their last run.
+
+The stages are imported when they run. cli.py runs single stages and
+measures the cold-start time of the commands.
+
 """
 
 from oemof.tools import logger
@@ -8,43 +21,48 @@ import logging
 import warnings
 warnings.filterwarnings("ignore", message="numpy.dtype size changed")
 warnings.filterwarnings("ignore", message="numpy.ufunc size changed")
+import argparse
+import os
+import sys
 import subprocess
-from connect_to_oep import connect_to_oep
-from preprocess import prepare_timeseries
-from preprocess_closed_data import preprocess_closed_data
-from model_dessau import run_model_dessau
-from postprocess import postprocess
-from plot import create_plots
+from pipeline import define_stages, run_pipeline
 import helpers
 import time
 
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+from model_tools import profiling
+
 
-def main(config_path, results_dir):
+def main(config_path, results_dir, from_stage=None, only=None, concurrent=False):
     r"""
     This function runs the whole analysis pipeline
 
-    """
-    starttime = time.time()
+    Parameters
+    ----------
+    config_path : path
+        Path of the experiment config
 
-    logger.define_logging(logpath=results_dir + '/optimisation_results')
+    results_dir : path
+        Path of the results directory
 
-    # Preproccessing
-    logging.info('Preprocess data')
-    connect_to_oep(config_path=config_path, results_dir=results_dir)
-    prepare_timeseries(config_path=config_path, results_dir=results_dir)
-    preprocess_closed_data(config_path=config_path, results_dir=results_dir)
+    from_stage : str
+        Run this stage and all stages depending on it.
 
-    # Run the optimisation model
-    logging.info('Run optimisation model')
-    run_model_dessau(config_path=config_path, results_dir=results_dir)
+    only : list of str
+        Run only these stages.
 
-    # Postprocessing
-    logging.info('Postprocess data')
-    postprocess(config_path=config_path, results_dir=results_dir)
+    concurrent : bool
+        Run independent stages, e.g. the preprocessing steps, at the same time.
+    """
+    starttime = time.time()
+    profiling.start('system_b')
 
-    # Plotting
-    logging.info('Create plots')
-    create_plots(config_path=config_path, results_dir=results_dir)
+    logger.define_logging(logpath=results_dir + '/optimisation_results')
+
+    # Preproccessing, optimisation, postprocessing and plotting
+    stages = define_stages(config_path, results_dir)
+    run_pipeline(stages, config_path, results_dir, from_stage=from_stage, only=only,
+                 concurrent=concurrent)
 
     # Build a report
     # cmd = ['pdflatex', '-interaction=nonstopmode', '--output-directory={0}/presentation/build'.format(abs_path), '{0}/presentation/report.tex'.format(results_dir)]
@@ -53,9 +71,21 @@ def main(config_path, results_dir):
     endtime = time.time()
 
     logging.info(f'Analysis lastet {endtime-starttime} sec.')
+    profiling.write(os.path.join(results_dir, 'profile.json'))
 
     return True
 
 if __name__ == '__main__':
-    config_path, results_dir = helpers.setup_experiment()
-    main(config_path, results_dir)
\ No newline at end of file
+    parser = argparse.ArgumentParser(description='Run the analysis pipeline.')
+    parser.add_argument('config_path', help='experiment config to run')
+    parser.add_argument('--from', dest='from_stage', metavar='STAGE',
+                        help='run STAGE and all stages depending on it')
+    parser.add_argument('--only', nargs='+', metavar='STAGE',
+                        help='run only the given stages')
+    parser.add_argument('--concurrent', action='store_true',
+                        help='run independent stages at the same time')
+    args = parser.parse_args()
+
+    config_path, results_dir = helpers.setup_experiment(args.config_path)
+    main(config_path, results_dir, from_stage=args.from_stage, only=args.only,
+         concurrent=args.concurrent)
@@ -9,7 +9,8 @@ Options:
 
   -d, --debug              Sets timesteps to 2 and writes the lp file
   -o, --solver=SOLVER      The solver to use. Should be one of
-                           helpers "glpk", "cbc" or "gurobi". [default: cbc]
+                           helpers "glpk", "cbc", "gurobi" or "highs"
+                           (in memory). [default: cbc]
       --invest-pth         Invest optimize the power-to-heat plant.
       --invest-chp         Invest optimize the gas turbine.
 
@@ -25,20 +26,77 @@ import oemof.solph as solph
 from oemof.outputlib import processing
 import oemof.graph as graph
 import networkx as nx
+import importlib.util
 import logging
 import os
+import shutil
 import pandas as pd
+import sys
+import time
 import yaml
 import helpers
 
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+from model_tools import (model_report, profiling, pruning, results_store, solver,
+                         timeseries_store)
 
-logger.define_logging()
+# files that are stored in the cache for every model run
+CACHED_FILES = ['optimisation_results/es.dump', 'energysystem_graph.pkl']
+
+# modules besides this one that the results depend on, part of the cache key
+CACHE_KEY_MODULES = ['model_tools.pruning', 'model_tools.solver', 'model_tools.sparse_lp',
+                     'model_tools.timeseries_store']
+
+
+def restore_from_cache(cache_dir, results_dir):
+    r"""
+    Copies the cached results of an identical model run to the results_dir.
+
+    Parameters
+    ----------
+    cache_dir : Directory of the cache entry
+    results_dir : Directory for results
+
+    Returns
+    -------
+    results : Dict containing results or None if the cache entry is incomplete
+    """
+    if not all(os.path.exists(os.path.join(cache_dir, os.path.basename(f)))
+               for f in CACHED_FILES):
+        return None
+
+    for f in CACHED_FILES:
+        shutil.copyfile(os.path.join(cache_dir, os.path.basename(f)),
+                        os.path.join(results_dir, f))
+
+    energysystem = solph.EnergySystem()
+    energysystem.restore(dpath=results_dir + '/optimisation_results', filename='es.dump')
+
+    return energysystem.results
+
+
+def store_in_cache(cache_dir, results_dir):
+    r"""
+    Copies the results of a model run from the results_dir to the cache.
+    """
+    if not os.path.exists(cache_dir):
+        os.makedirs(cache_dir)
+
+    for f in CACHED_FILES:
+        shutil.copyfile(os.path.join(results_dir, f),
+                        os.path.join(cache_dir, os.path.basename(f)))
 
 
 def run_model_dessau(config_path, results_dir):
     r"""
     Create the energy system and run the optimisation model.
 
+    If the config, the input parameter, the heat demand time series, the
+    solver options, the oemof version, this module and the modules of
+    CACHE_KEY_MODULES are unchanged since a previous run, the results of
+    that run are taken from the cache instead of solving the model again.
+    Set `use_cache: False` in the config to always solve.
+
     Parameters
     ----------
     config_path : Path to experiment config
@@ -52,26 +110,53 @@ def run_model_dessau(config_path, results_dir):
     with open(config_path, 'r') as ymlfile:
         cfg = yaml.load(ymlfile)
 
+    input_parameter_file = os.path.join(abs_path, cfg['input_parameter'])
+    demand_heat_file = os.path.join(results_dir, cfg['timeseries']['timeseries_demand_heat'])
+
+    # solver options
+    solve_kwargs = {'tee': True}
+    cmdline_options = {'AllowableGap=': '0.01'}
+
+    # look up results of an identical run in the cache
+    use_cache = cfg.get('use_cache', True)
+    if use_cache:
+        code_files = [os.path.abspath(__file__)] + [
+            importlib.util.find_spec(module).origin for module in CACHE_KEY_MODULES]
+        cache_key = helpers.hash_content(
+            cfg, cfg['solver'], solve_kwargs, cmdline_options, oemof.__version__,
+            files=[input_parameter_file, demand_heat_file] + code_files)
+        cache_dir = os.path.join(helpers.get_cache_dir('model'), cache_key)
+        results = restore_from_cache(cache_dir, results_dir)
+        if results is not None:
+            logging.info('Found results in cache {0}. Skip solving the model.'.format(cache_dir))
+            results_store.write_results(results, results_dir + '/optimisation_results/es.results')
+            return results
+
     # load input parameter
-    in_param = pd.read_csv(os.path.join(abs_path, cfg['input_parameter']), index_col=[1, 2])['var_value']
+    profiling.begin('data load')
+    in_param = pd.read_csv(input_parameter_file, index_col=[1, 2])['var_value']
     wacc = in_param['general', 'wacc']
 
-    # load timeseries
-    demand_heat_timeseries = pd.read_csv(os.path.join(results_dir, cfg['timeseries']['timeseries_demand_heat']),
-                                         index_col=0, names=['demand_heat'], sep=',')['demand_heat']
-    print(demand_heat_timeseries.head())
-
     # create timeindex
     if cfg['debug']:
         number_timesteps = 200
     else:
         number_timesteps = 8760
 
+    # load timeseries, only the modelled timesteps
+    demand_heat_timeseries = timeseries_store.read_csv(
+        demand_heat_file, n_timesteps=number_timesteps,
+        index_col=0, names=['demand_heat'], sep=',')['demand_heat']
+    print(demand_heat_timeseries.head())
+
     date_time_index = pd.date_range('1/1/2017',
                                     periods=number_timesteps,
                                     freq='H')
 
+    profiling.end()
+
     logging.info('Initialize the energy system')
+    profiling.begin('energy system build')
     energysystem = solph.EnergySystem(timeindex=date_time_index)
 
     #####################################################################
@@ -193,6 +278,12 @@ def run_model_dessau(config_path, results_dir):
         inflow_conversion_factor=1,
         outflow_conversion_factor=1))
 
+    profiling.end()
+
+    if cfg.get('prune_model', False):
+        with profiling.phase('pruning'):
+            energysystem, _ = pruning.prune_energysystem(energysystem)
+
     energysystem_graph = graph.create_nx_graph(energysystem)
     graph_file_name = os.path.join(results_dir, 'energysystem_graph.pkl')
     nx.readwrite.write_gpickle(G=energysystem_graph, path=graph_file_name)
@@ -201,28 +292,72 @@ def run_model_dessau(config_path, results_dir):
     logging.info('Solve the optimization problem')
 
 
-    om = solph.Model(energysystem)
-    om.solve(solver=cfg['solver'], solve_kwargs={'tee': True}, cmdline_options={'AllowableGap=': '0.01'})
-
-    if cfg['debug']:
-        filename = os.path.join(
-            oemof.tools.helpers.extend_basic_path('lp_files'),
-            'app_district_heating.lp')
-        logging.info('Store lp-file in {0}.'.format(filename))
-        om.write(filename, io_options={'symbolic_solver_labels': True})
-
-
-    #####################################################################
-    logging.info('Check the results')
-    #####################################################################
-
-    energysystem.results['main'] = processing.results(om)
-    energysystem.results['meta'] = processing.meta_results(om)
-    energysystem.results['param'] = processing.parameter_as_dict(om)
-    energysystem.dump(dpath=results_dir + '/optimisation_results', filename='es.dump')
+    lp_backend = cfg.get('lp_backend', 'solph')
+    unsupported = []
+    if lp_backend == 'sparse':
+        # scipy is only imported for the sparse backend
+        from model_tools import sparse_lp
+        unsupported = sparse_lp.get_unsupported(energysystem)
+    if unsupported:
+        logging.warning('Build the model with solph, the sparse LP does not support: {0}'.format(
+            ', '.join(unsupported)))
+
+    if lp_backend == 'sparse' and not unsupported:
+        with profiling.phase('model construction'):
+            lp = sparse_lp.build_lp(energysystem)
+        with profiling.phase('solver'):
+            solution = sparse_lp.solve_lp(lp, disp=solve_kwargs['tee'])
+
+        #####################################################################
+        logging.info('Check the results')
+        #####################################################################
+
+        with profiling.phase('results processing'):
+            energysystem.results = sparse_lp.get_results(lp, solution)
+            energysystem.results['param'] = processing.parameter_as_dict(energysystem)
+            pruning.add_report(energysystem)
+    else:
+        with profiling.phase('model construction'):
+            om = solph.Model(energysystem)
+        report = model_report.check_model(
+            om, 'model_dessau', results_dir + '/optimisation_results/model_report.json',
+            coefficients=cfg.get('check_scaling', False), solver=cfg['solver'])
+        with profiling.phase('solver'):
+            starttime = time.time()
+            solved_with = solver.solve_model(om, cfg['solver'], solve_kwargs=solve_kwargs,
+                                             cmdline_options=cmdline_options)
+            model_report.record_solve_time(report, time.time() - starttime, solved_with)
+
+        if cfg['debug']:
+            filename = os.path.join(
+                oemof.tools.helpers.extend_basic_path('lp_files'),
+                'app_district_heating.lp')
+            logging.info('Store lp-file in {0}.'.format(filename))
+            with profiling.phase('lp write'):
+                om.write(filename, io_options={'symbolic_solver_labels': True})
+
+        #####################################################################
+        logging.info('Check the results')
+        #####################################################################
+
+        with profiling.phase('results processing'):
+            energysystem.results['main'] = processing.results(om)
+            energysystem.results['meta'] = processing.meta_results(om)
+            energysystem.results['param'] = processing.parameter_as_dict(om)
+            pruning.add_report(energysystem)
+
+    with profiling.phase('dump'):
+        energysystem.dump(dpath=results_dir + '/optimisation_results', filename='es.dump')
+        results_store.write_results(energysystem.results, results_dir + '/optimisation_results/es.results')
+
+    if use_cache:
+        store_in_cache(cache_dir, results_dir)
 
     return energysystem.results
 
 if __name__ == '__main__':
+    logger.define_logging()
     config_path, results_dir = helpers.setup_experiment()
+    profiling.start('model_dessau')
     run_model_dessau(config_path=config_path, results_dir=results_dir)
+    profiling.write(os.path.join(results_dir, 'optimisation_results', 'profile.json'))
@@ -0,0 +1,432 @@
+"""
+This module defines the analysis pipeline as a graph of stages.
+
+Every stage declares the files it reads and writes and the stages it depends
+on. A stage is skipped if all its outputs exist and the fingerprint of its
+inputs, the experiment config and the module of the stage function is the
+same as in its last run. The fingerprints are stored in the results
+directory.
+
+A stage can provide its return value to later stages that run in the same
+process, e.g. the optimisation results are handed to the postprocessing and
+plotting without restoring the dump from disk again.
+
+In concurrent mode, stages whose dependencies are done run at the same
+time. Stages that wait for the network or disk run in threads, CPU-bound
+stages in processes and all others in the main process.
+
+"""
+
+__copyright__ = "Reiner Lemoine Institut"
+__license__ = "GPLv3"
+__author__ = "c-moeller, jnnr"
+
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import importlib
+import importlib.util
+import logging
+import os
+import sys
+import time
+import yaml
+import helpers
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+from model_tools import profiling
+
+
+FINGERPRINT_FILE = 'stage_fingerprints.yml'
+
+
+class Stage(object):
+    r"""
+    A step of the analysis pipeline.
+
+    Parameters
+    ----------
+    name : str
+        Name of the stage, used in the stage selectors.
+
+    func : callable or str
+        Function that is called with the arguments config_path and
+        results_dir, or its name as 'module:function'. A named function is
+        imported when the stage runs, so that e.g. the plotting libraries
+        are only imported if a plotting stage runs.
+
+    inputs : list of paths
+        Files the stage reads.
+
+    outputs : list of paths
+        Files the stage writes.
+
+    depends_on : list of str
+        Names of the stages that have to run before this stage.
+
+    executor : str
+        Where the stage runs in concurrent mode, 'thread' for network or
+        IO-bound stages, 'process' for CPU-bound stages or None for the main
+        process.
+
+    kwargs : dict
+        Additional keyword arguments for func.
+
+    provides : str
+        Key under which the return value of func is shared with later stages.
+
+    uses : list of str
+        Keys of shared values that are passed to func as keyword arguments
+        if they are available.
+    """
+    def __init__(self, name, func, inputs=(), outputs=(), depends_on=(),
+                 executor=None, kwargs=None, provides=None, uses=()):
+        if executor not in [None, 'thread', 'process']:
+            raise ValueError(f"Executor of stage '{name}' has to be None, 'thread' or 'process'.")
+        self.name = name
+        self.func = func
+        self.inputs = list(inputs)
+        self.outputs = list(outputs)
+        self.depends_on = list(depends_on)
+        self.executor = executor
+        self.kwargs = kwargs or {}
+        self.provides = provides
+        self.uses = list(uses)
+
+    def get_kwargs(self, shared):
+        r"""
+        Returns the keyword arguments for func including the shared values
+        this stage uses.
+        """
+        kwargs = dict(self.kwargs)
+        for key in self.uses:
+            if key in shared:
+                kwargs[key] = shared[key]
+
+        return kwargs
+
+    def fingerprint(self, config_path):
+        r"""
+        Hash of the config, the module of the stage function and all inputs.
+        """
+        if isinstance(self.func, str):
+            # find the module without importing it
+            module_file = importlib.util.find_spec(self.func.split(':')[0]).origin
+        else:
+            module_file = sys.modules[self.func.__module__].__file__
+        module_file = os.path.abspath(module_file)
+
+        return helpers.hash_content(files=[config_path, module_file] + list(self.inputs))
+
+    def is_up_to_date(self, fingerprint, fingerprints):
+        return (fingerprints.get(self.name) == fingerprint and
+                all(os.path.exists(output) for output in self.outputs))
+
+
+def resolve_func(func):
+    r"""
+    Returns the function of a stage, importing it if it is given as
+    'module:function'.
+    """
+    if not isinstance(func, str):
+        return func
+    module_name, func_name = func.split(':')
+
+    return getattr(importlib.import_module(module_name), func_name)
+
+
+def run_timed(func, config_path, results_dir, kwargs):
+    r"""
+    Calls a stage function and measures its elapsed time. This is a module
+    level function so that it can be sent to worker processes. A function
+    given as 'module:function' is imported in the process that runs it.
+
+    Returns
+    -------
+    elapsed : float
+        Elapsed time in seconds.
+
+    result
+        Return value of func.
+    """
+    starttime = time.time()
+    result = resolve_func(func)(config_path=config_path, results_dir=results_dir, **kwargs)
+
+    return time.time() - starttime, result
+
+
+def define_stages(config_path, results_dir):
+    r"""
+    Defines the stages of the System B analysis.
+
+    Parameters
+    ----------
+    config_path : path
+        Path of the experiment config
+
+    results_dir : path
+        Path of the results directory
+
+    Returns
+    -------
+    stages : list of Stage
+    """
+    abs_path = os.path.dirname(os.path.abspath(os.path.join(__file__, '..')))
+    with open(config_path, 'r') as ymlfile:
+        cfg = yaml.load(ymlfile)
+
+    temperature = os.path.join(results_dir, cfg['timeseries']['timeseries_temperature'])
+    demand_heat = os.path.join(results_dir, cfg['timeseries']['timeseries_demand_heat'])
+    es_dump = os.path.join(results_dir, 'optimisation_results', 'es.dump')
+    es_graph = os.path.join(results_dir, 'energysystem_graph.pkl')
+    heat_profile = os.path.join(results_dir, 'data_preprocessed/heat_profile_dessau.csv')
+
+    stages = [
+        Stage('connect_to_oep', 'connect_to_oep:connect_to_oep',
+              executor='thread'),
+        Stage('prepare_timeseries', 'preprocess:prepare_timeseries',
+              inputs=[os.path.join(abs_path, 'data_raw', cfg['raw']['temperature'])],
+              outputs=[temperature, demand_heat],
+              executor='process'),
+        Stage('preprocess_closed_data', 'preprocess_closed_data:preprocess_closed_data',
+              inputs=[os.path.join(abs_path, 'data_raw/heat_demand/Primaer_Waermeleistung_17.xlsm')],
+              outputs=[heat_profile],
+              executor='process',
+              kwargs={'plot': False}),
+        Stage('compare_heat_profiles', 'preprocess_closed_data:plot_compare_heat_profiles',
+              inputs=[heat_profile, demand_heat],
+              depends_on=['prepare_timeseries', 'preprocess_closed_data']),
+        Stage('run_model_dessau', 'model_dessau:run_model_dessau',
+              inputs=[os.path.join(abs_path, cfg['input_parameter']), demand_heat],
+              outputs=[es_dump, es_graph],
+              depends_on=['connect_to_oep', 'prepare_timeseries'],
+              provides='results'),
+        Stage('postprocess', 'postprocess:postprocess',
+              inputs=[es_dump],
+              outputs=[os.path.join(results_dir, 'postprocessed', filename)
+                       for filename in ['kpis.csv', 'load_duration_curves.csv']],
+              depends_on=['run_model_dessau'],
+              uses=['results']),
+        Stage('create_plots', 'plot:create_plots',
+              inputs=[es_dump, es_graph, demand_heat],
+              outputs=[os.path.join(results_dir, 'plots', filename)
+                       for filename in ['es_graph.pdf', 'heat_demand.pdf', 'dispatch_stack_plot.pdf']],
+              depends_on=['run_model_dessau'],
+              uses=['results']),
+    ]
+
+    return stages
+
+
+def sort_stages(stages):
+    r"""
+    Sorts the stages topologically, keeping the order of definition where
+    possible.
+    """
+    names = [stage.name for stage in stages]
+    for stage in stages:
+        for dependency in stage.depends_on:
+            if dependency not in names:
+                raise ValueError(f"Stage '{stage.name}' depends on unknown stage '{dependency}'.")
+
+    ordered = []
+    done = set()
+    remaining = list(stages)
+    while remaining:
+        ready = [stage for stage in remaining if set(stage.depends_on) <= done]
+        if not ready:
+            raise ValueError('The stages contain a cycle: {0}'.format([stage.name for stage in remaining]))
+        ordered.append(ready[0])
+        done.add(ready[0].name)
+        remaining.remove(ready[0])
+
+    return ordered
+
+
+def get_downstream(stages, name):
+    r"""
+    Returns the names of a stage and of all stages depending on it.
+    """
+    downstream = {name}
+    for stage in sort_stages(stages):
+        if downstream & set(stage.depends_on):
+            downstream.add(stage.name)
+
+    return downstream
+
+
+def select_stages(stages, from_stage=None, only=None):
+    r"""
+    Returns the names of the stages that are forced to run.
+
+    Parameters
+    ----------
+    from_stage : str
+        Run this stage and all stages depending on it.
+
+    only : list of str
+        Run only these stages.
+
+    Returns
+    -------
+    selected : set of str or None
+        None if no selector is given, i.e. all stages run if they are not
+        up to date.
+    """
+    names = [stage.name for stage in stages]
+    for name in ([from_stage] if from_stage else []) + list(only or []):
+        if name not in names:
+            raise ValueError(f"Unknown stage '{name}'. Choose one of {names}.")
+
+    if only:
+        return set(only)
+    if from_stage:
+        return get_downstream(stages, from_stage)
+
+    return None
+
+
+def load_fingerprints(results_dir):
+    filename = os.path.join(results_dir, FINGERPRINT_FILE)
+    if not os.path.exists(filename):
+        return {}
+    with open(filename, 'r') as f:
+        return yaml.safe_load(f) or {}
+
+
+def save_fingerprints(results_dir, fingerprints):
+    with open(os.path.join(results_dir, FINGERPRINT_FILE), 'w') as f:
+        yaml.safe_dump(fingerprints, f, default_flow_style=False)
+
+
+def get_levels(stages):
+    r"""
+    Groups the sorted stages into levels. All stages of a level only depend
+    on stages of previous levels and can run at the same time.
+    """
+    level_of = {}
+    levels = []
+    for stage in sort_stages(stages):
+        level = max([level_of[name] + 1 for name in stage.depends_on], default=0)
+        level_of[stage.name] = level
+        if level == len(levels):
+            levels.append([])
+        levels[level].append(stage)
+
+    return levels
+
+
+def run_concurrently(stages, config_path, results_dir, shared):
+    r"""
+    Runs stages at the same time, each on its executor.
+
+    Returns
+    -------
+    timed_results : dict
+        Elapsed time in seconds and return value of each stage.
+    """
+    futures = {}
+    timed_results = {}
+    with ThreadPoolExecutor() as threads, ProcessPoolExecutor() as processes:
+        for stage in stages:
+            if stage.executor == 'thread':
+                futures[stage.name] = threads.submit(
+                    run_timed, stage.func, config_path, results_dir, stage.get_kwargs(shared))
+            elif stage.executor == 'process':
+                futures[stage.name] = processes.submit(
+                    run_timed, stage.func, config_path, results_dir, stage.get_kwargs(shared))
+
+        for stage in stages:
+            if stage.executor is None:
+                timed_results[stage.name] = run_timed(
+                    stage.func, config_path, results_dir, stage.get_kwargs(shared))
+
+        for name, future in futures.items():
+            timed_results[name] = future.result()
+
+    return timed_results
+
+
+def run_pipeline(stages, config_path, results_dir, from_stage=None, only=None,
+                 concurrent=False):
+    r"""
+    Runs the stages in the order of their dependencies.
+
+    Without selector, every stage runs that is not up to date. With a
+    selector, only the selected stages run and they run even if they are up
+    to date. Shared values are only available if the providing stage ran in
+    the same call, otherwise the stages read their inputs from disk.
+
+    Parameters
+    ----------
+    stages : list of Stage
+
+    config_path : path
+        Path of the experiment config
+
+    results_dir : path
+        Path of the results directory
+
+    from_stage : str
+        Run this stage and all stages depending on it.
+
+    only : list of str
+        Run only these stages.
+
+    concurrent : bool
+        Run the stages of a level at the same time.
+
+    Returns
+    -------
+    executed : list of str
+        Names of the stages that have been run.
+    """
+    selected = select_stages(stages, from_stage=from_stage, only=only)
+    fingerprints = load_fingerprints(results_dir)
+    shared = {}
+
+    if concurrent:
+        levels = get_levels(stages)
+    else:
+        levels = [[stage] for stage in sort_stages(stages)]
+
+    executed = []
+    for level in levels:
+        to_run = []
+        for stage in level:
+            if selected is not None and stage.name not in selected:
+                continue
+
+            fingerprint = stage.fingerprint(config_path)
+            if selected is None and stage.is_up_to_date(fingerprint, fingerprints):
+                logging.info(f'Skip stage {stage.name}, it is up to date.')
+                continue
+
+            to_run.append((stage, fingerprint))
+
+        if not to_run:
+            continue
+
+        logging.info('Run stage {0}'.format(', '.join(stage.name for stage, _ in to_run)))
+        starttime = time.time()
+        with profiling.phase('stage ' + ', '.join(stage.name for stage, _ in to_run)):
+            if len(to_run) > 1:
+                timed_results = run_concurrently([stage for stage, _ in to_run], config_path, results_dir, shared)
+            else:
+                stage = to_run[0][0]
+                timed_results = {stage.name: run_timed(
+                    stage.func, config_path, results_dir, stage.get_kwargs(shared))}
+        for stage, _ in to_run:
+            elapsed, result = timed_results[stage.name]
+            if stage.provides is not None:
+                shared[stage.provides] = result
+            logging.info(f'Stage {stage.name} lasted {elapsed:.2f} sec.')
+        if len(to_run) > 1:
+            logging.info(f'Concurrent stages lasted {time.time() - starttime:.2f} sec.')
+
+        # store the fingerprints after every level to keep the progress if a
+        # later stage fails
+        for stage, fingerprint in to_run:
+            fingerprints[stage.name] = fingerprint
+            executed.append(stage.name)
+        save_fingerprints(results_dir, fingerprints)
+
+    return executed
@@ -14,12 +14,10 @@ import os
 import pandas as pd
 import matplotlib.pyplot as plt
 from matplotlib import rcParams as rcParams
-import oemof.graph as graph
-import oemof.solph as solph
-import oemof.outputlib as outputlib
 import networkx as nx
 import yaml
 import helpers
+from postprocess import restore_results
 
 
 def plot_heat_demand(df, filename):
@@ -149,17 +147,31 @@ def plot_dispatch(df, filename):
     return None
 
 
-def create_plots(config_path, results_dir):
+def create_plots(config_path, results_dir, results=None):
     r"""
     Runs the plot production pipeline.
+
+    Parameters
+    ----------
+    config_path : path
+        path of experiment config
+
+    results_dir : path
+        path of results directory
+
+    results : dict
+        Results of the optimisation model. If None, they are restored from
+        the dump in results_dir.
     """
+    import oemof.outputlib as outputlib
+
     # open config
     abs_path = os.path.dirname(os.path.abspath(os.path.join(__file__, '..')))
     with open(config_path, 'r') as ymlfile:
         cfg = yaml.load(ymlfile)
 
-    energysystem = solph.EnergySystem()
-    energysystem.restore(dpath=results_dir + '/optimisation_results', filename='es.dump')
+    if results is None:
+        results = restore_results(results_dir)
     energysystem_graph = nx.readwrite.read_gpickle(os.path.join(results_dir, 'energysystem_graph.pkl'))
 
     node_color = { 'natural gas': '#19A8B8',
@@ -182,7 +194,7 @@ def create_plots(config_path, results_dir):
     demand = pd.read_csv(os.path.join(results_dir, cfg['timeseries']['timeseries_demand_heat']))
     plot_heat_demand(demand, filename=results_dir + '/plots/heat_demand.pdf')
 
-    node_results_bel = outputlib.views.node(energysystem.results['main'], 'heat_prim')['sequences']
+    node_results_bel = outputlib.views.node(results['main'], 'heat_prim')['sequences']
     plot_dispatch(node_results_bel, filename=results_dir + '/plots/' + 'dispatch_stack_plot.pdf')
 
 
@@ -20,39 +20,193 @@ Emissions
 """
 
 import os
+import numpy as np
 import pandas as pd
-import oemof.solph as solph
-import oemof.outputlib as outputlib
 import yaml
 import helpers
 
 abs_path = os.path.dirname(os.path.abspath(os.path.join(__file__, '..')))
 
+# labels of the nodes, used if the experiment config has no 'kpi' section
+DEFAULT_KPI_CFG = {
+    'renewables': [],
+    'excess': ['excess_heat'],
+    'import': ['natural_gas', 'electricity', 'shortage_heat'],
+    'demand': ['demand_heat'],
+    # t CO2 per MWh leaving the node
+    'emission_factors': {'natural_gas': 0.202, 'electricity': 0.474},
+}
 
 
+def get_flow_matrix(results):
+    r"""
+    Stacks the flow sequences of all flows into one matrix.
 
-# def get_variable_costs():
-# def get_summed operating hours():
-# def get_summed Production():
-# def get_mean Production during operation hours():
-# def get_maximal Production():
-# def get_minimal Production():
-# def get_full load hours():
-# def get_start count():
+    Parameters
+    ----------
+    results : dict
+        `energysystem.results` with the groups 'main' and 'param'.
 
-# def get_load_duration_curves():
-# def get_coverage_through_renewables():
-# def get_summed_excess():
-# def get_max_excess():
-# def get_summed_import():
-# def get_max_import():
-# def get_emmission():
+    Returns
+    -------
+    index : pd.MultiIndex
+        (from, to) labels of the flows, one per row of the matrix.
+
+    flows : np.ndarray
+        Matrix of shape (number of flows, number of timesteps).
+    """
+    keys = []
+    sequences = []
+    for key, value in results['main'].items():
+        # storage contents and other node variables have no target
+        if key[1] is None or str(key[1]) == 'None':
+            continue
+        if 'flow' not in value['sequences']:
+            continue
+        keys.append((str(key[0]), str(key[1])))
+        sequences.append(value['sequences']['flow'].values)
+
+    if not sequences:
+        return pd.MultiIndex.from_tuples([], names=['from', 'to']), np.zeros((0, 0))
+
+    flows = np.vstack(sequences).astype(float)
+
+    return pd.MultiIndex.from_tuples(keys, names=['from', 'to']), flows
+
+
+def get_flow_parameter(results, index, name, n_timesteps, default=np.nan):
+    r"""
+    Returns a parameter of all flows as a matrix of shape (number of flows,
+    number of timesteps). Scalar parameters are broadcast over time.
+    """
+    param = {(str(key[0]), str(key[1])): value
+             for key, value in results.get('param', {}).items()}
+    values = np.full((len(index), n_timesteps), default, dtype=float)
+
+    for i, key in enumerate(index):
+        if key not in param:
+            continue
+        sequences = param[key].get('sequences')
+        scalars = param[key].get('scalars')
+        if sequences is not None and name in sequences:
+            values[i] = sequences[name].values[:n_timesteps]
+        elif scalars is not None and name in scalars and scalars[name] is not None:
+            values[i] = scalars[name]
+
+    return values
+
+
+def get_capacity(results, index):
+    r"""
+    Returns the nominal value of every flow, or the invested capacity for
+    investment flows.
+    """
+    capacity = get_flow_parameter(results, index, 'nominal_value', 1)[:, 0]
+    scalars = {(str(key[0]), str(key[1])): value.get('scalars')
+               for key, value in results['main'].items()}
+    for i, key in enumerate(index):
+        if scalars.get(key) is not None and 'invest' in scalars[key]:
+            capacity[i] = scalars[key]['invest']
+
+    return capacity
+
+
+def get_kpis(results, kpi_cfg=None, threshold=1e-6):
+    r"""
+    Determines the key performance indicators of all flows and of the
+    energy system as a whole in one pass over the stacked flow matrix.
+
+    Parameters
+    ----------
+    results : dict
+        `energysystem.results` with the groups 'main' and 'param'.
+
+    kpi_cfg : dict
+        Labels of the renewable, excess, import and demand nodes and the
+        emission factors of the nodes. Defaults to DEFAULT_KPI_CFG.
+
+    threshold : float
+        Flows above this value count as operating.
+
+    Returns
+    -------
+    kpis : pd.DataFrame
+        Tidy table with the columns 'from', 'to', 'var_name' and
+        'var_value'. The KPIs of the energy system have 'system' in the
+        columns 'from' and 'to'.
+    """
+    kpi_cfg = dict(DEFAULT_KPI_CFG, **(kpi_cfg or {}))
+    index, flows = get_flow_matrix(results)
+    n_timesteps = flows.shape[1]
+
+    operating = flows > threshold
+    summed = flows.sum(axis=1)
+    operating_hours = operating.sum(axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean_operating = np.where(operating_hours > 0, summed / operating_hours, 0)
+        full_load_hours = summed / get_capacity(results, index)
+    variable_costs = np.nansum(
+        flows * get_flow_parameter(results, index, 'variable_costs', n_timesteps, default=0),
+        axis=1)
+    # a start is a timestep in operation after a timestep without operation
+    start_count = (operating[:, 1:] & ~operating[:, :-1]).sum(axis=1)
+
+    per_flow = pd.DataFrame({
+        'variable_costs': variable_costs,
+        'summed_operating_hours': operating_hours,
+        'summed_production': summed,
+        'mean_production_during_operation': mean_operating,
+        'max_production': flows.max(axis=1) if n_timesteps else np.nan,
+        'min_production': flows.min(axis=1) if n_timesteps else np.nan,
+        'full_load_hours': full_load_hours,
+        'start_count': start_count,
+    }, index=index)
+
+    source = index.get_level_values('from')
+    target = index.get_level_values('to')
+
+    def sum_rows(mask):
+        return flows[np.asarray(mask)].sum(axis=0)
+
+    excess = sum_rows(target.isin(kpi_cfg['excess']))
+    imported = sum_rows(source.isin(kpi_cfg['import']))
+    demand = summed[np.asarray(target.isin(kpi_cfg['demand']))].sum()
+    renewable = summed[np.asarray(source.isin(kpi_cfg['renewables']))].sum()
+    emission_factors = source.map(lambda label: kpi_cfg['emission_factors'].get(label, 0))
+
+    system = pd.Series({
+        'coverage_through_renewables': renewable / demand if demand else np.nan,
+        'summed_excess': excess.sum(),
+        'max_excess': excess.max() if n_timesteps else np.nan,
+        'summed_import': imported.sum(),
+        'max_import': imported.max() if n_timesteps else np.nan,
+        'emissions': np.dot(np.asarray(emission_factors, dtype=float), summed),
+    })
+
+    kpis = per_flow.stack().reset_index()
+    kpis.columns = ['from', 'to', 'var_name', 'var_value']
+    system = pd.DataFrame({'from': 'system', 'to': 'system',
+                           'var_name': system.index, 'var_value': system.values})
+
+    return pd.concat([kpis, system], ignore_index=True)
+
+
+def get_load_duration_curves(results):
+    r"""
+    Returns the load duration curves of all flows, i.e. the flows sorted in
+    descending order, with one column per flow.
+    """
+    index, flows = get_flow_matrix(results)
+
+    return pd.DataFrame(-np.sort(-flows, axis=1).T, columns=index)
 
 
 # Create a table of the scenario
 
-def print_summed_heat(energysystem):
-    heat_prim = outputlib.views.node(energysystem.results['main'], 'heat_prim')['sequences']
+def print_summed_heat(results):
+    import oemof.outputlib as outputlib
+
+    heat_prim = outputlib.views.node(results['main'], 'heat_prim')['sequences']
     heat_to_storage = (('heat_prim', 'storage_heat'), 'flow')
     heat_to_dhn = (('heat_prim', 'dhn_prim'), 'flow')
     print('heat_prim to dhn_prim', heat_prim[heat_to_dhn].sum())
@@ -60,28 +214,58 @@ def print_summed_heat(energysystem):
 
     # print('dhn_prim to heat_sec', dhn_prim[(('dhn_prim', 'heat_sec'), 'flow')].sum())
 
-    heat_sec = outputlib.views.node(energysystem.results['main'], 'heat_sec')['sequences']
+    heat_sec = outputlib.views.node(results['main'], 'heat_sec')['sequences']
     print('heat_sec to  dhn_sec', heat_sec[(('heat_sec', 'dhn_sec'), 'flow')].sum())
 
 
-    sink = outputlib.views.node(energysystem.results['main'], 'demand_heat')['sequences']
+    sink = outputlib.views.node(results['main'], 'demand_heat')['sequences']
     print('heat_end to demand_heat', sink[(('heat_end', 'demand_heat'), 'flow')].sum())
 
 
-def get_param_as_dict(energysystem):
-    param = energysystem.results['param']
+def get_param_as_dict(results):
+    param = results['param']
+
+def restore_results(results_dir):
+    r"""
+    Restores the results of the optimisation model from the dump.
+    """
+    import oemof.solph as solph
 
-def postprocess(config_path, results_dir):
+    energysystem = solph.EnergySystem()
+    energysystem.restore(dpath=results_dir + '/optimisation_results', filename='es.dump')
+
+    return energysystem.results
+
+def postprocess(config_path, results_dir, results=None):
+    r"""
+    Runs the postprocessing pipeline.
+
+    Parameters
+    ----------
+    config_path : path
+        path of experiment config
+
+    results_dir : path
+        path of results directory
+
+    results : dict
+        Results of the optimisation model. If None, they are restored from
+        the dump in results_dir.
+    """
     # open config
     abs_path = os.path.dirname(os.path.abspath(os.path.join(__file__, '..')))
     with open(config_path, 'r') as ymlfile:
         cfg = yaml.load(ymlfile)
 
-    # restore energysystem
-    energysystem = solph.EnergySystem()
-    energysystem.restore(dpath=results_dir + '/optimisation_results', filename='es.dump')
-    print_summed_heat(energysystem)
-    get_param_as_dict(energysystem)
+    if results is None:
+        results = restore_results(results_dir)
+    print_summed_heat(results)
+    get_param_as_dict(results)
+
+    kpis = get_kpis(results, cfg.get('kpi'))
+    kpis.to_csv(os.path.join(results_dir, 'postprocessed', 'kpis.csv'), index=False)
+    load_duration_curves = get_load_duration_curves(results)
+    load_duration_curves.to_csv(os.path.join(results_dir, 'postprocessed', 'load_duration_curves.csv'))
 
 if __name__ == '__main__':
     config_path, results_dir = helpers.setup_experiment()
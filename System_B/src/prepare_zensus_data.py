@@ -105,6 +105,40 @@ def calculate_annual_heat_demand(zensus_data, heat_demand_per_area):
 
     return annual_heat_demand
 
+def get_heat_demand_categories(annual_heat_demand, building_class=4, wind_class=1, ags=None):
+    r"""
+    Converts the annual heat demand per building type and construction year
+    into the building categories of `preprocess.get_heat_profiles`.
+
+    Parameters
+    ----------
+    annual_heat_demand : pandas DataFrame
+        Return value of `calculate_annual_heat_demand`.
+
+    building_class, wind_class : int
+        BDEW classes of all categories.
+
+    ags : str
+        Amtlicher Gemeindeschluessel, added as first index level to combine
+        the categories of several municipalities.
+
+    Returns
+    -------
+    categories : pandas DataFrame
+        One row per building type and construction year.
+    """
+    categories = annual_heat_demand.melt(id_vars='Gebauede_Anzahl_Wohnungen', var_name='Baujahr',
+                                         value_name='annual_demand').dropna()
+    categories['shlp_type'] = np.where(
+        categories['Gebauede_Anzahl_Wohnungen'] == '1 Wohnung', 'efh', 'mfh')
+    categories['building_class'] = building_class
+    categories['wind_class'] = wind_class
+    if ags is not None:
+        categories.insert(0, 'ags', ags)
+
+    return categories.set_index([column for column in ['ags', 'Gebauede_Anzahl_Wohnungen', 'Baujahr']
+                                 if column in categories.columns])
+
 def prepare_zensus_data(config_path, results_dir):
     r"""
     Prepare heat demand data.
@@ -13,18 +13,27 @@ __license__ = "GPLv3"
 __author__ = "c-moeller, jnnr"
 
 
-import pandas as pd
-import demandlib.bdew as bdew
-import matplotlib
-import matplotlib.pyplot as plt
-import datetime
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+import json
+import logging
 import os
-from workalendar.europe import Germany
+import shutil
+import numpy as np
+import pandas as pd
 import yaml
 import helpers
 
 abs_path = os.path.dirname(os.path.abspath(os.path.join(__file__, '..')))
 
+# maximal size of the cached BDEW profiles in System_B/cache/bdew
+BDEW_CACHE_SIZE_MB = 100
+
+OPSD_FILE = os.path.join(abs_path, 'data', 'opsd-time_series-2018-06-30',
+                         'time_series_60min_singleindex.csv')
+OPSD_CHUNKSIZE = 20000
+OPSD_TIME_ZONE = 'Europe/Berlin'
+
 def prepare_timeseries_temperature(config_path, results_dir):
     """
     convert raw temperature data to appropriate format.
@@ -44,40 +53,416 @@ def prepare_timeseries_temperature(config_path, results_dir):
 
     return temperature
 
+@lru_cache(maxsize=None)
+def get_holidays(year):
+    r"""
+    Returns the holidays of Germany in a year as dict.
+    """
+    from workalendar.europe import Germany
+
+    return dict(Germany().holidays(year))
+
+
+def hash_temperature(temperature):
+    r"""
+    Returns a hash of the values and the timestamps of a temperature series.
+    """
+    return helpers.hash_content(
+        pd.util.hash_pandas_object(temperature, index=True).values.tobytes())
+
+
+def evict_cache(cache_dir, max_size_mb):
+    r"""
+    Deletes the least recently used profiles of a cache directory until the
+    cached profiles take at most max_size_mb.
+
+    Returns
+    -------
+    removed : list of str
+        Filenames of the deleted profiles.
+    """
+    files = [os.path.join(cache_dir, name) for name in os.listdir(cache_dir)
+             if name.endswith('.npy')]
+    files.sort(key=os.path.getmtime, reverse=True)
+
+    removed = []
+    size = 0
+    for filename in files:
+        try:
+            size += os.path.getsize(filename)
+            if size > max_size_mb * 1024 ** 2:
+                os.remove(filename)
+                removed.append(os.path.basename(filename))
+        except FileNotFoundError:
+            # removed by another process that fills the cache
+            continue
+
+    return removed
+
+
+def get_normalized_bdew_profile(temperature, year, shlp_type, building_class, wind_class,
+                                use_cache=True, max_cache_size_mb=BDEW_CACHE_SIZE_MB):
+    r"""
+    Returns the BDEW heat profile of a building type for an annual demand
+    of 1.
+
+    The profile only depends on the temperature series, the year of the
+    holidays, the building type, building class and wind class, and it
+    scales linearly with the annual demand. It is stored in
+    System_B/cache/bdew, keyed on these inputs. A cache hit marks the profile
+    as recently used. When the cache is larger than max_cache_size_mb, the
+    least recently used profiles are deleted.
+
+    Parameters
+    ----------
+    temperature : pd.DataFrame or pd.Series
+        Hourly temperature in degree Celsius.
+
+    year : int
+        Year of the holidays.
+
+    shlp_type : str
+        BDEW building type, e.g. 'efh' or 'mfh'.
+
+    building_class, wind_class : int
+
+    use_cache : bool
+
+    max_cache_size_mb : float
+
+    Returns
+    -------
+    profile : pd.Series
+    """
+    if use_cache:
+        key = helpers.hash_content(hash_temperature(temperature), year, shlp_type,
+                                   building_class, wind_class, files=[os.path.abspath(__file__)])
+        cache_dir = helpers.get_cache_dir('bdew')
+        cache_file = os.path.join(cache_dir, key + '.npy')
+        if os.path.exists(cache_file):
+            # the modification time orders the profiles for the eviction
+            os.utime(cache_file, None)
+            return pd.Series(np.load(cache_file), index=temperature.index)
+
+    # demandlib and workalendar are only imported if a profile is calculated
+    import demandlib.bdew as bdew
+
+    profile = bdew.HeatBuilding(
+        temperature.index, holidays=get_holidays(year), temperature=temperature,
+        shlp_type=shlp_type,
+        building_class=building_class,
+        wind_class=wind_class,
+        annual_heat_demand=1,
+        name=shlp_type).get_bdew_profile()
+
+    if use_cache:
+        np.save(cache_file, np.asarray(profile, dtype=float))
+        removed = evict_cache(cache_dir, max_cache_size_mb)
+        if removed:
+            logging.info('Removed {0} BDEW profiles from the cache.'.format(len(removed)))
+
+    return pd.Series(np.asarray(profile, dtype=float), index=temperature.index)
+
+
+SHAPE_COLUMNS = ['shlp_type', 'building_class', 'wind_class']
+
+
+def get_heat_profiles(temperature, year, categories, use_cache=True,
+                      max_cache_size_mb=BDEW_CACHE_SIZE_MB, jobs=1):
+    r"""
+    Returns the BDEW heat profiles of many building categories as one
+    matrix.
+
+    The normalized profile of a category only depends on its building type,
+    building class and wind class. It is calculated once for each distinct
+    combination, in `jobs` processes. The matrix is then built in one step:
+    every category gets the row of its combination, scaled by its annual
+    demand. Hundreds of categories, e.g. building type and construction
+    year of many municipalities, cost the same as the few distinct
+    combinations.
+
+    Parameters
+    ----------
+    temperature : pd.DataFrame or pd.Series
+        Hourly temperature in degree Celsius, shared by all categories.
+
+    year : int
+        Year of the holidays.
+
+    categories : pd.DataFrame
+        One row per category with the columns 'shlp_type',
+        'building_class', 'wind_class' and 'annual_demand'.
+
+    use_cache, max_cache_size_mb
+        See `get_normalized_bdew_profile`.
+
+    jobs : int
+        Number of processes that calculate the profiles of the distinct
+        combinations.
+
+    Returns
+    -------
+    profiles : pd.DataFrame
+        Heat demand with the index of categories and one column per
+        timestep.
+    """
+    shapes = pd.MultiIndex.from_frame(categories[SHAPE_COLUMNS]).unique()
+    arguments = [(temperature, year) + tuple(shape) for shape in shapes]
+    kwargs = {'use_cache': use_cache, 'max_cache_size_mb': max_cache_size_mb}
+
+    if jobs > 1 and len(shapes) > 1:
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            futures = [executor.submit(get_normalized_bdew_profile, *args, **kwargs)
+                       for args in arguments]
+            normalized = [future.result() for future in futures]
+    else:
+        normalized = [get_normalized_bdew_profile(*args, **kwargs) for args in arguments]
+    normalized = np.vstack([np.asarray(profile, dtype=float) for profile in normalized])
+
+    position = shapes.get_indexer(pd.MultiIndex.from_frame(categories[SHAPE_COLUMNS]))
+    matrix = categories['annual_demand'].values.astype(float)[:, np.newaxis] * normalized[position]
+
+    return pd.DataFrame(matrix, index=categories.index, columns=temperature.index)
+
+
 def prepare_timeseries_demand_heat(year, bdew_parameters, temperature,
-                                   output_file):
+                                   output_file, use_cache=True,
+                                   max_cache_size_mb=BDEW_CACHE_SIZE_MB, jobs=1):
     """
     Creates synthetic heat profiles using the BDEW method.
+
+    The normalized profiles are taken from the cache if the temperature
+    series and the building parameters are the same as in an earlier run,
+    see `get_heat_profiles`.
+
+    Parameters
+    ----------
+    bdew_parameters : dict or pd.DataFrame
+        'annual_demand', 'building_class' and 'wind_class' by BDEW building
+        type, or the categories of `get_heat_profiles`.
     """
-    # get holidays for germany
-    cal = Germany()
-    holidays = dict(cal.holidays(year))
-
-    # create a DataFrame to hold the timeseries
-    demand = pd.DataFrame(
-        index=pd.date_range(pd.datetime(year, 1, 1, 0),
-                            periods=8760, freq='H'))
-    demand = pd.DataFrame(index=temperature.index)
-
-    for key, param in bdew_parameters.items():
-        demand[key] = bdew.HeatBuilding(
-                demand.index, holidays=holidays, temperature=temperature,
-                shlp_type=key,
-                building_class=param['building_class'],
-                wind_class=param['wind_class'],
-                annual_heat_demand=param['annual_demand'],
-                name=key).get_bdew_profile()
+    if isinstance(bdew_parameters, dict):
+        categories = pd.DataFrame.from_dict(bdew_parameters, orient='index')
+        categories['shlp_type'] = categories.index
+    else:
+        categories = bdew_parameters
+
+    profiles = get_heat_profiles(temperature, year, categories, use_cache=use_cache,
+                                 max_cache_size_mb=max_cache_size_mb, jobs=jobs)
 
     # save heat demand time series
-    demand.sum(axis=1).to_csv(output_file)
+    profiles.sum(axis=0).to_csv(output_file)
+
+def read_opsd(filename=OPSD_FILE, columns=('DE_price_day_ahead',), start=None, end=None,
+              chunksize=OPSD_CHUNKSIZE):
+    r"""
+    Streams the OPSD time series in chunks and keeps only the given columns
+    and the rows between start and end.
+
+    Parameters
+    ----------
+    filename : path
+        OPSD time_series_60min_singleindex.csv
+
+    columns : list of str
+        Columns to keep, e.g. 'DE_price_day_ahead'.
+
+    start, end : str or pd.Timestamp
+        First and last timestamp, local time of Germany if they have no
+        time zone. The reading stops after end.
+
+    chunksize : int
+        Number of rows per chunk.
+
+    Returns
+    -------
+    time_series : pd.DataFrame
+        Index in local time of Germany.
+    """
+    def localize(timestamp):
+        timestamp = pd.Timestamp(timestamp)
+        if timestamp.tzinfo is None:
+            timestamp = timestamp.tz_localize(OPSD_TIME_ZONE)
+        return timestamp
+
+    start = localize(start) if start is not None else None
+    end = localize(end) if end is not None else None
+
+    parts = []
+    for chunk in pd.read_csv(filename, usecols=['utc_timestamp'] + list(columns),
+                             chunksize=chunksize):
+        utc = pd.to_datetime(chunk['utc_timestamp'], utc=True)
+        keep = np.ones(len(chunk), dtype=bool)
+        if start is not None:
+            keep &= (utc >= start).values
+        if end is not None:
+            keep &= (utc <= end).values
+        if keep.any():
+            part = chunk.loc[keep, list(columns)]
+            part.index = pd.DatetimeIndex(utc[keep]).tz_convert(OPSD_TIME_ZONE)
+            parts.append(part)
+        if end is not None and utc.iloc[-1] > end:
+            # the rows are sorted by time
+            break
+
+    time_series = pd.concat(parts) if parts else pd.DataFrame(columns=list(columns))
+    time_series.index.name = 'cet_cest_timestamp'
+
+    return time_series
+
+
+def get_opsd_cache_dir(filename=OPSD_FILE):
+    r"""
+    Returns the directory of the cache of an OPSD file. It is keyed on the
+    path, size and modification time, so the file is not read to find it.
+    """
+    key = helpers.hash_content((os.path.abspath(filename), os.path.getsize(filename),
+                                os.path.getmtime(filename)))
+
+    return os.path.join(helpers.get_cache_dir('opsd'), key)
+
+
+def _write_year(cache_dir, year, parts):
+    year_dir = os.path.join(cache_dir, str(year))
+    # write into a new directory first, so that a parallel run never reads
+    # a half written year
+    tmp_dir = '{0}.tmp{1}'.format(year_dir, os.getpid())
+    if os.path.exists(tmp_dir):
+        shutil.rmtree(tmp_dir)
+    os.makedirs(tmp_dir)
+    data = pd.concat(parts)
+    np.save(os.path.join(tmp_dir, 'utc_timestamp.npy'),
+            pd.to_datetime(data['utc_timestamp'], utc=True).values.astype('datetime64[ns]').astype(np.int64))
+    for column in data.columns.drop('utc_timestamp'):
+        np.save(os.path.join(tmp_dir, column + '.npy'), data[column].values.astype(float))
+    try:
+        os.rename(tmp_dir, year_dir)
+    except OSError:
+        # another run has written the same year
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def build_opsd_cache(filename=OPSD_FILE, pattern='_price_day_ahead', chunksize=OPSD_CHUNKSIZE):
+    r"""
+    Converts the columns of an OPSD file that contain pattern into a
+    columnar cache with one directory per year (local time of Germany) and
+    one .npy file per column. The file is streamed in chunks and a year is
+    written as soon as it is complete.
+
+    Returns
+    -------
+    cache_dir : path
+    """
+    cache_dir = get_opsd_cache_dir(filename)
+    index_file = os.path.join(cache_dir, 'index.json')
+    if os.path.exists(index_file):
+        return cache_dir
+
+    header = pd.read_csv(filename, nrows=0).columns
+    columns = [column for column in header if pattern in column]
+
+    logging.info('Convert {0} columns of {1} into the cache.'.format(len(columns), filename))
+    buffered = {}
+    for chunk in pd.read_csv(filename, usecols=['utc_timestamp', 'cet_cest_timestamp'] + columns,
+                             chunksize=chunksize):
+        years = chunk.pop('cet_cest_timestamp').str[:4].astype(int)
+        for year, part in chunk.groupby(years.values):
+            buffered.setdefault(year, []).append(part)
+        # write the years that are complete
+        for year in [year for year in buffered if year < years.iloc[-1]]:
+            _write_year(cache_dir, year, buffered.pop(year))
+    for year in list(buffered):
+        _write_year(cache_dir, year, buffered.pop(year))
+
+    # the index marks the cache as complete, it is replaced atomically
+    years = sorted(int(name) for name in os.listdir(cache_dir) if name.isdigit())
+    tmp_file = '{0}.tmp{1}'.format(index_file, os.getpid())
+    with open(tmp_file, 'w') as f:
+        json.dump({'filename': os.path.abspath(filename), 'columns': columns, 'years': years}, f)
+    os.replace(tmp_file, index_file)
+
+    return cache_dir
+
+
+def get_opsd_time_series(column, years, filename=OPSD_FILE):
+    r"""
+    Returns a column of the OPSD file for some years from the cache. The
+    values are memory-mapped, only the requested years are read.
+
+    Parameters
+    ----------
+    column : str
+        E.g. 'DE_price_day_ahead'.
+
+    years : int or list of int
+        Years in local time of Germany.
+
+    Returns
+    -------
+    time_series : pd.Series
+        Index in local time of Germany.
+    """
+    cache_dir = build_opsd_cache(filename)
+    if isinstance(years, int):
+        years = [years]
+
+    parts = []
+    for year in years:
+        year_dir = os.path.join(cache_dir, str(year))
+        if not os.path.exists(os.path.join(year_dir, column + '.npy')):
+            raise ValueError('{0} of {1} is not in {2}.'.format(column, year, filename))
+        timestamps = pd.DatetimeIndex(np.load(os.path.join(year_dir, 'utc_timestamp.npy')),
+                                      tz='UTC').tz_convert(OPSD_TIME_ZONE)
+        parts.append(pd.Series(np.load(os.path.join(year_dir, column + '.npy'), mmap_mode='r'),
+                               index=timestamps, name=column))
+
+    time_series = pd.concat(parts) if len(parts) > 1 else parts[0]
+    time_series.index.name = 'cet_cest_timestamp'
+
+    return time_series
+
+
+def get_day_ahead_price(country, years, filename=OPSD_FILE, use_cache=True):
+    r"""
+    Returns the day ahead electricity price of a country, e.g. 'DE', in
+    EUR/MWh. Without the cache only the rows of the years are streamed
+    from the OPSD file, which is faster for a single lookup.
+    """
+    column = '{0}_price_day_ahead'.format(country)
+    if use_cache:
+        return get_opsd_time_series(column, years, filename)
+
+    if isinstance(years, int):
+        years = [years]
+    time_series = read_opsd(filename, columns=[column], start='{0}-01-01'.format(min(years)),
+                            end='{0}-12-31 23:00'.format(max(years)))[column]
+
+    return time_series[time_series.index.year.isin(years)]
+
+
+def _to_opsd_format(time_series):
+    time_series = time_series.copy()
+    time_series.index = time_series.index.strftime('%Y-%m-%dT%H:%M:%S%z')
+    time_series.index.name = 'cet_cest_timestamp'
+
+    return time_series
+
 
-def prepare_timeseries_price_gas():
+def prepare_timeseries_price_gas(year=2014, country='DE', use_cache=True):
     # prepare gas price time series
-    ger_day_ahead_prices_2006_2018 = pd.read_csv(abs_path +'/data/opsd-time_series-2018-06-30/time_series_60min_singleindex.csv', index_col='cet_cest_timestamp')['DE_price_day_ahead']
-    print(ger_day_ahead_prices_2006_2018)
-    ger_day_ahead_prices_2014 = ger_day_ahead_prices_2006_2018.loc['2014-01-01T00:00:00+0100':'2014-12-31T23:00:00+0100']
-    ger_day_ahead_prices_2006_2018.to_csv(abs_path+'/data/'+'day_ahead_price_el_2006_2018.csv')
-    ger_day_ahead_prices_2014.to_csv(abs_path+'/data/'+'day_ahead_price_el_2014.csv')
+    if use_cache:
+        with open(os.path.join(build_opsd_cache(), 'index.json'), 'r') as f:
+            years = json.load(f)['years']
+        day_ahead_prices = get_day_ahead_price(country, years)
+    else:
+        column = '{0}_price_day_ahead'.format(country)
+        day_ahead_prices = read_opsd(columns=[column])[column]
+        years = sorted(set(day_ahead_prices.index.year))
+    day_ahead_prices_year = get_day_ahead_price(country, year, use_cache=use_cache)
+    _to_opsd_format(day_ahead_prices).to_csv(
+        abs_path + '/data/' + 'day_ahead_price_el_{0}_{1}.csv'.format(years[0], years[-1]))
+    _to_opsd_format(day_ahead_prices_year).to_csv(
+        abs_path + '/data/' + 'day_ahead_price_el_{0}.csv'.format(year))
 
 def prepare_timeseries_price_electricity():
     # prepare electricity price time series
@@ -97,7 +482,9 @@ def prepare_timeseries(config_path, results_dir):
                        'mfh':{'annual_demand': 0.642795 * 232000000, 'building_class': 4, 'wind_class': 1}}
 
     prepare_timeseries_demand_heat(2017, bdew_parameters, temperature,
-                                   os.path.join(results_dir, cfg['timeseries']['timeseries_demand_heat']))
+                                   os.path.join(results_dir, cfg['timeseries']['timeseries_demand_heat']),
+                                   use_cache=cfg.get('use_cache', True),
+                                   max_cache_size_mb=cfg.get('bdew_cache_size_mb', BDEW_CACHE_SIZE_MB))
 
 if __name__ == '__main__':
     config_path, results_dir = helpers.setup_experiment()
@@ -1,63 +1,145 @@
-import pandas as pd
-import matplotlib.pyplot as plt
-import numpy as np
+"""
+Preprocessing of the closed heat feedin data of Dessau.
+
+The workbook has one sheet per month with the minimal and maximal heat
+feedin of every day. All sheets are read in one pass, optionally split
+over several processes, and the cleaned feedin is stored as pickle in
+System_B/cache/closed_data. The key of the cache is the content hash of
+the workbook and of this module, so later runs skip the Excel parsing
+until the workbook changes.
+
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+import logging
 import os
+import pickle
+import numpy as np
+import pandas as pd
+import yaml
 import helpers
 
+abs_path = os.path.dirname(os.path.abspath(os.path.join(__file__, '..')))
+
+WORKBOOK = os.path.join(abs_path, 'data_raw/heat_demand/Primaer_Waermeleistung_17.xlsm')
+MONTHS = ['Januar', 'Februar', 'März', 'April', 'Mai', 'Juni', 'Juli', 'August', 'September',
+          'Oktober', 'November', 'Dezember']
+COLUMNS = ['Zeit', 'V:m3/h', 'Q:MW', 'At:°C', 'Zeit.1', 'V:m3/h.1', 'Q:MW.1', 'At:°C.1', 'dAt:°C']
+
 
-def preprocess_heat_feedin_timeseries():
+def read_sheets(filename, sheets):
     r"""
-    Cleans the heat feedin timeseries.
+    Reads sheets of the workbook with one opening of the file.
 
     Returns
     -------
-    heat_profile_dessau
+    sheets : dict
+        DataFrame by sheet name.
     """
-    raw_heat_profile = pd.ExcelFile('data_raw/heat_demand/Primaer_Waermeleistung_17.xlsm')
+    return pd.read_excel(filename, sheet_name=list(sheets), header=3, index_col=0,
+                         usecols=(1, 2, 3, 4, 5, 6, 7, 8, 9, 10))
 
-    heat_profile_dessau = pd.DataFrame(columns = ['V:m3/h', 'Q:MW', 'At:°C'])
 
+def read_workbook(filename=WORKBOOK, jobs=1):
+    r"""
+    Reads all month sheets of the workbook.
 
-    for month in ['Januar', 'Februar', 'März', 'April', 'Mai', 'Juni', 'Juli', 'August', 'September', 'Oktober', 'November', 'Dezember']:
+    Parameters
+    ----------
+    filename : path
 
-        # parse month sheet from excel
-        heat_profile_month = raw_heat_profile.parse(month, header=3, index_col=(0), usecols=(1,2,3,4,5,6,7,8,9,10))
-        heat_profile_month.index.names = ['date']
+    jobs : int
+        Number of processes, each reads a part of the months.
 
-        # stop at the last day of the month
-        heat_profile_month = heat_profile_month[:-5]
-        heat_profile_month = heat_profile_month.replace({'Linienstörung': np.nan})
-        heat_profile_month = heat_profile_month.dropna(how='all')
+    Returns
+    -------
+    sheets : dict
+        DataFrame by month.
+    """
+    if jobs <= 1:
+        return read_sheets(filename, MONTHS)
 
-        # rename columns
-        heat_profile_month.columns = ['Zeit', 'V:m3/h', 'Q:MW', 'At:°C', 'Zeit.1', 'V:m3/h.1', 'Q:MW.1', 'At:°C.1', 'dAt:°C']
+    parts = [part for part in np.array_split(MONTHS, jobs) if len(part)]
+    sheets = {}
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        for result in executor.map(read_sheets, [filename] * len(parts), parts):
+            sheets.update(result)
 
-        # split min and max timeseries
-        heat_profile_month_max = heat_profile_month[['Zeit', 'V:m3/h', 'Q:MW', 'At:°C']]
-        heat_profile_month_min = heat_profile_month[['Zeit.1', 'V:m3/h.1', 'Q:MW.1', 'At:°C.1']]
-        heat_profile_month_min.columns = ['Zeit', 'V:m3/h', 'Q:MW', 'At:°C']
+    return sheets
 
-        # convert index to datetimeindex
-        dates = heat_profile_month_max.index.get_level_values('date')
-        times = heat_profile_month_max['Zeit']
-        heat_profile_month_max.index = pd.to_datetime(dates.astype(str) + ' ' + times.astype(str))
 
-        dates = heat_profile_month_min.index.get_level_values('date')
-        times = heat_profile_month_min['Zeit']
-        heat_profile_month_min.index = pd.to_datetime(dates.astype(str) + ' ' + times.astype(str))
+def to_timestamps(dates, times):
+    r"""
+    Adds the times of day to the dates.
+    """
+    return (pd.to_datetime(dates).normalize() +
+            pd.to_timedelta(pd.Series(times).astype(str).values))
+
 
-        # combine min and max timeseries
-        heat_profile_month = pd.concat([heat_profile_month_min.drop('Zeit', axis=1), heat_profile_month_max.drop('Zeit', axis=1)], sort=False)
-        heat_profile_month = heat_profile_month.sort_index()
+def clean_month(heat_profile_month):
+    r"""
+    Returns the minimal and maximal feedin of a month sheet as one
+    timeseries.
+    """
+    heat_profile_month.index.names = ['date']
 
-        # concatenate with the year profile
-        heat_profile_dessau = pd.concat([heat_profile_dessau, heat_profile_month], sort=False)
+    # stop at the last day of the month
+    heat_profile_month = heat_profile_month[:-5]
+    heat_profile_month = heat_profile_month.replace({'Linienstörung': np.nan})
+    heat_profile_month = heat_profile_month.dropna(how='all')
+    heat_profile_month.columns = COLUMNS
+
+    # split min and max timeseries
+    parts = []
+    dates = heat_profile_month.index.get_level_values('date')
+    for suffix in ['.1', '']:
+        part = heat_profile_month[[column + suffix for column in COLUMNS[:4]]]
+        part.columns = COLUMNS[:4]
+        part.index = to_timestamps(dates, part['Zeit'])
+        parts.append(part.drop('Zeit', axis=1))
+
+    return pd.concat(parts, sort=False)
+
+
+def preprocess_heat_feedin_timeseries(filename=WORKBOOK, use_cache=True, jobs=1):
+    r"""
+    Cleans the heat feedin timeseries.
+
+    Parameters
+    ----------
+    filename : path
+        Workbook with the month sheets.
+
+    use_cache : bool
+        Take the result from the cache if the workbook is unchanged.
+
+    jobs : int
+        Number of processes that read the workbook.
+
+    Returns
+    -------
+    heat_profile_dessau
+    """
+    if use_cache:
+        key = helpers.hash_content(files=[filename, os.path.abspath(__file__)])
+        cache_file = os.path.join(helpers.get_cache_dir('closed_data'), key + '.pkl')
+        if os.path.exists(cache_file):
+            logging.info('Found the heat feedin of {0} in the cache.'.format(filename))
+            with open(cache_file, 'rb') as f:
+                return pickle.load(f)
+
+    sheets = read_workbook(filename, jobs=jobs)
+
+    # the months in order, each with a stable sort of its min and max values
+    heat_profile_dessau = pd.concat(
+        [clean_month(sheets[month]).sort_index(kind='mergesort') for month in MONTHS], sort=False)
+    heat_profile_dessau = heat_profile_dessau.apply(pd.to_numeric, errors='coerce')
 
     heat_profile_dessau.index.name = 'Zeit'
     heat_profile_dessau['Q:kW'] = heat_profile_dessau['Q:MW'] * 1000 # convert from MW to kW
 
     # remove duplicate indices
-    heat_profile_dessau = heat_profile_dessau.reset_index().drop_duplicates(subset='Zeit', keep='first').set_index('Zeit')
+    heat_profile_dessau = heat_profile_dessau[~heat_profile_dessau.index.duplicated(keep='first')]
 
     # reindex and interpolate
     ix = pd.date_range('1/1/2017',
@@ -70,6 +152,10 @@ def preprocess_heat_feedin_timeseries():
     # keep only heat profile Q:kW
     heat_profile_dessau = heat_profile_dessau['Q:kW']
 
+    if use_cache:
+        with open(cache_file, 'wb') as f:
+            pickle.dump(heat_profile_dessau, f, protocol=pickle.HIGHEST_PROTOCOL)
+
     return heat_profile_dessau
 
 
@@ -81,6 +167,7 @@ def plot_compare_heat_profiles(config_path, results_dir):
     -------
     None
     """
+    import matplotlib.pyplot as plt
 
     demand_heat = pd.read_csv(os.path.join(results_dir, 'data_preprocessed/demand_heat.csv'), index_col=0,
                               names=['demand_heat'], parse_dates=True)
@@ -101,7 +188,7 @@ def plot_compare_heat_profiles(config_path, results_dir):
     return None
 
 
-def preprocess_closed_data(config_path, results_dir):
+def preprocess_closed_data(config_path, results_dir, plot=True):
     r"""
     Runs the closed data preprocessing pipeline.
 
@@ -111,15 +198,23 @@ def preprocess_closed_data(config_path, results_dir):
 
     results_dir: path
 
+    plot: bool
+        Compare the heat feedin with the demandlib profile. This needs the
+        preprocessed heat demand.
+
     Returns
     -------
     None
 
     """
-    heat_profile_dessau = preprocess_heat_feedin_timeseries()
+    with open(config_path, 'r') as ymlfile:
+        cfg = yaml.load(ymlfile)
+
+    heat_profile_dessau = preprocess_heat_feedin_timeseries(use_cache=cfg.get('use_cache', True))
     heat_profile_dessau.to_csv(os.path.join(results_dir, 'data_preprocessed/heat_profile_dessau.csv'))
 
-    plot_compare_heat_profiles(config_path, results_dir)
+    if plot:
+        plot_compare_heat_profiles(config_path, results_dir)
 
     return None
 
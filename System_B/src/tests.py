@@ -1,5 +1,12 @@
 import os
+import tempfile
+import pandas as pd
 from main import main
+from pipeline import Stage, run_pipeline
+from postprocess import get_kpis
+from preprocess import evict_cache
+import oemof.solph as solph
+from model_tools import pruning, sparse_lp, timeseries_store
 
 
 def test_run_debug():
@@ -22,5 +29,174 @@ def test_run_debug():
     main(config_path, results_dir)
 
 
+def write_input_copy(config_path, results_dir):
+    with open(os.path.join(results_dir, 'input.txt')) as f:
+        content = f.read()
+    with open(os.path.join(results_dir, 'output.txt'), 'w') as f:
+        f.write(content)
+
+
+def test_pipeline_skips_unchanged_stages():
+    with tempfile.TemporaryDirectory() as results_dir:
+        config_path = os.path.join(results_dir, 'config.yml')
+        with open(config_path, 'w') as f:
+            f.write('debug: True')
+        input_file = os.path.join(results_dir, 'input.txt')
+        with open(input_file, 'w') as f:
+            f.write('a')
+
+        stages = [Stage('copy', write_input_copy, inputs=[input_file],
+                        outputs=[os.path.join(results_dir, 'output.txt')])]
+
+        assert run_pipeline(stages, config_path, results_dir) == ['copy']
+        assert run_pipeline(stages, config_path, results_dir) == []
+        assert run_pipeline(stages, config_path, results_dir, only=['copy']) == ['copy']
+
+        with open(input_file, 'w') as f:
+            f.write('b')
+        assert run_pipeline(stages, config_path, results_dir) == ['copy']
+
+
+def test_pipeline_imports_named_stage_functions():
+    with tempfile.TemporaryDirectory() as results_dir:
+        config_path = os.path.join(results_dir, 'config.yml')
+        with open(config_path, 'w') as f:
+            f.write('debug: True')
+        with open(os.path.join(results_dir, 'input.txt'), 'w') as f:
+            f.write('a')
+
+        stages = [Stage('copy', 'tests:write_input_copy',
+                        outputs=[os.path.join(results_dir, 'output.txt')])]
+
+        assert run_pipeline(stages, config_path, results_dir) == ['copy']
+        assert run_pipeline(stages, config_path, results_dir) == []
+
+
+def test_evict_cache_keeps_recently_used_profiles():
+    with tempfile.TemporaryDirectory() as cache_dir:
+        for number, name in enumerate(['old', 'used', 'new']):
+            filename = os.path.join(cache_dir, name + '.npy')
+            with open(filename, 'wb') as f:
+                f.write(b'0' * 1024)
+            os.utime(filename, (number, number))
+        # a cache hit marks a profile as recently used
+        os.utime(os.path.join(cache_dir, 'used.npy'), (3, 3))
+
+        assert evict_cache(cache_dir, 2.5 / 1024) == ['old.npy']
+        assert sorted(os.listdir(cache_dir)) == ['new.npy', 'used.npy']
+
+
+def test_timeseries_store_round_trip():
+    with tempfile.TemporaryDirectory() as store_dir:
+        # the index crosses the end of daylight saving time
+        index = pd.date_range('2017-10-28 22:00', periods=8, freq='h', tz='Europe/Berlin')
+        data = pd.DataFrame({'demand_heat': [1.5, 2., 2.5, 3., 3.5, 4., 4.5, 5.],
+                             'hour': range(8)}, index=index)
+        timeseries_store.write('demand', data, store_dir=store_dir)
+
+        assert timeseries_store.read('demand', store_dir=store_dir).equals(data)
+        assert timeseries_store.read('demand', columns=['hour'], start=2, stop=5,
+                                     store_dir=store_dir).equals(data[['hour']].iloc[2:5])
+
+        filename = os.path.join(store_dir, 'demand.csv')
+        data.reset_index(drop=True).to_csv(filename, sep=';', index=False)
+        reference = pd.read_csv(filename, sep=';')
+        for _ in range(2):
+            read = timeseries_store.read_csv(filename, store_dir=store_dir, sep=';')
+            assert read.equals(reference)
+        assert timeseries_store.read_csv(
+            filename, columns=['demand_heat'], n_timesteps=3, store_dir=store_dir,
+            sep=';').equals(reference[['demand_heat']].iloc[:3])
+
+
+def test_kpis_of_single_flow():
+    timeindex = pd.date_range('2017-01-01', periods=4, freq='h')
+    results = {
+        'main': {('hwe', 'heat_prim'): {
+            'sequences': pd.DataFrame({'flow': [0, 2, 2, 0.]}, index=timeindex),
+            'scalars': pd.Series(dtype=float)}},
+        'param': {('hwe', 'heat_prim'): {
+            'sequences': pd.DataFrame(),
+            'scalars': pd.Series({'nominal_value': 2., 'variable_costs': 10.})}}}
+
+    kpis = get_kpis(results).set_index('var_name')['var_value']
+
+    assert kpis['summed_production'] == 4
+    assert kpis['variable_costs'] == 40
+    assert kpis['full_load_hours'] == 2
+    assert kpis['start_count'] == 1
+
+
+def test_prune_merges_identical_transformers():
+    energysystem = solph.EnergySystem(
+        timeindex=pd.date_range('2017-01-01', periods=3, freq='h'))
+    bgas = solph.Bus(label='natural_gas')
+    bel = solph.Bus(label='electricity')
+    energysystem.add(bgas, bel)
+    energysystem.add(solph.Source(label='gas', outputs={bgas: solph.Flow()}))
+    energysystem.add(solph.Sink(label='demand', inputs={bel: solph.Flow(
+        actual_value=[1, 2, 3], fixed=True, nominal_value=1)}))
+    energysystem.add(solph.Sink(label='excess', inputs={bel: solph.Flow(nominal_value=0)}))
+    for label in ['GuD', 'SDEuD']:
+        energysystem.add(solph.Transformer(
+            label=label,
+            inputs={bgas: solph.Flow(variable_costs=30)},
+            outputs={bel: solph.Flow(nominal_value=10)},
+            conversion_factors={bel: 0.5}))
+
+    pruned, report = pruning.prune_energysystem(energysystem)
+
+    assert sorted(str(node) for node in pruned.nodes) == [
+        'GuD', 'demand', 'electricity', 'gas', 'natural_gas']
+    assert report['removed_nodes'] == ['excess']
+    assert report['merged'] == {'GuD': {'SDEuD': 0.5}}
+    assert pruned.groups['GuD'].outputs[bel].nominal_value == 20
+
+
+def test_prune_keeps_transformers_of_different_proportions():
+    energysystem = solph.EnergySystem(
+        timeindex=pd.date_range('2017-01-01', periods=3, freq='h'))
+    bgas = solph.Bus(label='natural_gas')
+    bel = solph.Bus(label='electricity')
+    energysystem.add(bgas, bel)
+    energysystem.add(solph.Source(label='gas', outputs={bgas: solph.Flow()}))
+    energysystem.add(solph.Sink(label='demand', inputs={bel: solph.Flow(
+        actual_value=[1, 2, 3], fixed=True, nominal_value=1)}))
+    for label, nominal_values in [('GuD', (10, 20)), ('SDEuD', (20, 10))]:
+        energysystem.add(solph.Transformer(
+            label=label,
+            inputs={bgas: solph.Flow(nominal_value=nominal_values[0])},
+            outputs={bel: solph.Flow(nominal_value=nominal_values[1])},
+            conversion_factors={bel: 0.5}))
+
+    pruned, report = pruning.prune_energysystem(energysystem)
+
+    assert report['merged'] == {}
+    assert 'SDEuD' in [str(node) for node in pruned.nodes]
+
+
+def test_sparse_lp_shifts_demand_with_storage():
+    energysystem = solph.EnergySystem(
+        timeindex=pd.date_range('2017-01-01', periods=3, freq='h'))
+    bth = solph.Bus(label='heat')
+    energysystem.add(bth)
+    energysystem.add(solph.Source(label='hwe', outputs={bth: solph.Flow(
+        variable_costs=[10, 30, 30], nominal_value=5)}))
+    energysystem.add(solph.Sink(label='demand', inputs={bth: solph.Flow(
+        actual_value=[1, 2, 2], fixed=True, nominal_value=1)}))
+    storage = solph.components.GenericStorage(
+        label='storage', nominal_capacity=10, initial_capacity=0,
+        inputs={bth: solph.Flow()}, outputs={bth: solph.Flow()})
+    energysystem.add(storage)
+
+    assert sparse_lp.get_unsupported(energysystem) == []
+    results = sparse_lp.solve(energysystem)
+
+    assert round(results['meta']['objective'], 6) == 50
+    hwe = energysystem.groups['hwe']
+    assert list(results['main'][(hwe, bth)]['sequences']['flow'].round(6)) == [5, 0, 0]
+    assert list(results['main'][(storage, None)]['sequences']['capacity'].round(6)) == [4, 2, 0]
+
+
 if __name__ == '__main__':
     test_run_debug()
\ No newline at end of file
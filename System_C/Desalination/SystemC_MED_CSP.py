@@ -20,16 +20,25 @@ import pyomo.environ as po
 import oemof.outputlib as outputlib
 
 import logging
+import os
+import sys
 import time
 import pandas as pd
 
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+from model_tools import aggregation, model_report, results_store, timeseries_store
+
 # import oemof plots
 try:
     import matplotlib.pyplot as plt
 except ImportError:
     plt = None
 
+solver = 'cbc'  # 'glpk', 'gurobi',....
+dump_path = 'dumps'  # Directory of the dumps, results and reports
 number_of_time_steps = 500
+typical_days = 0  # Solve on typical days to size the system, 0: all days
+check_scaling = False  # Check the coefficients for bad scaling before solving
 
 # initiate the logger
 logger.define_logging(logfile='oemof_example.log',
@@ -43,7 +52,21 @@ date_time_index = pd.date_range('1/1/2017', periods=number_of_time_steps,
 
 # Read data file
 # Import  PV and demand data
-data = pd.read_csv('data_input/example_wat3.csv', sep=';',)
+data = timeseries_store.read_csv('data_input/example_wat3.csv', sep=';')
+
+# Reduce the data to typical days, every timestep is weighted with the
+# number of days it represents
+full_data = data
+aggregated = None
+if typical_days:
+    if number_of_time_steps % 24:
+        raise ValueError(
+            'Typical days need whole days, but number_of_time_steps is {0}.'.format(
+                number_of_time_steps))
+    aggregated = aggregation.aggregate(data, ['demand_wat', 'pv'],
+                                       typical_days, number_of_time_steps)
+    data = aggregated['data']
+    date_time_index = pd.date_range('1/1/2017', periods=len(data), freq='H')
 
 # Initialise the energysystem
 energysystem = solph.EnergySystem(timeindex=date_time_index)
@@ -158,7 +181,12 @@ energysystem.add(storage_thh, storage_wat, storage_el)
 ########################################
 
 # Initialise the operational model (create problem) with constrains
-om = solph.Model(energysystem)
+if aggregated is None:
+    om = solph.Model(energysystem)
+else:
+    om = solph.Model(energysystem,
+                     objective_weighting=list(aggregated['weights']))
+    aggregation.add_periodic_storage_constraints(om, len(data) // 24)
 
 ### Add own constrains ###
 # Get value for components withouta name
@@ -172,14 +200,34 @@ myconstrains.PB_size = po.Constraint(expr=(
 myconstrains.storage_size = po.Constraint(expr=(
         om.GenericInvestmentStorageBlock.invest[storage_thh] <= 5*om.InvestmentFlow.invest[bthh, PB]))
 
+report = model_report.check_model(
+    om, 'MED_CSP', os.path.join(dump_path, "MED_CSP_model_report.json"),
+    coefficients=check_scaling, solver=solver)
+
 # Set tee to True to get the solver output
-om.solve(solver='cbc', solve_kwargs={'tee': True})
+starttime = time.time()
+om.solve(solver=solver, solve_kwargs={'tee': True})
+model_report.record_solve_time(report, time.time() - starttime, solver)
 
 energysystem.results['main'] = outputlib.processing.results(om)
 energysystem.results['meta'] = outputlib.processing.meta_results(om)
 energysystem.results['param'] = outputlib.processing.param_results(om)
 
-# store the results to plot them in other file
+# store the results to plot them in other file, the results store has a
+# fixed name so that an aggregated run finds the last full run
 timestr = time.strftime("%Y%m%d-%H%M")
-energysystem.dump(dpath="C:\Git_clones\oemof_heat\Dumps",
+results_path = os.path.join(dump_path, "MED_CSP.results")
+
+if aggregated is not None:
+    aggregation.disaggregate_results(
+        energysystem.results, aggregated,
+        pd.date_range('1/1/2017', periods=len(aggregated['order']) * 24,
+                      freq='H'))
+    aggregation.write_report(
+        os.path.join(dump_path, "MED_CSP_"+timestr+"_aggregation.csv"),
+        full_data, aggregated, ['demand_wat', 'pv'], energysystem.results,
+        aggregation.get_reference_store(results_path))
+
+energysystem.dump(dpath=dump_path,
                   filename="MED_CSP_"+timestr+".oemof")
+results_store.write_results(energysystem.results, results_path)
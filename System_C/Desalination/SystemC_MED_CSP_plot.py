@@ -30,7 +30,7 @@ except ImportError:
     plt = None
 
 energysystem = solph.EnergySystem()
-energysystem.restore(dpath="C:\Git_clones\oemof_heat\Dumps",
+energysystem.restore(dpath="dumps",
                      filename="MED_CSP_20180530-1514.oemof")
 
 start_of_plot = 000
@@ -22,18 +22,26 @@ import oemof_visio as oev
 # import oemof base classes to create energy system objects
 import logging
 import os
+import sys
+import time
 import pandas as pd
 import pprint as pp
 
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+from model_tools import aggregation, model_report, results_store, timeseries_store
+
 # import oemof plots
 try:
     import matplotlib.pyplot as plt
 except ImportError:
     plt = None
 
-# solver = 'cbc'  # 'glpk', 'gurobi',....
+solver = 'cbc'  # 'glpk', 'gurobi',....
+dump_path = 'dumps'  # Directory of the dumps, results and reports
 debug = False  # Set number_of_timesteps to 3 to get a readable lp-file.
 number_of_time_steps = 24*365
+typical_days = 0  # Solve on typical days to size the system, 0: all days
+check_scaling = False  # Check the coefficients for bad scaling before solving
 # solver_verbose = False  # show/hide solver output
 
 # Initiate the logger (see the API docs for more information)
@@ -48,7 +56,21 @@ date_time_index = pd.date_range('1/1/2017', periods=number_of_time_steps,
 
 # Read data file
 # Import  PV and demand data
-data = pd.read_csv('data_input/example_wat3.csv', sep=';',)
+data = timeseries_store.read_csv('data_input/example_wat3.csv', sep=';')
+
+# Reduce the data to typical days, every timestep is weighted with the
+# number of days it represents
+full_data = data
+aggregated = None
+if typical_days:
+    if number_of_time_steps % 24:
+        raise ValueError(
+            'Typical days need whole days, but number_of_time_steps is {0}.'.format(
+                number_of_time_steps))
+    aggregated = aggregation.aggregate(data, ['demand_wat', 'pv'],
+                                       typical_days, number_of_time_steps)
+    data = aggregated['data']
+    date_time_index = pd.date_range('1/1/2017', periods=len(data), freq='H')
 
 # initialisation of the energysystem
 energysystem = solph.EnergySystem(timeindex=date_time_index)
@@ -131,9 +153,20 @@ logging.info('System build')
 ######################################
 
 # initialise the operational model (create problem)
-om = solph.Model(energysystem)
+if aggregated is None:
+    om = solph.Model(energysystem)
+else:
+    om = solph.Model(energysystem,
+                     objective_weighting=list(aggregated['weights']))
+    aggregation.add_periodic_storage_constraints(om, len(data) // 24)
+report = model_report.check_model(
+    om, 'RO_PV', os.path.join(dump_path, "RO_PV_model_report.json"),
+    coefficients=check_scaling, solver=solver)
+
 # set tee to True to get the solver output
-om.solve(solver='cbc', solve_kwargs={'tee': True})
+starttime = time.time()
+om.solve(solver=solver, solve_kwargs={'tee': True})
+model_report.record_solve_time(report, time.time() - starttime, solver)
 
 logging.info('Modell erstellt')
 
@@ -144,7 +177,19 @@ logging.info('results received')
 
 ### Dump results ###
 
-energysystem.dump(dpath="C:\Git_clones\oemof_heat\Dumps", filename="RO_PV.oemof")
+if aggregated is not None:
+    aggregation.disaggregate_results(
+        energysystem.results, aggregated,
+        pd.date_range('1/1/2017', periods=len(aggregated['order']) * 24,
+                      freq='H'))
+    aggregation.write_report(
+        os.path.join(dump_path, "RO_PV_aggregation.csv"),
+        full_data, aggregated, ['demand_wat', 'pv'], energysystem.results,
+        aggregation.get_reference_store(os.path.join(dump_path, "RO_PV.results")))
+
+energysystem.dump(dpath=dump_path, filename="RO_PV.oemof")
+results_store.write_results(energysystem.results,
+                            os.path.join(dump_path, "RO_PV.results"))
 
 #########################
 # Work with the results #
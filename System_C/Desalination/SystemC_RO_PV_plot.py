@@ -19,7 +19,7 @@ import oemof_visio as oev
 import pprint as pp
 
 energysystem = solph.EnergySystem()
-energysystem.restore(dpath="C:\Git_clones\oemof_heat\Dumps", filename="RO_PV.oemof")
+energysystem.restore(dpath="dumps", filename="RO_PV.oemof")
 timeframe_to_plot=24*7
 
 water_bus = outputlib.views.node(energysystem.results['main'], 'water')
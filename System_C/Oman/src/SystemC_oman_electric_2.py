@@ -50,15 +50,20 @@ import oemof.outputlib as outputlib
 
 import logging
 import os
+import sys
+import time
 import yaml
 import pandas as pd
 import pyomo.environ as po
 
-# import oemof plots
-try:
-    import matplotlib.pyplot as plt
-except ImportError:
-    plt = None
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../..')))
+from model_tools import (aggregation, constraints, model_report, profiling,
+                         pruning, results_store, solver as sweep_solver,
+                         timeseries_store)
+
+
+# Time series that are used to find the typical days
+TIME_SERIES_COLUMNS = ['PV normiert', 'Cooling load kW']
 
 
 def ep_costs_func(capex, n, opex, wacc):
@@ -68,6 +73,8 @@ def ep_costs_func(capex, n, opex, wacc):
 
 def run_model_electric(config_path, var_number):
 
+    profiling.start('oman_electric_{0}'.format(var_number))
+    profiling.begin('data load')
     with open(config_path, 'r') as ymlfile:
         cfg = yaml.load(ymlfile)
 
@@ -106,7 +113,22 @@ def run_model_electric(config_path, var_number):
     param_value = param_df['value']
 
     # Import  PV and demand data
-    data = pd.read_csv((data_ts_path + cfg['time_series_file_name']), sep=';')
+    data = timeseries_store.read_csv(data_ts_path + cfg['time_series_file_name'], sep=';')
+
+    profiling.end()
+
+    # Reduce the data to typical days, every timestep is weighted with the
+    # number of days it represents
+    full_data = data
+    typical_days = None
+    weights = [1] * number_of_time_steps
+    if cfg.get('typical_days') and not debug:
+        typical_days = aggregation.aggregate(
+            data, TIME_SERIES_COLUMNS, cfg['typical_days'],
+            number_of_time_steps)
+        data = typical_days['data']
+        number_of_time_steps = len(data)
+        weights = typical_days['weights']
 
     # Redefine ep_costs_function:
     def ep_costs_f(capex, n, opex):
@@ -120,6 +142,7 @@ def run_model_electric(config_path, var_number):
         screen_level=logging.INFO,
         file_level=logging.DEBUG)
 
+    profiling.begin('energy system build')
     date_time_index = pd.date_range('1/1/2017',
                                     periods=number_of_time_steps,
                                     freq='H')
@@ -294,44 +317,96 @@ def run_model_electric(config_path, var_number):
             nominal_capacity=param_value['nominal_capacitiy_stor_el'])
 
     energysystem.add(stor_co, stor_el)
+    profiling.end()
+
+    if cfg.get('prune_model', False):
+        with profiling.phase('pruning'):
+            energysystem, _ = pruning.prune_energysystem(energysystem)
 
     ########################################
     # Create a model and solve the problem #
     ########################################
 
     # Initialise the operational model (create the problem) with constrains
-    model = solph.Model(energysystem)
+    profiling.begin('model construction')
+    if typical_days is None:
+        model = solph.Model(energysystem)
+    else:
+        model = solph.Model(energysystem, objective_weighting=list(weights))
+        aggregation.add_periodic_storage_constraints(
+            model, number_of_time_steps // 24)
 
     # ## Add own constrains ## #
     # Create a block and add it to the system
     myconstrains = po.Block()
     model.add_component('MyBlock', myconstrains)
-    demand_sum = sum(data['Cooling load kW'])
-    myconstrains.solar_constr = po.Constraint(
-        expr=((sum(model.flow[grid_el, bel, t] for t in model.TIMESTEPS))
-              <= (demand_sum / param_value[
-                    'conv_factor_compression_output_cool']
-                  * param_value['sol_fraction_el']
-                  * float(param_value['sol_fraction_el_variation']))))
+    if typical_days is None:
+        demand_sum = sum(data['Cooling load kW'])
+    else:
+        demand_sum = sum(data['Cooling load kW'] * weights)
+    # a grid without capacity is removed by the pruning, its flow is zero
+    solar_flows = pruning.get_kept_flows(energysystem, [(grid_el, bel)])
+    if solar_flows:
+        constraints.add_annual_limit(
+            model, 'solar_constr', solar_flows,
+            (demand_sum / param_value['conv_factor_compression_output_cool']
+             * param_value['sol_fraction_el']
+             * float(param_value['sol_fraction_el_variation'])),
+            weights=weights, block=myconstrains)
+    profiling.end()
+
+    report = model_report.check_model(
+        model, 'oman_electric',
+        results_path + '/model_reports/oman_electric_Ires_{0}_{1}.json'.format(
+            cfg['exp_number'], var_number),
+        coefficients=cfg.get('check_scaling', False), solver=solver)
 
     logging.info('Solve the optimization problem')
-    model.solve(solver=solver, solve_kwargs={'tee': solver_verbose})
+    with profiling.phase('solver'):
+        starttime = time.time()
+        solved_with = sweep_solver.solve_model(model, solver, solve_kwargs={'tee': solver_verbose})
+        model_report.record_solve_time(report, time.time() - starttime, solved_with)
 
     if debug:
         filename = (results_path + '/lp_files/'
                     + 'Oman_electric_Ires_{0}_{1}.lp'.format(cfg['exp_number'],
                                                              var_number))
         logging.info('Store lp-file in {0}.'.format(filename))
-        model.write(filename, io_options={'symbolic_solver_labels': True})
+        with profiling.phase('lp write'):
+            model.write(filename, io_options={'symbolic_solver_labels': True})
 
     logging.info('Store the energy system with the results.')
 
+    profiling.begin('results processing')
     energysystem.results['main'] = outputlib.processing.results(model)
     energysystem.results['meta'] = outputlib.processing.meta_results(model)
     energysystem.results['param'] = (
         outputlib.processing.parameter_as_dict(model))
-
-    energysystem.dump(
-        dpath=(results_path + '/dumps'),
-        filename='oman_electric_Ires_{0}_{1}.oemof'.format(
-            cfg['exp_number'], var_number))
+    pruning.add_report(energysystem)
+
+    store_path = (results_path
+                  + '/dumps/oman_electric_Ires_{0}_{1}.results'.format(
+                      cfg['exp_number'], var_number))
+
+    if typical_days is not None:
+        aggregation.disaggregate_results(
+            energysystem.results, typical_days,
+            pd.date_range('1/1/2017', periods=len(typical_days['order']) * 24,
+                          freq='H'))
+        aggregation.write_report(
+            results_path + '/aggregation/oman_electric_Ires_{0}_{1}.csv'.format(
+                cfg['exp_number'], var_number),
+            full_data, typical_days, TIME_SERIES_COLUMNS,
+            energysystem.results, aggregation.get_reference_store(store_path))
+    profiling.end()
+
+    with profiling.phase('dump'):
+        energysystem.dump(
+            dpath=(results_path + '/dumps'),
+            filename='oman_electric_Ires_{0}_{1}.oemof'.format(
+                cfg['exp_number'], var_number))
+        results_store.write_results(energysystem.results, store_path)
+
+    profiling.write(results_path
+                    + '/profiles/oman_electric_Ires_{0}_{1}.json'.format(
+                        cfg['exp_number'], var_number))
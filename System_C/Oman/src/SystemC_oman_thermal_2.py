@@ -59,15 +59,41 @@ import oemof.outputlib as outputlib
 
 import logging
 import os
+import sys
+import time
 import yaml
 import pandas as pd
 import pyomo.environ as po
 
-# import oemof plots
-try:
-    import matplotlib.pyplot as plt
-except ImportError:
-    plt = None
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../..')))
+from model_tools import (aggregation, constraints, model_report, profiling,
+                         pruning, results_store, solver as sweep_solver,
+                         timeseries_store)
+
+
+# Time series that are used to find the typical days
+TIME_SERIES_COLUMNS = ['solar gain kWprom2', 'PV normiert', 'Cooling load kW']
+
+# Parameters that only change costs, bounds or the right hand side of the
+# solar constraint. Variations that differ only in these parameters can be
+# solved with the same pyomo model. All other parameters change the structure
+# of the model.
+MUTABLE_PARAMETERS = [
+    'price_gas', 'price_gas_variation',
+    'price_electr', 'price_electr_variation',
+    'sol_fraction_thermal', 'sol_fraction_thermal_variation',
+    'wacc', 'capex_stor_el_variation',
+    'nominal_value_boiler_output_thermal',
+    'invest_costs_collect_output_th', 'lifetime_collector', 'opex_collector',
+    'invest_costs_pv_output_el_09708', 'lifetime_pv', 'opex_pv',
+    'invest_costs_boiler_output_th', 'lifetime_boiler', 'opex_boiler',
+    'invest_costs_absorption_output_cool', 'lifetime_absorption',
+    'opex_absorption',
+    'invest_costs_tower_input_th', 'lifetime_tower', 'opex_tower',
+    'invest_costs_stor_cool_capacity', 'lifetime_stor_cool', 'opex_stor_cool',
+    'invest_costs_stor_thermal_capacity', 'lifetime_stor_thermal',
+    'opex_stor_thermal',
+    'invest_costs_stor_el_capacity', 'lifetime_stor_el', 'opex_stor_el']
 
 
 def ep_costs_func(capex, n, opex, wacc):
@@ -75,28 +101,25 @@ def ep_costs_func(capex, n, opex, wacc):
     return ep_costs
 
 
-def run_model_thermal(config_path, var_number):
-
-    with open(config_path, 'r') as ymlfile:
-        cfg = yaml.load(ymlfile)
-
-    solver = cfg['solver']
-    debug = cfg['debug']
-    solver_verbose = cfg['solver_verbose']  # show/hide solver output
-
-    if debug:
-        number_of_time_steps = 3
-    else:
-        number_of_time_steps = cfg['number_timesteps']
-
-    # ## Read data and parameters ## #
-    # Define the used directories
+def get_directories():
     abs_path = os.path.dirname(os.path.abspath(os.path.join(__file__, '..')))
     results_path = abs_path + '/results'
     data_ts_path = abs_path + '/data/data_confidential/'
     data_param_path = abs_path + '/data/data_public/'
 
-    # Read parameter values from parameter file
+    return results_path, data_ts_path, data_param_path
+
+
+def read_parameters(cfg, var_number):
+    r"""
+    Reads the parameters of the system and of one variation.
+
+    Returns
+    -------
+    param_value : pd.Series
+    """
+    data_param_path = get_directories()[2]
+
     if type(cfg['parameters_variation']) == list:
         file_path_param_01 = data_param_path + cfg['parameters_system']
         file_path_param_02 = data_param_path + cfg['parameters_variation'][
@@ -111,22 +134,124 @@ def run_model_thermal(config_path, var_number):
     param_df_01 = pd.read_csv(file_path_param_01, index_col=1, sep=';')
     param_df_02 = pd.read_csv(file_path_param_02, index_col=1, sep=';')
     param_df = pd.concat([param_df_01, param_df_02], sort=True)
-    param_value = param_df['value']
 
-    # Import  PV and demand data
-    data = pd.read_csv((data_ts_path + cfg['time_series_file_name']), sep=';')
+    return param_df['value']
+
+
+def get_structure(param_value):
+    r"""
+    Returns the parameters that define the structure of the model. Two
+    variations with the same structure can be solved with the same model.
+    """
+    fixed = param_value.drop(MUTABLE_PARAMETERS, errors='ignore')
+
+    return (tuple(fixed.index), tuple(fixed.astype(str)),
+            param_value['nominal_value_boiler_output_thermal'] == 0)
+
 
-    # Redefine ep_costs_function:
+def get_demand_sum(data, weights=None):
+    r"""
+    Returns the cooling demand of the year. On typical days, every timestep
+    is weighted with the number of days it represents.
+    """
+    if weights is None:
+        return sum(data['Cooling load kW'])
+
+    return sum(data['Cooling load kW'] * weights)
+
+
+def get_mutable_values(param_value, demand_sum):
+    r"""
+    Calculates the costs, bounds and the limit of the solar constraint from
+    the parameters. These values are used when the model is built and when
+    an existing model is updated.
+
+    Returns
+    -------
+    values : dict
+        'variable_costs' and 'nominal_value' by (source, target) of the flow,
+        'ep_costs' by label of the invested node and 'solar_limit'.
+    """
     def ep_costs_f(capex, n, opex):
         return ep_costs_func(capex, n, opex, param_value['wacc'])
 
-    # Initiate the logger
-    logger.define_logging(
-        logfile='Oman_thermal_Ires_{0}_{1}.log'.format(cfg['exp_number'],
-                                                       var_number),
-        logpath=results_path + '/logs',
-        screen_level=logging.INFO,
-        file_level=logging.DEBUG)
+    values = {
+        'variable_costs': {
+            ('naturalgas', 'gas'): (
+                param_value['price_gas']
+                * float(param_value['price_gas_variation'])),
+            ('grid_el', 'electricity'): (
+                param_value['price_electr']
+                * float(param_value['price_electr_variation']))},
+        'nominal_value': {
+            ('boiler', 'thermal'): param_value[
+                'nominal_value_boiler_output_thermal']},
+        'ep_costs': {
+            'collector': ep_costs_f(
+                param_value['invest_costs_collect_output_th'],
+                param_value['lifetime_collector'],
+                param_value['opex_collector']),  # Has to be developed
+            'pv': ep_costs_f(
+                param_value['invest_costs_pv_output_el_09708'],
+                param_value['lifetime_pv'],
+                param_value['opex_pv']),  # Einheit: 0.970873786 kWpeak
+            'boiler': ep_costs_f(
+                param_value['invest_costs_boiler_output_th'],
+                param_value['lifetime_boiler'],
+                param_value['opex_boiler']),
+            'absorption_chiller': ep_costs_f(
+                param_value['invest_costs_absorption_output_cool'],
+                param_value['lifetime_absorption'],
+                param_value['opex_absorption']),
+            'cooling_tower': ep_costs_f(
+                param_value['invest_costs_tower_input_th'],
+                param_value['lifetime_tower'],
+                param_value['opex_tower']),
+            'storage_cool': ep_costs_f(
+                param_value['invest_costs_stor_cool_capacity'],
+                param_value['lifetime_stor_cool'],
+                param_value['opex_stor_cool']),
+            'storage_thermal': ep_costs_f(
+                param_value['invest_costs_stor_thermal_capacity'],
+                param_value['lifetime_stor_thermal'],
+                param_value['opex_stor_thermal']),
+            'storage_electricity': ep_costs_f(
+                (param_value['invest_costs_stor_el_capacity']
+                 * float(param_value['capex_stor_el_variation'])),
+                param_value['lifetime_stor_el'],
+                param_value['opex_stor_el'])},
+        'solar_limit': (demand_sum * param_value['sol_fraction_thermal']
+                        * float(param_value['sol_fraction_thermal_variation']))}
+
+    return values
+
+
+def build_model_thermal(param_value, data, number_of_time_steps,
+                        weights=None, prune=False):
+    r"""
+    Builds the energy system and the pyomo model.
+
+    The costs, the nominal value of the boiler and the limit of the solar
+    constraint can be changed afterwards with `update_model_thermal`.
+
+    Parameters
+    ----------
+    weights : array
+        Weight of every timestep if the data are typical days (see
+        `aggregate_data`), None for a full run.
+
+    prune : bool
+        Remove zero-capacity and dead components before the model is built
+        (see `pruning.prune_energysystem`).
+
+    Returns
+    -------
+    energysystem : solph.EnergySystem
+
+    model : solph.Model
+    """
+    profiling.begin('energy system build')
+    values = get_mutable_values(param_value, get_demand_sum(data, weights))
 
     date_time_index = pd.date_range('1/1/2017',
                                     periods=number_of_time_steps,
@@ -161,14 +286,13 @@ def run_model_thermal(config_path, var_number):
     grid_ga = solph.Source(
         label='naturalgas',
         outputs={bga: solph.Flow(
-            variable_costs=(param_value['price_gas']
-                            * float(param_value['price_gas_variation'])))})
+            variable_costs=values['variable_costs'][('naturalgas', 'gas')])})
 
     grid_el = solph.Source(
         label='grid_el',
         outputs={bel: solph.Flow(
-            variable_costs=(param_value['price_electr']
-                            * float(param_value['price_electr_variation'])))})
+            variable_costs=values['variable_costs'][
+                ('grid_el', 'electricity')])})
 
     collector = solph.Source(
         label='collector',
@@ -176,10 +300,7 @@ def run_model_thermal(config_path, var_number):
             fixed=True,
             actual_value=data['solar gain kWprom2'],
             investment=solph.Investment(
-                ep_costs=ep_costs_f(
-                    param_value['invest_costs_collect_output_th'],
-                    param_value['lifetime_collector'],
-                    param_value['opex_collector'])))})  # Has to be developed
+                ep_costs=values['ep_costs']['collector']))})
 
     pv = solph.Source(
         label='pv',
@@ -187,10 +308,7 @@ def run_model_thermal(config_path, var_number):
             fixed=True,
             actual_value=data['PV normiert'],
             investment=solph.Investment(
-                ep_costs=ep_costs_f(
-                    param_value['invest_costs_pv_output_el_09708'],
-                    param_value['lifetime_pv'],
-                    param_value['opex_pv'])))})  # Einheit: 0.970873786 kWpeak
+                ep_costs=values['ep_costs']['pv']))})
 
     demand = solph.Sink(
         label='demand',
@@ -219,10 +337,7 @@ def run_model_thermal(config_path, var_number):
             inputs={bga: solph.Flow()},
             outputs={bth: solph.Flow(
                 investment=solph.Investment(
-                    ep_costs=ep_costs_f(
-                        param_value['invest_costs_boiler_output_th'],
-                        param_value['lifetime_boiler'],
-                        param_value['opex_boiler'])))},
+                    ep_costs=values['ep_costs']['boiler']))},
             conversion_factors={
                 bth: param_value['conv_factor_boiler_output_thermal']})
     else:
@@ -230,8 +345,7 @@ def run_model_thermal(config_path, var_number):
             label='boiler',
             inputs={bga: solph.Flow()},
             outputs={bth: solph.Flow(
-                nominal_value=param_value[
-                    'nominal_value_boiler_output_thermal'])},
+                nominal_value=values['nominal_value'][('boiler', 'thermal')])},
             conversion_factors={
                 bth: param_value['conv_factor_boiler_output_thermal']})
 
@@ -243,10 +357,7 @@ def run_model_thermal(config_path, var_number):
         outputs={
             bco: solph.Flow(
                 investment=solph.Investment(
-                    ep_costs=ep_costs_f(
-                        param_value['invest_costs_absorption_output_cool'],
-                        param_value['lifetime_absorption'],
-                        param_value['opex_absorption']))),
+                    ep_costs=values['ep_costs']['absorption_chiller'])),
             bwh: solph.Flow()},
         conversion_factors={
             bco: param_value['conv_factor_absorption_output_cool'],
@@ -275,10 +386,7 @@ def run_model_thermal(config_path, var_number):
         inputs={
             bwh: solph.Flow(
                 investment=solph.Investment(
-                    ep_costs=ep_costs_f(
-                        param_value['invest_costs_tower_input_th'],
-                        param_value['lifetime_tower'],
-                        param_value['opex_tower']))),
+                    ep_costs=values['ep_costs']['cooling_tower'])),
             bel: solph.Flow()},
         outputs={bam: solph.Flow()},
         conversion_factors={bwh: param_value['conv_factor_tower_input_waste'],
@@ -301,10 +409,7 @@ def run_model_thermal(config_path, var_number):
             outflow_conversion_factor=param_value[
                 'conv_factor_stor_cool_output'],
             investment=solph.Investment(
-                ep_costs=ep_costs_f(
-                    param_value['invest_costs_stor_cool_capacity'],
-                    param_value['lifetime_stor_cool'],
-                    param_value['opex_stor_cool'])))
+                ep_costs=values['ep_costs']['storage_cool']))
     else:
         stor_co = solph.components.GenericStorage(
             label='storage_cool',
@@ -333,10 +438,7 @@ def run_model_thermal(config_path, var_number):
             outflow_conversion_factor=param_value[
                 'conv_factor_stor_thermal_output'],
             investment=solph.Investment(
-                ep_costs=ep_costs_f(
-                    param_value['invest_costs_stor_thermal_capacity'],
-                    param_value['lifetime_stor_thermal'],
-                    param_value['opex_stor_thermal'])))
+                ep_costs=values['ep_costs']['storage_thermal']))
     else:
         stor_th = solph.components.GenericStorage(
             label='storage_thermal',
@@ -364,11 +466,7 @@ def run_model_thermal(config_path, var_number):
             outflow_conversion_factor=param_value[
                 'conv_factor_stor_el_output'],
             investment=solph.Investment(
-                ep_costs=ep_costs_f(
-                    (param_value['invest_costs_stor_el_capacity']
-                     * float(param_value['capex_stor_el_variation'])),
-                    param_value['lifetime_stor_el'],
-                    param_value['opex_stor_el'])))
+                ep_costs=values['ep_costs']['storage_electricity']))
     else:
         stor_el = solph.components.GenericStorage(
             label='storage_electricity',
@@ -384,42 +482,312 @@ def run_model_thermal(config_path, var_number):
             nominal_capacity=param_value['nominal_capacitiy_stor_el'])
 
     energysystem.add(stor_co, stor_th, stor_el)
+    profiling.end()
+
+    if prune:
+        with profiling.phase('pruning'):
+            energysystem, _ = pruning.prune_energysystem(energysystem)
 
     ########################################
     # Create a model and solve the problem #
     ########################################
 
     # Initialise the operational model (create the problem) with constrains
-    model = solph.Model(energysystem)
+    profiling.begin('model construction')
+    if weights is None:
+        model = solph.Model(energysystem)
+        weights = [1] * number_of_time_steps
+    else:
+        model = solph.Model(energysystem, objective_weighting=list(weights))
+        aggregation.add_periodic_storage_constraints(
+            model, number_of_time_steps // 24)
 
     # ## Add own constrains ## #
-    # Create a block and add it to the system
+    # Create a block and add it to the system. The limit is a mutable
+    # parameter, so that it can be changed without building the model again.
     myconstrains = po.Block()
     model.add_component('MyBlock', myconstrains)
-    demand_sum = sum(data['Cooling load kW'])
-    myconstrains.solar_constr = po.Constraint(
-        expr=((sum(model.flow[boil, bth, t] for t in model.TIMESTEPS))
-              <= (demand_sum * param_value['sol_fraction_thermal']
-                  * float(param_value['sol_fraction_thermal_variation']))))
+    myconstrains.solar_limit = po.Param(initialize=values['solar_limit'],
+                                        mutable=True)
+    # a boiler without capacity is removed by the pruning, its flow is zero
+    solar_flows = pruning.get_kept_flows(energysystem, [(boil, bth)])
+    if solar_flows:
+        constraints.add_annual_limit(
+            model, 'solar_constr', solar_flows, myconstrains.solar_limit,
+            weights=weights, block=myconstrains)
+    profiling.end()
+
+    return energysystem, model
+
+
+def update_model_thermal(energysystem, model, param_value, data,
+                         weights=None):
+    r"""
+    Changes the costs, the nominal value of the boiler and the limit of the
+    solar constraint of a built model in place. The parameters have to have
+    the same structure (see `get_structure`) as the ones the model was built
+    with. Nodes and flows removed by the pruning are skipped.
+    """
+    values = get_mutable_values(param_value, get_demand_sum(data, weights))
+    nodes = energysystem.groups
+
+    def get_flow(source, target):
+        if source not in nodes or target not in nodes:
+            return None
+        return nodes[source].outputs.get(nodes[target])
+
+    for (source, target), variable_costs in values['variable_costs'].items():
+        flow = get_flow(source, target)
+        if flow is not None:
+            flow.variable_costs = solph.plumbing.sequence(variable_costs)
+
+    for label, ep_costs in values['ep_costs'].items():
+        if label not in nodes:
+            continue
+        node = nodes[label]
+        if getattr(node, 'investment', None) is not None:
+            node.investment.ep_costs = ep_costs
+            continue
+        for flow in list(node.inputs.values()) + list(node.outputs.values()):
+            if flow.investment is not None:
+                flow.investment.ep_costs = ep_costs
+
+    for (source, target), nominal_value in values['nominal_value'].items():
+        flow = get_flow(source, target)
+        if flow is None or flow.investment is not None:
+            continue
+        flow.nominal_value = nominal_value
+        for t in model.TIMESTEPS:
+            model.flow[nodes[source], nodes[target], t].setub(
+                flow.max[t] * nominal_value)
+
+    model.MyBlock.solar_limit.set_value(values['solar_limit'])
+
+    # the objective is built from the costs of the flows and investments
+    model._add_objective(update=True)
+
+
+def solve_and_store(cfg, energysystem, model, var_number, solver=None,
+                    typical_days=None, full_data=None):
+    r"""
+    Solves the model and stores the energy system with the results.
+
+    If a `SweepSolver` is given, it solves the model, warm started from the
+    previous solve of the same model. If the model is built on typical days,
+    the results are disaggregated to the full year before they are stored
+    and the error of the aggregation is written to results/aggregation/.
+    """
+    results_path = get_directories()[0]
+
+    report = model_report.check_model(
+        model, 'oman_thermal',
+        results_path + '/model_reports/oman_thermal_Ires_{0}_{1}.json'.format(
+            cfg['exp_number'], var_number),
+        coefficients=cfg.get('check_scaling', False), solver=cfg['solver'])
 
     logging.info('Solve the optimization problem')
-    model.solve(solver=solver, solve_kwargs={'tee': solver_verbose})
-
-    if debug:
+    with profiling.phase('solver'):
+        if solver is None:
+            starttime = time.time()
+            solved_with = sweep_solver.solve_model(
+                model, cfg['solver'], solve_kwargs={'tee': cfg['solver_verbose']})
+            solve_time = time.time() - starttime
+        else:
+            solve_time = solver.solve(model, var_number)
+            solved_with = solver.records[-1]['solver']
+    model_report.record_solve_time(report, solve_time, solved_with)
+
+    if cfg['debug']:
         filename = (results_path + '/lp_files/'
                     + 'Oman_thermal_Ires_{0}_{1}.lp'.format(cfg['exp_number'],
                                                             var_number))
         logging.info('Store lp-file in {0}.'.format(filename))
-        model.write(filename, io_options={'symbolic_solver_labels': True})
+        with profiling.phase('lp write'):
+            model.write(filename, io_options={'symbolic_solver_labels': True})
 
     logging.info('Store the energy system with the results.')
 
+    profiling.begin('results processing')
     energysystem.results['main'] = outputlib.processing.results(model)
     energysystem.results['meta'] = outputlib.processing.meta_results(model)
     energysystem.results['param'] = (
         outputlib.processing.parameter_as_dict(model))
+    pruning.add_report(energysystem)
+
+    store_path = (results_path
+                  + '/dumps/oman_thermal_Ires_{0}_{1}.results'.format(
+                      cfg['exp_number'], var_number))
+
+    if typical_days is not None:
+        aggregation.disaggregate_results(
+            energysystem.results, typical_days,
+            pd.date_range('1/1/2017', periods=len(typical_days['order']) * 24,
+                          freq='H'))
+        aggregation.write_report(
+            results_path + '/aggregation/oman_thermal_Ires_{0}_{1}.csv'.format(
+                cfg['exp_number'], var_number),
+            full_data, typical_days, TIME_SERIES_COLUMNS,
+            energysystem.results, aggregation.get_reference_store(store_path))
+    profiling.end()
+
+    with profiling.phase('dump'):
+        energysystem.dump(
+            dpath=(results_path + '/dumps'),
+            filename='oman_thermal_Ires_{0}_{1}.oemof'.format(
+                cfg['exp_number'], var_number))
+        results_store.write_results(energysystem.results, store_path)
+
+
+def read_config_and_data(config_path):
+    with profiling.phase('data load'):
+        return _read_config_and_data(config_path)
+
+
+def _read_config_and_data(config_path):
+    with open(config_path, 'r') as ymlfile:
+        cfg = yaml.load(ymlfile)
+
+    if cfg['debug']:
+        number_of_time_steps = 3
+    else:
+        number_of_time_steps = cfg['number_timesteps']
+
+    # Import  PV and demand data
+    data_ts_path = get_directories()[1]
+    data = timeseries_store.read_csv(data_ts_path + cfg['time_series_file_name'], sep=';')
+
+    return cfg, data, number_of_time_steps
+
+
+def aggregate_data(cfg, data, number_of_time_steps):
+    r"""
+    Reduces the data to typical days if 'typical_days' is set in the config.
+    Debug runs are not aggregated.
+
+    Returns
+    -------
+    data : pd.DataFrame
+        Data of the model, the typical days one after another.
+
+    number_of_time_steps : int
+
+    typical_days : dict or None
+        Return value of `aggregation.aggregate`, None for a full run.
+    """
+    if not cfg.get('typical_days') or cfg['debug']:
+        return data, number_of_time_steps, None
+
+    typical_days = aggregation.aggregate(
+        data, TIME_SERIES_COLUMNS, cfg['typical_days'], number_of_time_steps)
+
+    return typical_days['data'], len(typical_days['data']), typical_days
+
+
+def get_weights(typical_days):
+    return None if typical_days is None else typical_days['weights']
+
+
+def run_model_thermal(config_path, var_number):
+
+    profiling.start('oman_thermal_{0}'.format(var_number))
+    cfg, data, number_of_time_steps = read_config_and_data(config_path)
+
+    # ## Read data and parameters ## #
+    with profiling.phase('data load'):
+        param_value = read_parameters(cfg, var_number)
+
+    # Initiate the logger
+    logger.define_logging(
+        logfile='Oman_thermal_Ires_{0}_{1}.log'.format(cfg['exp_number'],
+                                                       var_number),
+        logpath=get_directories()[0] + '/logs',
+        screen_level=logging.INFO,
+        file_level=logging.DEBUG)
+
+    with profiling.phase('aggregation'):
+        model_data, model_time_steps, typical_days = aggregate_data(
+            cfg, data, number_of_time_steps)
+
+    energysystem, model = build_model_thermal(
+        param_value, model_data, model_time_steps, get_weights(typical_days),
+        prune=cfg.get('prune_model', False))
+
+    solve_and_store(cfg, energysystem, model, var_number,
+                    typical_days=typical_days, full_data=data)
+
+    profiling.write(get_directories()[0]
+                    + '/profiles/oman_thermal_Ires_{0}_{1}.json'.format(
+                        cfg['exp_number'], var_number))
+
+
+def run_sweep_thermal(config_path, var_numbers):
+    r"""
+    Solves the thermal model for several variations and builds the pyomo
+    model only once.
+
+    Following variations update the costs, the nominal value of the boiler
+    and the limit of the solar constraint of the existing model in place and
+    solve it again. The model is only built again if a variation changes
+    the structure of the model, e.g. a conversion factor or whether a
+    storage is invested. The results are stored like in
+    `run_model_thermal`.
+
+    With `warm_start: True` in the config (opt-in, needs HiGHS), every solve
+    of the same model starts from the basis of the previous one. The solve
+    times are written to results/solve_times/.
+
+    Parameters
+    ----------
+    config_path : path
+        Absolute path of the experiment config.
+
+    var_numbers : iterable of int
+        Numbers of the variations.
+    """
+    profiling.start('oman_thermal_sweep')
+    cfg, data, number_of_time_steps = read_config_and_data(config_path)
+
+    logger.define_logging(
+        logfile='Oman_thermal_Ires_{0}_sweep.log'.format(cfg['exp_number']),
+        logpath=get_directories()[0] + '/logs',
+        screen_level=logging.INFO,
+        file_level=logging.DEBUG)
 
-    energysystem.dump(
-        dpath=(results_path + '/dumps'),
-        filename='oman_thermal_Ires_{0}_{1}.oemof'.format(
-            cfg['exp_number'], var_number))
+    solver = sweep_solver.SweepSolver(
+        solver=cfg['solver'],
+        solve_kwargs={'tee': cfg['solver_verbose']},
+        warm_start=cfg.get('warm_start', False),
+        compare_cold=cfg.get('compare_cold_start', False))
+
+    with profiling.phase('aggregation'):
+        model_data, model_time_steps, typical_days = aggregate_data(
+            cfg, data, number_of_time_steps)
+    weights = get_weights(typical_days)
+
+    energysystem, model, structure = None, None, None
+    for var_number in var_numbers:
+        param_value = read_parameters(cfg, var_number)
+
+        if model is None or get_structure(param_value) != structure:
+            logging.info('Build the model for variation {0}'.format(
+                var_number))
+            energysystem, model = build_model_thermal(
+                param_value, model_data, model_time_steps, weights,
+                prune=cfg.get('prune_model', False))
+            structure = get_structure(param_value)
+        else:
+            logging.info('Update the model for variation {0}'.format(
+                var_number))
+            with profiling.phase('model update'):
+                update_model_thermal(energysystem, model, param_value,
+                                     model_data, weights)
+
+        solve_and_store(cfg, energysystem, model, var_number, solver,
+                        typical_days=typical_days, full_data=data)
+
+    solver.report(get_directories()[0]
+                  + '/solve_times/oman_thermal_Ires_{0}_sweep.csv'.format(
+                      cfg['exp_number']))
+    profiling.write(get_directories()[0]
+                    + '/profiles/oman_thermal_Ires_{0}_sweep.json'.format(
+                        cfg['exp_number']))
@@ -4,18 +4,98 @@
 Date: 26.11.2018
 Author: Franziska Pleissner
 
+Usage: main_2.py [experiment_config] [--jobs N] [--sweep]
+
+With --jobs N > 1 the models of all variations are solved in N worker
+processes. Every (variation, model) pair is one task. The postprocessing
+runs afterwards in the main process in the order of the variations, because
+the csv of all variations is collected there.
+
+With --sweep the thermal model is built once and only its costs, bounds and
+the limit of the solar constraint are updated for the following variations.
+
+The plotting modules, and with them matplotlib and oemof_visio, are only
+imported if the experiment config runs the postprocessing.
 """
 
-from SystemC_oman_thermal_2 import run_model_thermal
-from SystemC_oman_thermal_plot_2 import make_csv_and_plot
+from SystemC_oman_thermal_2 import run_model_thermal, run_sweep_thermal
 from SystemC_oman_electric_2 import run_model_electric
-from SystemC_oman_electric_plot_2 import make_csv_and_plot_electric
 # from SystemC_oman_plot import combine_results
+from concurrent.futures import ProcessPoolExecutor
+import argparse
+import logging
 import os
+import sys
 import yaml
 
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../..')))
+from model_tools import profiling
+
+
+MODELS = {'thermal': run_model_thermal,
+          'electric': run_model_electric}
+
+
+def run_model_in_worker(model_name, config_path, var_number):
+    r"""
+    Runs one model of one variation inside a worker process.
+
+    A worker process can run several tasks one after another. The handlers
+    of the root logger are removed before each task, so that every task only
+    writes into its own log file (defined in the model function).
+
+    Parameters
+    ----------
+    model_name : str
+        Key of MODELS, 'thermal' or 'electric'.
+
+    config_path : path
+        Absolute path of the experiment config.
+
+    var_number : int
+        Number of the variation.
+
+    Returns
+    -------
+    (model_name, var_number)
+    """
+    root_logger = logging.getLogger()
+    for handler in root_logger.handlers[:]:
+        root_logger.removeHandler(handler)
+        handler.close()
+
+    MODELS[model_name](config_path=config_path, var_number=var_number)
+
+    return model_name, var_number
+
 
-def main(yaml_file):
+def run_models_parallel(cfg, config_path, scenarios, jobs, sweep=False):
+    r"""
+    Solves all models of all variations in a pool of worker processes.
+
+    Every model writes its dump with the number of the variation in the
+    filename, so the results are the same as in a serial run. In sweep mode,
+    the thermal models are left out, they are solved in one task by
+    `run_sweep_thermal`.
+    """
+    tasks = []
+    for scenario in scenarios:
+        if cfg['run_model'] and not sweep:
+            tasks.append(('thermal', scenario))
+        if cfg['run_model_electric']:
+            tasks.append(('electric', scenario))
+
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        futures = [executor.submit(run_model_in_worker, model_name,
+                                   config_path, var_number)
+                   for model_name, var_number in tasks]
+        for future in futures:
+            model_name, var_number = future.result()
+            logging.info('Finished {0} model of variation {1}'.format(
+                model_name, var_number))
+
+
+def main(yaml_file, jobs=1, sweep=False):
     # Choose configuration file to run model with
     exp_cfg_file_name = yaml_file
     config_file_path = (
@@ -32,23 +112,52 @@ def main(yaml_file):
     else:
         scenarios = range(1)
 
+    if cfg['run_model'] and sweep:
+        run_sweep_thermal(config_path=config_file_path,
+                          var_numbers=scenarios)
+
+    if jobs > 1:
+        run_models_parallel(cfg, config_file_path, scenarios, jobs, sweep)
+
     for scenario in scenarios:
-        if cfg['run_model']:
+        if cfg['run_model'] and jobs == 1 and not sweep:
             run_model_thermal(
                 config_path=config_file_path,
                 var_number=scenario)
-        if cfg['run_model_electric']:
+        if cfg['run_model_electric'] and jobs == 1:
             run_model_electric(
                 config_path=config_file_path,
                 var_number=scenario)
+        if not (cfg['run_postprocessing'] or cfg['run_postprocessing_electric']):
+            continue
+        from SystemC_oman_thermal_plot_2 import make_csv_and_plot
+        from SystemC_oman_electric_plot_2 import make_csv_and_plot_electric
+        # the model runs write their own profiles
+        profiling.start('oman_plot_{0}'.format(scenario))
         if cfg['run_postprocessing']:
-            make_csv_and_plot(
-                config_path=config_file_path,
-                var_number=scenario)
+            with profiling.phase('plotting thermal'):
+                make_csv_and_plot(
+                    config_path=config_file_path,
+                    var_number=scenario)
         if cfg['run_postprocessing_electric']:
-            make_csv_and_plot_electric(
-                config_path=config_file_path,
-                var_number=scenario)
+            with profiling.phase('plotting electric'):
+                make_csv_and_plot_electric(
+                    config_path=config_file_path,
+                    var_number=scenario)
+        profiling.write(os.path.abspath(
+            '../results/profiles/oman_plot_Ires_{0}_{1}.json'.format(
+                cfg['exp_number'], scenario)))
+
 
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Run the Oman experiment with all its variations.')
+    parser.add_argument('yaml_file', nargs='?', default='experiment_test.yml',
+                        help='filename of the experiment config')
+    parser.add_argument('-j', '--jobs', type=int, default=1,
+                        help='number of worker processes for the models')
+    parser.add_argument('--sweep', action='store_true',
+                        help='build the thermal model once for all variations')
+    args = parser.parse_args()
 
-main('experiment_test.yml')
+    main(args.yaml_file, jobs=args.jobs, sweep=args.sweep)
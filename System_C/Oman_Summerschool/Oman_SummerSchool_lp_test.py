@@ -35,13 +35,11 @@ import pyomo.environ as po
 import time
 import logging
 import os
+import sys
 import pandas as pd
 
-# import oemof plots
-try:
-    import matplotlib.pyplot as plt
-except ImportError:
-    plt = None
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+from model_tools import results_store, timeseries_store
 
 number_of_time_steps = 2
 
@@ -57,7 +55,7 @@ date_time_index = pd.date_range('1/1/2017', periods=number_of_time_steps,
 
 # Read data file
 # Import  PV and demand data
-data = pd.read_csv('data_input/Oman3.csv', sep=';',)
+data = timeseries_store.read_csv('data_input/Oman3.csv', sep=';')
 
 # Initialise the energysystem
 energysystem = solph.EnergySystem(timeindex=date_time_index)
@@ -217,6 +215,8 @@ energysystem.results['param'] = outputlib.processing.param_results(om)
 timestr = time.strftime("%Y%m%d-%H%M")
 energysystem.dump(dpath="Dumps",
                   filename="Oman_SS"+timestr+".oemof")
+results_store.write_results(energysystem.results,
+                            os.path.join("Dumps", "Oman_SS"+timestr+".results"))
 
 # print(energysystem.results['main'])
 print("done")
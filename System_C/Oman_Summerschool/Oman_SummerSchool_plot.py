@@ -19,8 +19,13 @@ import oemof.outputlib as outputlib
 import oemof_visio as oev
 
 import logging
+import os
+import sys
 import pandas as pd
 
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+from model_tools import results_store
+
 # import oemof plots
 try:
     import matplotlib.pyplot as plt
@@ -82,13 +87,22 @@ p_water = 1  # Euro/m^3
 sp = start_of_plot = 5523
 ep = end_of_plot = sp + 48
 
-# restoring the system and creating results
-energysystem = solph.EnergySystem()
-energysystem.restore(dpath="Dumps",
-                     filename = file_imp)
+# restoring the results. The results store is preferred, because it only
+# reads the flows and time window that are used.
+store_imp = os.path.join("Dumps", file_imp.replace('.oemof', '.results'))
+
+if os.path.exists(store_imp):
+    store = results_store.ResultsStore(store_imp)
+    results_strings = store.string_results('main')
+    results_strings_param = store.string_results('param')
+else:
+    store = None
+    energysystem = solph.EnergySystem()
+    energysystem.restore(dpath="Dumps",
+                         filename = file_imp)
 
-results_strings = outputlib.views.convert_keys_to_strings(energysystem.results['main'])
-results_strings_param = outputlib.views.convert_keys_to_strings(energysystem.results['param'])
+    results_strings = outputlib.views.convert_keys_to_strings(energysystem.results['main'])
+    results_strings_param = outputlib.views.convert_keys_to_strings(energysystem.results['param'])
 
 logging.info('results received')
 
@@ -177,19 +191,15 @@ else:
 # Work with the results #
 #########################
 
-cool_bus = outputlib.views.node(energysystem.results['main'], 'cool')
-heat_bus = outputlib.views.node(energysystem.results['main'], 'heat')
-waste_bus = outputlib.views.node(energysystem.results['main'], 'waste')
-el_bus = outputlib.views.node(energysystem.results['main'], 'elec')
-gas_bus = outputlib.views.node(energysystem.results['main'], 'gas')
-storage_cool_res = outputlib.views.node(energysystem.results['main'], 'storage_cool')
+def node_results(label, start=None, end=None):
+    if store is not None:
+        return store.node(label, start=start, end=end)
+    node = outputlib.views.node(energysystem.results['main'], label)
+    node['sequences'] = node['sequences'].iloc[start:end]
+    return node
+
 
-cool_seq = cool_bus['sequences']
-heat_seq = heat_bus['sequences']
-waste_seq = waste_bus['sequences']
-el_seq = el_bus['sequences']
-gas_seq = gas_bus['sequences']
-storage_cool_seq = storage_cool_res['sequences']
+el_seq = node_results('elec')['sequences']
 
 ### Calculations ###
 
@@ -382,12 +392,12 @@ print('')
 # Plotting the results #
 ########################
 
-cool_seq_resample = cool_seq.iloc[sp:ep]
-heat_seq_resample = heat_seq.iloc[sp:ep]
-waste_seq_resample = waste_seq.iloc[sp:ep]
+cool_seq_resample = node_results('cool', sp, ep)['sequences']
+heat_seq_resample = node_results('heat', sp, ep)['sequences']
+waste_seq_resample = node_results('waste', sp, ep)['sequences']
 el_seq_resample = el_seq.iloc[sp:ep]
-gas_seq_resample = gas_seq.iloc[sp:ep]
-storage_cool_seq_resample = storage_cool_seq.iloc[sp:ep]
+gas_seq_resample = node_results('gas', sp, ep)['sequences']
+storage_cool_seq_resample = node_results('storage_cool', sp, ep)['sequences']
 
 
 def shape_legend(node, reverse=False, **kwargs):  # just copied
@@ -0,0 +1,7 @@
+"""Model tools
+
+Tools that are shared by the models of all systems.
+
+"""
+
+from . import results_store
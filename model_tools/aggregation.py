@@ -0,0 +1,327 @@
+"""
+Aggregation of hourly time series to typical days.
+
+The days of the input profiles are clustered with k-means and every cluster
+is represented by its medoid, the real day closest to the cluster centre.
+The model is built on the sequence of typical days and every timestep is
+weighted with the number of days its typical day represents
+(`objective_weighting` of `solph.Model`), so the variable costs are those
+of a full year and the annual investment costs stay comparable.
+
+Storages are linked between the typical days by
+`add_periodic_storage_constraints`: every typical day starts and ends with
+the same storage content. Thus the order of the typical days does not
+matter and the disaggregated storage content is continuous. Storage
+between seasons can not be represented.
+
+After solving, `disaggregate_results` maps the sequences back to the full
+time index, so the results can be plotted like the results of a full run.
+
+"""
+
+import logging
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyomo.environ as po
+except ImportError:
+    po = None
+
+from . import results_store
+
+
+def cluster_days(profiles, n_days, n_iter=100, seed=0):
+    r"""
+    Clusters days with k-means and returns the medoid of every cluster.
+
+    Parameters
+    ----------
+    profiles : np.ndarray
+        One row per day with the normalised values of all profiles.
+
+    n_days : int
+        Number of typical days.
+
+    Returns
+    -------
+    medoids : np.ndarray
+        Number of the day that represents each cluster.
+
+    order : np.ndarray
+        Cluster of every day.
+    """
+    n_total = len(profiles)
+    if n_days >= n_total:
+        return np.arange(n_total), np.arange(n_total)
+
+    random = np.random.RandomState(seed)
+
+    # k-means++ initialisation
+    centres = [profiles[random.randint(n_total)]]
+    for _ in range(1, n_days):
+        distance = ((profiles[:, np.newaxis] - np.array(centres)) ** 2).sum(axis=2).min(axis=1)
+        centres.append(profiles[random.choice(n_total, p=distance / distance.sum())])
+    centres = np.array(centres)
+
+    order = None
+    for _ in range(n_iter):
+        distance = ((profiles[:, np.newaxis] - centres) ** 2).sum(axis=2)
+        new_order = distance.argmin(axis=1)
+        if order is not None and (new_order == order).all():
+            break
+        order = new_order
+        for cluster in range(n_days):
+            members = profiles[order == cluster]
+            if len(members):
+                centres[cluster] = members.mean(axis=0)
+            else:
+                # restart an empty cluster at the day with the largest error
+                centres[cluster] = profiles[distance.min(axis=1).argmax()]
+
+    distance = ((profiles[:, np.newaxis] - centres) ** 2).sum(axis=2)
+    order = distance.argmin(axis=1)
+    # drop clusters without days and renumber the others
+    clusters = np.unique(order)
+    medoids = np.array([np.where(order == cluster, distance[:, cluster], np.inf).argmin()
+                        for cluster in clusters])
+
+    return medoids, np.searchsorted(clusters, order)
+
+
+def aggregate(data, columns, n_days, n_timesteps=None, hours_per_day=24):
+    r"""
+    Reduces hourly data to typical days.
+
+    Parameters
+    ----------
+    data : pd.DataFrame
+        Hourly data, one row per timestep.
+
+    columns : list of str
+        Columns used for clustering. All other columns are taken from the
+        same typical days.
+
+    n_days : int
+        Number of typical days.
+
+    n_timesteps : int
+        Number of timesteps of the full model. Defaults to the length of
+        data, cut to full days.
+
+    Returns
+    -------
+    aggregation : dict
+        'data' with the typical days one after another, 'weights' with the
+        number of represented days for every timestep, 'order' with the
+        typical day of every day of the full data and 'hours_per_day'.
+    """
+    if n_timesteps is None:
+        n_timesteps = len(data)
+    n_total = n_timesteps // hours_per_day
+    full = data.iloc[:n_total * hours_per_day].reset_index(drop=True)
+
+    values = full[columns].values.astype(float)
+    span = values.max(axis=0) - values.min(axis=0)
+    span[span == 0] = 1
+    normalised = (values - values.min(axis=0)) / span
+    profiles = normalised.reshape(n_total, hours_per_day * len(columns))
+
+    medoids, order = cluster_days(profiles, n_days)
+
+    rows = (medoids[:, np.newaxis] * hours_per_day + np.arange(hours_per_day)).ravel()
+    counts = np.bincount(order, minlength=len(medoids))
+
+    logging.info('Aggregated {0} days to {1} typical days.'.format(n_total, len(medoids)))
+
+    return {'data': full.iloc[rows].reset_index(drop=True),
+            'weights': np.repeat(counts, hours_per_day).astype(float),
+            'order': order,
+            'hours_per_day': hours_per_day}
+
+
+def disaggregate(df, aggregation, timeindex=None):
+    r"""
+    Maps a DataFrame on the typical days back to all days.
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+        One row per timestep of the typical days.
+
+    aggregation : dict
+        Return value of `aggregate`.
+
+    timeindex : pd.DatetimeIndex
+        Index of the full DataFrame. Defaults to a RangeIndex.
+    """
+    hours_per_day = aggregation['hours_per_day']
+    rows = (aggregation['order'][:, np.newaxis] * hours_per_day + np.arange(hours_per_day)).ravel()
+    full = df.iloc[rows]
+    full.index = timeindex if timeindex is not None else pd.RangeIndex(len(rows))
+
+    return full
+
+
+def disaggregate_results(results, aggregation, timeindex):
+    r"""
+    Maps all sequences of the results on the typical days back to the full
+    time index. Scalars are not changed.
+
+    Parameters
+    ----------
+    results : dict
+        `energysystem.results` with the groups 'main' and 'param'.
+
+    Returns
+    -------
+    results : dict
+    """
+    n_timesteps = len(aggregation['weights'])
+    for group in ['main', 'param']:
+        for value in results.get(group, {}).values():
+            sequences = value.get('sequences')
+            if sequences is not None and len(sequences) == n_timesteps:
+                value['sequences'] = disaggregate(sequences, aggregation, timeindex)
+
+    results.setdefault('meta', {})['aggregation'] = {
+        'typical_days': int(n_timesteps / aggregation['hours_per_day']),
+        'days': len(aggregation['order'])}
+
+    return results
+
+
+def add_periodic_storage_constraints(model, n_days, hours_per_day=24):
+    r"""
+    Adds constraints that every typical day ends with the same storage
+    content as the day before it, for all storages of the model. The first
+    typical day starts with the initial content of the storage.
+    """
+    ends = [(day + 1) * hours_per_day - 1 for day in range(n_days)]
+
+    def periodic_rule(block, storage, day):
+        return block.capacity[storage, ends[day]] == block.capacity[storage, ends[day - 1]]
+
+    for name in ['GenericStorageBlock', 'GenericInvestmentStorageBlock']:
+        block = getattr(model, name, None)
+        if block is None or not hasattr(block, 'capacity'):
+            continue
+        block.periodic_day = po.Constraint(
+            block.STORAGES if hasattr(block, 'STORAGES') else block.INVESTSTORAGES,
+            range(1, n_days), rule=periodic_rule)
+
+
+def profile_error(data, aggregation, columns):
+    r"""
+    Compares the disaggregated profiles with the original ones.
+
+    Returns
+    -------
+    error : pd.DataFrame
+        Root mean square error, normalised by the mean, and the relative
+        deviation of the sum for every column.
+    """
+    n_full = len(aggregation['order']) * aggregation['hours_per_day']
+    original = data[columns].iloc[:n_full].reset_index(drop=True).astype(float)
+    approximated = disaggregate(aggregation['data'][columns], aggregation).astype(float)
+
+    difference = approximated.values - original.values
+    mean = original.abs().mean().replace(0, np.nan).values
+    total = original.sum().replace(0, np.nan).values
+
+    return pd.DataFrame({'nrmse': np.sqrt((difference ** 2).mean(axis=0)) / mean,
+                         'sum_deviation': difference.sum(axis=0) / total},
+                        index=columns)
+
+
+def get_reference_store(path):
+    r"""
+    Returns the results store of the full run for the results store at
+    path, or None if there is no full run.
+
+    A full run at path is moved to '<path>_full.results' before it is
+    overwritten by the aggregated results.
+    """
+    reference = path[:-len('.results')] + '_full.results' if path.endswith('.results') else path + '_full'
+
+    if os.path.exists(os.path.join(path, results_store.INDEX_FILE)):
+        store = results_store.ResultsStore(path)
+        if 'aggregation' not in store.meta:
+            if os.path.exists(reference):
+                shutil.rmtree(reference)
+            shutil.move(path, reference)
+
+    if os.path.exists(os.path.join(reference, results_store.INDEX_FILE)):
+        return results_store.ResultsStore(reference)
+
+    return None
+
+
+def compare_with_full(results, reference):
+    r"""
+    Compares the invested capacities and the objective of an aggregated run
+    with a full run.
+
+    Parameters
+    ----------
+    results : dict
+        Results of the aggregated run.
+
+    reference : ResultsStore
+        Results of the full run.
+
+    Returns
+    -------
+    deviation : pd.DataFrame
+        Value of the aggregated and of the full run and their relative
+        deviation.
+    """
+    rows = {}
+    for key, value in results['main'].items():
+        scalars = value.get('scalars')
+        key = tuple(str(k) for k in key)
+        if scalars is None or 'invest' not in scalars or key not in reference.keys():
+            continue
+        full = reference.scalars(key).get('invest')
+        rows['invest ' + ', '.join(key)] = (scalars['invest'], full)
+
+    objective = results.get('meta', {}).get('objective')
+    if objective is not None and reference.meta.get('objective') is not None:
+        rows['objective'] = (objective, reference.meta['objective'])
+
+    deviation = pd.DataFrame(rows, index=['aggregated', 'full']).T
+    with np.errstate(divide='ignore', invalid='ignore'):
+        deviation['deviation'] = ((deviation['aggregated'] - deviation['full'])
+                                  / deviation['full'].abs())
+
+    return deviation
+
+
+def write_report(filename, data, aggregation, columns, results=None, reference=None):
+    r"""
+    Writes the error of the profiles and, if a full run exists, the
+    deviation of the results to a csv file.
+    """
+    error = profile_error(data, aggregation, columns).stack()
+    report = pd.DataFrame({'kind': 'profile', 'name': error.index.get_level_values(0),
+                           'var_name': error.index.get_level_values(1), 'var_value': error.values})
+
+    if results is not None and reference is not None:
+        deviation = compare_with_full(results, reference).stack()
+        report = pd.concat([report, pd.DataFrame({
+            'kind': 'result', 'name': deviation.index.get_level_values(0),
+            'var_name': deviation.index.get_level_values(1), 'var_value': deviation.values})],
+            ignore_index=True)
+        result_deviation = deviation.xs('deviation', level=1).abs()
+        if len(result_deviation):
+            logging.info('Maximal deviation from the full run: {0:.1%}'.format(result_deviation.max()))
+
+    directory = os.path.dirname(filename)
+    if directory and not os.path.exists(directory):
+        os.makedirs(directory)
+    report.to_csv(filename, index=False)
+
+    return report
@@ -0,0 +1,249 @@
+"""
+Annual limits, caps and shares of flows as additional constraints.
+
+A constraint over all timesteps of a year, e.g. the solar fraction of the
+Oman models, sums 8760 flow variables per flow. Built with `sum()` over a
+generator, pyomo creates a nested expression term by term. The builders
+of this module create one flat `LinearExpression` from the lists of
+variables and coefficients instead, which is faster to build and to write
+to the solver. Older pyomo versions without `LinearExpression` get a
+`quicksum` instead.
+
+The constraints are added to a block of the model, by default
+`model.CustomConstraints`:
+
+    constraints.add_annual_limit(
+        model, 'solar_constr', [(boiler, bth)], limit, weights=weights)
+    constraints.add_emission_cap(
+        model, 'co2_cap', {(gas_source, bgas): 0.2}, 100000)
+    constraints.add_share(
+        model, 'renewable_share', [(pv, bel)], [(bel, demand)], 0.5,
+        sense='>=')
+
+The limit can be a mutable parameter, so it can be changed without
+building the model again. Run this module to compare the build times with
+the generator sums.
+
+"""
+
+import timeit
+
+import pyomo.environ as po
+
+try:
+    from pyomo.core.expr.numeric_expr import LinearExpression
+except ImportError:
+    LinearExpression = None
+
+BLOCK_NAME = 'CustomConstraints'
+
+
+def _get_weights(model, weights):
+    if weights is None:
+        return [1] * len(model.TIMESTEPS)
+
+    return list(weights)
+
+
+def linear_flow_sum(model, flows, weights=None):
+    r"""
+    Returns the weighted sum of flows over all timesteps as one linear
+    expression.
+
+    Parameters
+    ----------
+    model : solph.Model
+
+    flows : list of tuple or dict
+        (source, target) pairs of the flows, or a dict with a factor for
+        every pair, e.g. an emission factor.
+
+    weights : sequence
+        Weight of every timestep, e.g. the number of days a typical day
+        represents. Defaults to 1.
+
+    Returns
+    -------
+    expression : LinearExpression
+        Or a quicksum on pyomo versions without LinearExpression.
+    """
+    if not isinstance(flows, dict):
+        flows = dict.fromkeys(flows, 1)
+    weights = _get_weights(model, weights)
+
+    coefficients = []
+    variables = []
+    for (source, target), factor in flows.items():
+        coefficients.extend(factor * weights[t] for t in model.TIMESTEPS)
+        variables.extend(model.flow[source, target, t] for t in model.TIMESTEPS)
+
+    if LinearExpression is None:
+        return po.quicksum(coefficient * variable
+                           for coefficient, variable in zip(coefficients, variables))
+
+    return LinearExpression(constant=0, linear_coefs=coefficients,
+                            linear_vars=variables)
+
+
+def _get_block(model, block):
+    if block is None:
+        block = getattr(model, BLOCK_NAME, None)
+        if block is None:
+            block = po.Block()
+            model.add_component(BLOCK_NAME, block)
+
+    return block
+
+
+def _add_constraint(block, name, lhs, rhs, sense):
+    if sense == '<=':
+        expr = lhs <= rhs
+    elif sense == '>=':
+        expr = lhs >= rhs
+    elif sense == '==':
+        expr = lhs == rhs
+    else:
+        raise ValueError("The sense has to be '<=', '>=' or '=='.")
+    block.add_component(name, po.Constraint(expr=expr))
+
+    return getattr(block, name)
+
+
+def add_annual_limit(model, name, flows, limit, weights=None, sense='<=',
+                     mutable=False, block=None):
+    r"""
+    Adds a limit of the weighted sum of flows over all timesteps.
+
+    Parameters
+    ----------
+    model : solph.Model
+
+    name : str
+        Name of the constraint in the block.
+
+    flows : list of tuple or dict
+        See `linear_flow_sum`.
+
+    limit : float
+
+    sense : str
+        '<=' for an upper limit, '>=' for a lower limit or '=='.
+
+    mutable : bool
+        Create the limit as mutable parameter '<name>_limit' of the block,
+        so that it can be changed with `set_value`.
+
+    block : pyomo Block
+        Block of the constraint. Defaults to `model.CustomConstraints`.
+
+    Returns
+    -------
+    constraint : pyomo Constraint
+    """
+    block = _get_block(model, block)
+    if mutable:
+        block.add_component(name + '_limit', po.Param(initialize=limit, mutable=True))
+        limit = getattr(block, name + '_limit')
+
+    return _add_constraint(block, name, linear_flow_sum(model, flows, weights), limit, sense)
+
+
+def add_emission_cap(model, name, emission_factors, cap, weights=None,
+                     mutable=False, block=None):
+    r"""
+    Adds a cap of the weighted emissions of flows over all timesteps.
+
+    Parameters
+    ----------
+    emission_factors : dict
+        Emission per unit of every (source, target) pair.
+
+    cap : float
+        Maximal emissions.
+    """
+    return add_annual_limit(model, name, emission_factors, cap, weights=weights,
+                            mutable=mutable, block=block)
+
+
+def add_share(model, name, flows, reference_flows, share, weights=None,
+              sense='>=', block=None):
+    r"""
+    Adds a constraint for the share of flows in the sum of reference flows,
+    e.g. the renewable share of the electricity demand.
+
+        sum(flows) >= share * sum(reference_flows)
+
+    Parameters
+    ----------
+    flows, reference_flows : list of tuple or dict
+        See `linear_flow_sum`.
+
+    share : float
+
+    sense : str
+        '>=' for a minimal share, '<=' for a maximal one or '=='.
+    """
+    if not isinstance(reference_flows, dict):
+        reference_flows = dict.fromkeys(reference_flows, 1)
+    if not isinstance(flows, dict):
+        flows = dict.fromkeys(flows, 1)
+
+    # sum(flows) - share * sum(reference_flows) as one expression
+    combined = dict(flows)
+    for key, factor in reference_flows.items():
+        combined[key] = combined.get(key, 0) - share * factor
+
+    return _add_constraint(_get_block(model, block), name,
+                           linear_flow_sum(model, combined, weights), 0, sense)
+
+
+def _benchmark_model(n_timesteps, n_flows):
+    model = po.ConcreteModel()
+    model.TIMESTEPS = po.Set(initialize=range(n_timesteps), ordered=True)
+    model.FLOWS = po.Set(initialize=[('source_{0}'.format(i), 'bus') for i in range(n_flows)],
+                         dimen=2)
+    model.flow = po.Var(model.FLOWS, model.TIMESTEPS, within=po.NonNegativeReals)
+
+    return model
+
+
+def benchmark(n_timesteps=8760, n_flows=10, n_constraints=5, number=3):
+    r"""
+    Compares the build time of annual limits with the linear expression
+    builder and with generator sums.
+
+    Returns
+    -------
+    times : dict
+        Build time in seconds of n_constraints limits with each method.
+    """
+    flows = [('source_{0}'.format(i), 'bus') for i in range(n_flows)]
+    weights = [1.5] * n_timesteps
+
+    def generator_sums():
+        model = _benchmark_model(n_timesteps, n_flows)
+        model.limits = po.Block()
+        for number in range(n_constraints):
+            model.limits.add_component('limit_{0}'.format(number), po.Constraint(
+                expr=sum(weights[t] * model.flow[s, o, t]
+                         for (s, o) in flows for t in model.TIMESTEPS) <= 1000))
+
+    def linear_expressions():
+        model = _benchmark_model(n_timesteps, n_flows)
+        for number in range(n_constraints):
+            add_annual_limit(model, 'limit_{0}'.format(number), flows, 1000, weights=weights)
+
+    def model_only():
+        _benchmark_model(n_timesteps, n_flows)
+
+    base = min(timeit.repeat(model_only, number=1, repeat=number))
+
+    return {'generator sums': min(timeit.repeat(generator_sums, number=1, repeat=number)) - base,
+            'linear expressions': min(timeit.repeat(linear_expressions, number=1,
+                                                    repeat=number)) - base}
+
+
+if __name__ == '__main__':
+    for method, seconds in benchmark().items():
+        print('{0:<20} {1:8.3f} sec for 5 limits of 10 flows over 8760 timesteps'.format(
+            method, seconds))
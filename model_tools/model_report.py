@@ -0,0 +1,365 @@
+"""
+Size and numerics of a `solph.Model` before it is solved.
+
+`get_model_report` counts the variables, constraints and nonzeros of a
+model per constraint block (e.g. 'GenericStorageBlock.balance') and per
+component of the energy system. With `coefficients=True` it also returns
+the range of the absolute coefficients of the constraint matrix, the
+objective, the right hand sides and the variable bounds and lists the
+rows whose coefficients differ by more than `max_ratio`. Such rows, e.g.
+from mixing `ep_costs=0.0001` with `maximum=1500000`, slow down the solver
+or make its results inaccurate.
+
+The solve time is estimated from the solve times of earlier runs, which
+are recorded with `record_solve_time` in a json history. The estimate is a
+power law of the number of nonzeros (or of variables), fitted to the runs
+of the same model and solver if there are at least two, otherwise to all
+runs. Every run is recorded in its own file next to the history, so that
+parallel runs do not overwrite each other's records.
+
+    report = model_report.check_model(model, 'oman_thermal', 'report.json', solver='cbc')
+    model.solve(...)
+    model_report.record_solve_time(report, solve_time, 'cbc')
+
+"""
+
+from collections import defaultdict
+import json
+import logging
+import os
+import tempfile
+import time
+
+import numpy as np
+
+try:
+    import pyomo.environ as po
+    from pyomo.repn import generate_standard_repn
+except ImportError:
+    po = None
+
+
+HISTORY_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                            'solve_time_history.json')
+MAX_RATIO = 1e6
+MAX_FLAGGED_ROWS = 20
+
+
+def _nodes_of_index(index):
+    r"""
+    Returns the labels of the energy system nodes in the index of a
+    variable or constraint.
+    """
+    if not isinstance(index, tuple):
+        index = (index,)
+
+    return [str(item.label) for item in index if hasattr(item, 'label')]
+
+
+def _block_name(component_data):
+    return component_data.parent_component().name
+
+
+class _Range(object):
+    r"""
+    Minimum and maximum of absolute values, zeros are ignored.
+    """
+    def __init__(self):
+        self.min = np.inf
+        self.max = 0.
+
+    def add(self, values):
+        values = np.abs(np.asarray(values, dtype=float))
+        values = values[(values > 0) & np.isfinite(values)]
+        if len(values):
+            self.min = min(self.min, values.min())
+            self.max = max(self.max, values.max())
+
+    def to_dict(self):
+        if self.max == 0:
+            return {'min': None, 'max': None, 'ratio': None}
+        return {'min': self.min, 'max': self.max, 'ratio': self.max / self.min}
+
+
+def get_model_report(model, name=None, coefficients=False, max_ratio=MAX_RATIO,
+                     history_file=HISTORY_FILE, solver=None):
+    r"""
+    Returns the size of a model and, optionally, the range of its
+    coefficients.
+
+    Parameters
+    ----------
+    model : solph.Model
+
+    name : str
+        Name of the model in the solve time history.
+
+    coefficients : bool
+        Analyse the coefficients of every constraint. This needs a few
+        seconds for a model of a year, without it only the size is counted.
+
+    max_ratio : float
+        Rows whose largest absolute coefficient is more than max_ratio times
+        their smallest one are flagged.
+
+    history_file : path
+        Solve time history for the estimate, None to skip the estimate.
+
+    solver : str
+        Solver that will solve the model, the estimate prefers its runs.
+
+    Returns
+    -------
+    report : dict
+        'name', 'solver', 'variables', 'constraints', 'nonzeros' (None without
+        coefficients), 'blocks' and 'components' with the counts per block
+        and component, and with coefficients 'ranges' and 'badly_scaled_rows'.
+        'estimated_solve_time' in seconds, None if there is no history.
+    """
+    starttime = time.time()
+
+    blocks = defaultdict(lambda: {'variables': 0, 'constraints': 0, 'nonzeros': 0})
+    components = defaultdict(lambda: {'variables': 0, 'constraints': 0, 'nonzeros': 0})
+
+    bounds = _Range()
+    n_variables = 0
+    for var in model.component_data_objects(po.Var, active=True, descend_into=True):
+        if var.fixed:
+            continue
+        n_variables += 1
+        blocks[_block_name(var)]['variables'] += 1
+        for label in _nodes_of_index(var.index()):
+            components[label]['variables'] += 1
+        if coefficients:
+            bounds.add([bound for bound in (var.lb, var.ub) if bound is not None])
+
+    matrix, rhs = _Range(), _Range()
+    badly_scaled = []
+    n_constraints = 0
+    n_nonzeros = 0 if coefficients else None
+    for con in model.component_data_objects(po.Constraint, active=True, descend_into=True):
+        n_constraints += 1
+        block = _block_name(con)
+        labels = _nodes_of_index(con.index())
+        blocks[block]['constraints'] += 1
+        for label in labels:
+            components[label]['constraints'] += 1
+        if not coefficients:
+            continue
+
+        repn = generate_standard_repn(con.body, compute_values=True)
+        coefs = [coef for coef in repn.linear_coefs if coef != 0]
+        n_nonzeros += len(coefs)
+        blocks[block]['nonzeros'] += len(coefs)
+        for label in labels:
+            components[label]['nonzeros'] += len(coefs)
+
+        matrix.add(coefs)
+        constant = repn.constant or 0
+        rhs.add([bound - constant for bound in (po.value(con.lower) if con.has_lb() else None,
+                                                 po.value(con.upper) if con.has_ub() else None)
+                 if bound is not None])
+
+        if coefs:
+            row = np.abs(coefs)
+            if row.max() / row.min() > max_ratio:
+                badly_scaled.append({'row': con.name, 'min': row.min(), 'max': row.max(),
+                                     'ratio': row.max() / row.min()})
+
+    report = {'name': name,
+              'solver': solver,
+              'variables': n_variables,
+              'constraints': n_constraints,
+              'nonzeros': n_nonzeros,
+              'blocks': dict(blocks),
+              'components': dict(components)}
+
+    if not coefficients:
+        for counts in report['blocks'].values():
+            counts['nonzeros'] = None
+        for counts in report['components'].values():
+            counts['nonzeros'] = None
+    else:
+        objective = _Range()
+        for obj in model.component_data_objects(po.Objective, active=True, descend_into=True):
+            objective.add(generate_standard_repn(obj.expr, compute_values=True).linear_coefs)
+
+        report['ranges'] = {'matrix': matrix.to_dict(),
+                            'objective': objective.to_dict(),
+                            'rhs': rhs.to_dict(),
+                            'bounds': bounds.to_dict()}
+        report['badly_scaled_rows'] = sorted(badly_scaled, key=lambda row: -row['ratio'])
+        report['max_ratio'] = max_ratio
+
+    report['estimated_solve_time'] = (
+        estimate_solve_time(report, history_file) if history_file is not None else None)
+    report['report_time'] = time.time() - starttime
+
+    return report
+
+
+def _get_runs_dir(history_file):
+    return os.path.splitext(history_file)[0] + '_runs'
+
+
+def _read_json(filename, default):
+    try:
+        with open(filename, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        logging.warning('Ignore the unreadable solve time history {0}.'.format(filename))
+        return default
+
+
+def _read_history(history_file):
+    r"""
+    Returns the runs of the history file and of the run files next to it.
+    """
+    if history_file is None:
+        return []
+    history = []
+    if os.path.exists(history_file):
+        history.extend(_read_json(history_file, []))
+    runs_dir = _get_runs_dir(history_file)
+    if os.path.isdir(runs_dir):
+        for name in sorted(os.listdir(runs_dir)):
+            if name.endswith('.json'):
+                run = _read_json(os.path.join(runs_dir, name), None)
+                if run is not None:
+                    history.append(run)
+
+    return history
+
+
+def estimate_solve_time(report, history_file=HISTORY_FILE):
+    r"""
+    Estimates the solve time of a model from the solve time history.
+
+    Returns
+    -------
+    solve_time : float or None
+        Estimated solve time in seconds, None if there are no runs in the
+        history.
+    """
+    history = [run for run in _read_history(history_file) if run.get('solve_time')]
+    if not history:
+        return None
+    same_model = [run for run in history if run.get('name') == report['name']]
+    if len(same_model) >= 2:
+        history = same_model
+    same_solver = [run for run in history if run.get('solver') == report.get('solver')]
+    if report.get('solver') is not None and len(same_solver) >= 2:
+        history = same_solver
+
+    # the number of nonzeros describes the size best, but is only counted
+    # with the coefficients
+    size = 'nonzeros' if report['nonzeros'] and all(run.get('nonzeros') for run in history) \
+        else 'variables'
+    sizes = np.array([run[size] for run in history], dtype=float)
+    times = np.array([run['solve_time'] for run in history], dtype=float)
+    if len(np.unique(sizes)) < 2:
+        # scale the mean solve time linearly with the size
+        return float(times.mean() * report[size] / sizes.mean())
+
+    slope, intercept = np.polyfit(np.log(sizes), np.log(times), 1)
+
+    return float(np.exp(intercept + slope * np.log(report[size])))
+
+
+def record_solve_time(report, solve_time, solver=None, history_file=HISTORY_FILE):
+    r"""
+    Adds the solve time of a model to the solve time history.
+
+    Parameters
+    ----------
+    report : dict
+        Return value of `get_model_report`.
+
+    solve_time : float
+        Solve time in seconds.
+    """
+    run = {'name': report['name'],
+           'solver': solver,
+           'variables': report['variables'],
+           'constraints': report['constraints'],
+           'nonzeros': report['nonzeros'],
+           'solve_time': float(solve_time),
+           'estimated_solve_time': report['estimated_solve_time']}
+
+    # every run gets its own file, named by the time so that the runs are
+    # read in order. It is renamed when complete, so a parallel run never
+    # reads a truncated file.
+    runs_dir = _get_runs_dir(os.path.abspath(history_file))
+    os.makedirs(runs_dir, exist_ok=True)
+    handle, tmp_file = tempfile.mkstemp(
+        prefix='{0:.6f}_'.format(time.time()), suffix='.tmp', dir=runs_dir)
+    with os.fdopen(handle, 'w') as f:
+        json.dump(run, f, indent=1)
+    os.replace(tmp_file, tmp_file[:-len('.tmp')] + '.json')
+
+
+def log_report(report, n_blocks=10):
+    r"""
+    Logs the size of the model, the largest blocks, the coefficient ranges
+    and warnings for badly scaled rows.
+    """
+    nonzeros = report['nonzeros']
+    logging.info('Model {0}: {1} variables, {2} constraints{3}.'.format(
+        report['name'] or '', report['variables'], report['constraints'],
+        '' if nonzeros is None else ', {0} nonzeros'.format(nonzeros)))
+
+    largest = sorted(report['blocks'].items(),
+                     key=lambda item: -(item[1]['variables'] + item[1]['constraints']))
+    for block, counts in largest[:n_blocks]:
+        logging.info('  {0:<45} {1:>9} variables {2:>9} constraints'.format(
+            block, counts['variables'], counts['constraints']))
+
+    for kind, values in report.get('ranges', {}).items():
+        if values['min'] is None:
+            continue
+        message = '  {0} range: [{1:.1e}, {2:.1e}]'.format(kind, values['min'], values['max'])
+        if values['ratio'] > report['max_ratio']:
+            logging.warning(message + ', badly scaled')
+        else:
+            logging.info(message)
+
+    rows = report.get('badly_scaled_rows', [])
+    if rows:
+        logging.warning('{0} rows with a coefficient ratio above {1:.0e}, e.g.:'.format(
+            len(rows), report['max_ratio']))
+        for row in rows[:MAX_FLAGGED_ROWS]:
+            logging.warning('  {0}: [{1:.1e}, {2:.1e}]'.format(row['row'], row['min'], row['max']))
+
+    if report['estimated_solve_time'] is not None:
+        logging.info('Estimated solve time: {0:.0f} sec.'.format(report['estimated_solve_time']))
+
+
+def write_report(report, filename):
+    r"""
+    Writes the report as json.
+    """
+    directory = os.path.dirname(filename)
+    if directory and not os.path.exists(directory):
+        os.makedirs(directory)
+    with open(filename, 'w') as f:
+        json.dump(report, f, indent=1, default=float)
+
+    return filename
+
+
+def check_model(model, name, filename=None, coefficients=False, solver=None):
+    r"""
+    Creates the report of a model, logs it and writes it to filename.
+    solver is the solver that will solve the model, see `get_model_report`.
+
+    Returns
+    -------
+    report : dict
+        Return value of `get_model_report`.
+    """
+    report = get_model_report(model, name=name, coefficients=coefficients, solver=solver)
+    log_report(report)
+    if filename is not None:
+        write_report(report, filename)
+
+    return report
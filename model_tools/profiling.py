@@ -0,0 +1,268 @@
+"""
+Timing and memory profile of the phases of a model run.
+
+A `Profiler` records the wall time, the CPU time and the peak resident
+memory (RSS) of every phase, e.g. data load, energy system build, model
+construction, LP write, solver, results processing, dump and plotting.
+The peak of a phase is the largest RSS sampled by a background thread
+while the phase runs. The high-water mark of the process so far
+(ru_maxrss) is stored as well, it does not decrease after a large phase.
+The CPU time and memory of child processes are recorded separately,
+because solvers like cbc run in their own process.
+
+The active profiler is kept on module level, so that functions deep inside
+a model can record phases without passing the profiler around:
+
+    profiling.start('oman_thermal')
+    with profiling.phase('build'):
+        ...
+    profiling.write('results/profile.json')
+
+In scripts without functions, `begin` and `end` mark a phase instead of the
+context manager. If no profiler is started, `phase`, `begin` and `end` do
+nothing.
+
+"""
+
+from contextlib import contextmanager
+import json
+import logging
+import os
+import platform
+import sys
+import threading
+import time
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+
+SAMPLE_INTERVAL = 0.05
+
+
+def _current_rss_mb():
+    r"""
+    Returns the current resident memory of this process in MB, None if it
+    is unknown.
+    """
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf('SC_PAGE_SIZE') / 1024 ** 2
+    except (OSError, ValueError, IndexError, AttributeError):
+        pass
+    if psutil is not None:
+        return psutil.Process().memory_info().rss / 1024 ** 2
+
+    return None
+
+
+def _max_rss_so_far_mb(who='self'):
+    r"""
+    Returns the largest resident memory in MB of this process ('self') or
+    of its terminated child processes ('children') since they started,
+    None if it is unknown.
+    """
+    if resource is not None:
+        usage = resource.getrusage(
+            resource.RUSAGE_SELF if who == 'self' else resource.RUSAGE_CHILDREN)
+        # ru_maxrss is in bytes on macOS and in kB on Linux
+        divisor = 1024 ** 2 if sys.platform == 'darwin' else 1024
+        return usage.ru_maxrss / divisor
+    if psutil is not None and who == 'self':
+        info = psutil.Process().memory_info()
+        # peak_wset is only available on Windows
+        return getattr(info, 'peak_wset', info.rss) / 1024 ** 2
+
+    return None
+
+
+def _children_cpu_time():
+    times = os.times()
+
+    return times.children_user + times.children_system
+
+
+class Profiler(object):
+    r"""
+    Records the phases of a model run.
+
+    Parameters
+    ----------
+    name : str
+        Name of the run, e.g. the name of the model.
+
+    sample_interval : float
+        Seconds between two samples of the memory of the running phases.
+    """
+    def __init__(self, name, sample_interval=SAMPLE_INTERVAL):
+        self.name = name
+        self.phases = []
+        self._stack = []
+        self._open = []
+        self._start_wall = time.time()
+        self._start_cpu = time.process_time()
+        # peak memory of every running phase, updated by the sampler
+        self._peaks = []
+        self._lock = threading.Lock()
+        self._sample_interval = sample_interval
+        self._sampler = None
+
+    def _sample(self):
+        while True:
+            time.sleep(self._sample_interval)
+            rss = _current_rss_mb()
+            with self._lock:
+                for peak in self._peaks:
+                    peak[0] = max(peak[0], rss)
+
+    def _start_sampler(self):
+        if self._sampler is None and _current_rss_mb() is not None:
+            self._sampler = threading.Thread(target=self._sample, name='profiling')
+            self._sampler.daemon = True
+            self._sampler.start()
+
+    @contextmanager
+    def phase(self, name):
+        r"""
+        Context manager that records one phase. Phases can be nested, the
+        name of the enclosing phase is stored as 'parent'.
+        """
+        parent = self._stack[-1] if self._stack else None
+        self._stack.append(name)
+        self._start_sampler()
+        rss = _current_rss_mb()
+        peak = [rss]
+        if rss is not None:
+            with self._lock:
+                self._peaks.append(peak)
+        wall, cpu, cpu_children = time.time(), time.process_time(), _children_cpu_time()
+        try:
+            yield
+        finally:
+            self._stack.pop()
+            if rss is not None:
+                with self._lock:
+                    self._peaks.remove(peak)
+                    peak[0] = max(peak[0], _current_rss_mb())
+            self.phases.append({
+                'name': name,
+                'parent': parent,
+                'start': wall - self._start_wall,
+                'wall_time': time.time() - wall,
+                'cpu_time': time.process_time() - cpu,
+                'cpu_time_children': _children_cpu_time() - cpu_children,
+                'start_rss_mb': rss,
+                'peak_rss_mb': peak[0],
+                'max_rss_so_far_mb': _max_rss_so_far_mb('self'),
+                'max_rss_children_so_far_mb': _max_rss_so_far_mb('children')})
+
+    def begin(self, name):
+        r"""
+        Starts a phase that is ended by `end`.
+        """
+        context = self.phase(name)
+        context.__enter__()
+        self._open.append(context)
+
+    def end(self):
+        r"""
+        Ends the phase started last by `begin`.
+        """
+        self._open.pop().__exit__(None, None, None)
+
+    def to_dict(self):
+        return {'name': self.name,
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'wall_time': time.time() - self._start_wall,
+                'cpu_time': time.process_time() - self._start_cpu,
+                'max_rss_so_far_mb': _max_rss_so_far_mb('self'),
+                'max_rss_children_so_far_mb': _max_rss_so_far_mb('children'),
+                'phases': self.phases}
+
+    def summary(self):
+        r"""
+        Returns a table of the phases as a string.
+        """
+        lines = ['{0:<30} {1:>10} {2:>10} {3:>12}'.format(
+            'phase', 'wall [s]', 'cpu [s]', 'peak [MB]')]
+        for phase in sorted(self.phases, key=lambda p: p['start']):
+            name = ('  ' if phase['parent'] else '') + phase['name']
+            peak = phase['peak_rss_mb']
+            lines.append('{0:<30} {1:>10.2f} {2:>10.2f} {3:>12}'.format(
+                name[:30], phase['wall_time'], phase['cpu_time'] + phase['cpu_time_children'],
+                '-' if peak is None else '{0:.1f}'.format(peak)))
+
+        return '\n'.join(lines)
+
+    def write(self, filename):
+        r"""
+        Writes the profile as json and logs the summary.
+        """
+        directory = os.path.dirname(filename)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        with open(filename, 'w') as f:
+            json.dump(self.to_dict(), f, indent=1)
+        logging.info('Profile of {0}:\n{1}'.format(self.name, self.summary()))
+
+        return filename
+
+
+_active = None
+
+
+def start(name):
+    r"""
+    Starts a new profiler and makes it the active one.
+    """
+    global _active
+    _active = Profiler(name)
+
+    return _active
+
+
+def get_active():
+    return _active
+
+
+@contextmanager
+def phase(name):
+    r"""
+    Records a phase with the active profiler. Does nothing if no profiler
+    is started.
+    """
+    if _active is None:
+        yield
+    else:
+        with _active.phase(name):
+            yield
+
+
+def begin(name):
+    r"""
+    Starts a phase of the active profiler that is ended by `end`.
+    """
+    if _active is not None:
+        _active.begin(name)
+
+
+def end():
+    if _active is not None:
+        _active.end()
+
+
+def write(filename):
+    r"""
+    Writes the profile of the active profiler, if there is one.
+    """
+    if _active is not None:
+        return _active.write(filename)
@@ -0,0 +1,375 @@
+"""
+Reduction of an energy system before the model is built.
+
+`prune_energysystem` removes the parts of an energy system that can not
+carry energy and merges identical parallel transformers, so that pyomo
+never creates their variables and constraints:
+
+* Flows that are fixed to zero: a nominal value of zero, a maximum or a
+  fixed actual value of zero in every timestep or an investment with a
+  maximum of zero.
+* Storages with a nominal capacity of zero and no investment.
+* Dead nodes: a transformer with a zero flow (all its flows are
+  proportional), a storage with zero inputs or with zero outputs and no
+  capacity loss, a bus whose inputs or whose outputs are all zero and a
+  source or sink without a non-zero flow. The
+  flows of a dead node are zero as well, so this is repeated until nothing
+  changes.
+* Transformers with the same input and output buses, conversion factors
+  and flow parameters except the nominal value, whose nominal values all
+  have the same ratio. They are merged into the
+  first one, whose nominal values are the sums. The share of every merged
+  transformer is its share of the nominal value.
+
+Flows are only removed from buses, sources and sinks. Other components,
+e.g. CHPs, keep their flows and a node connected to them is kept even if it
+is dead.
+
+The pruned nodes are added to a new energy system, because the groups of
+an energy system can not be updated after a node has been removed. The
+report of the removed and merged parts is kept as attribute `pruning` of
+the new energy system and added to the meta results by `add_report`:
+
+    energysystem, report = pruning.prune_energysystem(energysystem)
+    ...
+    energysystem.results['meta'] = outputlib.processing.meta_results(model)
+    pruning.add_report(energysystem)
+
+"""
+
+import logging
+
+import numpy as np
+
+try:
+    import oemof.solph as solph
+except ImportError:
+    solph = None
+
+
+def _values(value, n_timesteps):
+    r"""
+    Returns the values of a sequence or a scalar for all timesteps.
+    """
+    if value is None:
+        return None
+    if hasattr(value, 'default') or not hasattr(value, '__iter__'):
+        # solph sequences return their default for every index
+        return np.array([value[t] if hasattr(value, '__getitem__') else value
+                         for t in range(n_timesteps)], dtype=float)
+
+    return np.asarray(list(value), dtype=float)[:n_timesteps]
+
+
+def _same(a, b, n_timesteps):
+    r"""
+    Compares two attribute values of flows or components, sequences by
+    their values in all timesteps.
+    """
+    if a is b:
+        return True
+    if isinstance(a, dict) and isinstance(b, dict):
+        return (set(a) == set(b) and
+                all(_same(a[key], b[key], n_timesteps) for key in a))
+    try:
+        values_a, values_b = _values(a, n_timesteps), _values(b, n_timesteps)
+    except (TypeError, ValueError):
+        return a == b
+    if values_a is None or values_b is None:
+        return values_a is values_b
+
+    return np.array_equal(values_a, values_b, equal_nan=True)
+
+
+def _is_zero_flow(flow, n_timesteps):
+    investment = getattr(flow, 'investment', None)
+    if investment is not None:
+        return (getattr(investment, 'maximum', None) == 0 and
+                not getattr(investment, 'existing', 0))
+    if flow.nominal_value is None:
+        return False
+    if flow.nominal_value == 0:
+        return True
+    if flow.fixed and not _values(flow.actual_value, n_timesteps).any():
+        return True
+
+    return not _values(flow.max, n_timesteps).any()
+
+
+def _is_forced_flow(flow, n_timesteps):
+    r"""
+    Returns True if a flow has to be positive in a timestep.
+    """
+    if not flow.nominal_value:
+        return False
+    if flow.fixed and _values(flow.actual_value, n_timesteps).any():
+        return True
+    if getattr(flow, 'nonconvex', None) is None and _values(flow.min, n_timesteps).any():
+        return True
+
+    return bool(getattr(flow, 'summed_min', None))
+
+
+def _is_zero_storage(node):
+    investment = getattr(node, 'investment', None)
+    if investment is not None:
+        return (getattr(investment, 'maximum', None) == 0 and
+                not getattr(investment, 'existing', 0))
+
+    return node.nominal_capacity == 0
+
+
+def _is_plain_transformer(node):
+    return type(node) is solph.Transformer
+
+
+def _can_lose_flows(node):
+    return isinstance(node, (solph.Bus, solph.Source, solph.Sink))
+
+
+def _get_flows(node):
+    r"""
+    Returns the (source, target) pairs of all flows of a node.
+    """
+    return ([(source, node) for source in node.inputs] +
+            [(node, target) for target in node.outputs])
+
+
+def _get_flow(edge):
+    return edge[0].outputs[edge[1]]
+
+
+def _remove_flow(edge):
+    source, target = edge
+    del source.outputs[target]
+    if source in target.inputs:
+        # older oemof versions keep the inputs in a separate dict
+        del target.inputs[source]
+
+
+def _is_dead(node, zero, n_timesteps):
+    r"""
+    Returns True if all flows of a node are zero if the flows in zero are.
+    """
+    inputs = [(source, node) for source in node.inputs]
+    outputs = [(node, target) for target in node.outputs]
+
+    if isinstance(node, solph.Bus):
+        if not getattr(node, 'balanced', True):
+            return all(edge in zero for edge in inputs + outputs)
+        return all(edge in zero for edge in inputs) or all(edge in zero for edge in outputs)
+    if isinstance(node, solph.components.GenericStorage):
+        if _is_zero_storage(node) or all(edge in zero for edge in inputs):
+            return True
+        # a storage that cannot discharge can still take in energy and lose
+        # it, so it is only dead without a capacity loss
+        capacity_loss = _values(getattr(node, 'capacity_loss', 0), n_timesteps)
+        return all(edge in zero for edge in outputs) and not capacity_loss.any()
+    if _is_plain_transformer(node):
+        for edge in inputs + outputs:
+            bus = edge[0] if edge[1] is node else edge[1]
+            factor = node.conversion_factors.get(bus)
+            if edge in zero and (factor is None or _values(factor, n_timesteps).all()):
+                return True
+        return False
+
+    return all(edge in zero for edge in inputs + outputs)
+
+
+def _get_dead_parts(nodes, n_timesteps):
+    r"""
+    Returns the dead nodes and the zero flows.
+    """
+    zero = set((node, target) for node in nodes for target in node.outputs
+               if _is_zero_flow(node.outputs[target], n_timesteps))
+
+    dead = set()
+    changed = True
+    while changed:
+        changed = False
+        for node in nodes:
+            if node in dead or not _is_dead(node, zero, n_timesteps):
+                continue
+            dead.add(node)
+            zero.update(_get_flows(node))
+            changed = True
+
+    # a dead node can only be removed if its neighbours can lose the flows
+    # to it
+    changed = True
+    while changed:
+        changed = False
+        for node in list(dead):
+            for source, target in _get_flows(node):
+                neighbour = source if target is node else target
+                if neighbour not in dead and not _can_lose_flows(neighbour):
+                    dead.discard(node)
+                    changed = True
+                    break
+
+    return dead, zero
+
+
+def _merge_key(node):
+    return (frozenset(id(bus) for bus in node.inputs),
+            frozenset(id(bus) for bus in node.outputs))
+
+
+def _can_merge(node, other, n_timesteps):
+    if _merge_key(node) != _merge_key(other):
+        return False
+    for bus in node.conversion_factors:
+        if not _same(node.conversion_factors[bus], other.conversion_factors.get(bus), n_timesteps):
+            return False
+
+    pairs = ([(node.inputs[bus], other.inputs[bus]) for bus in node.inputs] +
+             [(node.outputs[bus], other.outputs[bus]) for bus in node.outputs])
+    ratios = []
+    for flow, other_flow in pairs:
+        if (getattr(flow, 'investment', None) is not None or
+                getattr(other_flow, 'investment', None) is not None or
+                getattr(flow, 'nonconvex', None) is not None or
+                getattr(other_flow, 'nonconvex', None) is not None):
+            return False
+        if (flow.nominal_value is None) != (other_flow.nominal_value is None):
+            return False
+        if flow.nominal_value is not None:
+            if not flow.nominal_value:
+                return False
+            ratios.append(other_flow.nominal_value / flow.nominal_value)
+        attributes = set(vars(flow)) | set(vars(other_flow))
+        for name in attributes - {'nominal_value'}:
+            if not _same(getattr(flow, name, None), getattr(other_flow, name, None), n_timesteps):
+                return False
+
+    # the merged transformer has the capacity of both only if all their
+    # flows are sized in the same ratio, otherwise it could convert more
+    return np.allclose(ratios, ratios[0]) if ratios else True
+
+
+def _get_size(node):
+    r"""
+    Returns the nominal value of the first output of a transformer with a
+    nominal value, None if there is none.
+    """
+    for bus in sorted(node.outputs, key=str):
+        if node.outputs[bus].nominal_value is not None:
+            return node.outputs[bus].nominal_value
+
+    return None
+
+
+def _merge(node, other):
+    r"""
+    Adds the nominal values of other to node and removes the flows of other.
+    """
+    for flows, other_flows in [(node.inputs, other.inputs), (node.outputs, other.outputs)]:
+        for bus in flows:
+            if flows[bus].nominal_value is not None:
+                flows[bus].nominal_value += other_flows[bus].nominal_value
+
+    for edge in _get_flows(other):
+        _remove_flow(edge)
+
+
+def prune_energysystem(energysystem, merge=True):
+    r"""
+    Removes zero flows, zero-capacity storages and dead nodes and merges
+    identical parallel transformers.
+
+    Parameters
+    ----------
+    energysystem : solph.EnergySystem
+        Energy system without results. Its nodes are changed in place.
+
+    merge : bool
+        Merge identical parallel transformers.
+
+    Returns
+    -------
+    energysystem : solph.EnergySystem
+        New energy system with the remaining nodes.
+
+    report : dict or None
+        None if the model is infeasible and is not pruned, otherwise
+        'removed_nodes' with the labels of the removed nodes,
+        'removed_flows' with the labels of the removed flows between the
+        remaining nodes and 'merged' with the share of the nominal value of
+        every transformer that is merged into another one.
+    """
+    n_timesteps = len(energysystem.timeindex)
+    nodes = list(energysystem.nodes)
+
+    dead, zero = _get_dead_parts(nodes, n_timesteps)
+
+    forced = [edge for edge in zero if _is_forced_flow(_get_flow(edge), n_timesteps)]
+    if forced:
+        logging.warning('The flows {0} have to be positive, but can only be zero. The model '
+                        'is infeasible and is not pruned.'.format(
+                            ', '.join('{0} -> {1}'.format(*edge) for edge in forced)))
+        return energysystem, None
+
+    removed_flows = []
+    for source, target in sorted(zero, key=lambda edge: (str(edge[0]), str(edge[1]))):
+        removable = ((source in dead or _can_lose_flows(source)) and
+                     (target in dead or _can_lose_flows(target)))
+        if not removable:
+            continue
+        _remove_flow((source, target))
+        if source not in dead and target not in dead:
+            removed_flows.append([str(source.label), str(target.label)])
+
+    kept = [node for node in nodes if node not in dead]
+
+    merged = {}
+    if merge:
+        transformers = [node for node in kept if _is_plain_transformer(node)]
+        for number, node in enumerate(transformers):
+            if node not in kept:
+                continue
+            sizes = {}
+            for other in transformers[number + 1:]:
+                if other in kept and _can_merge(node, other, n_timesteps):
+                    sizes[str(other.label)] = _get_size(other)
+                    _merge(node, other)
+                    kept.remove(other)
+            if sizes:
+                total = _get_size(node)
+                merged[str(node.label)] = {
+                    label: size / total if total else None for label, size in sizes.items()}
+
+    pruned = solph.EnergySystem(timeindex=energysystem.timeindex)
+    pruned.add(*kept)
+
+    report = {'removed_nodes': sorted(str(node.label) for node in dead),
+              'removed_flows': removed_flows,
+              'merged': merged}
+
+    logging.info('Pruned the energy system: removed {0} nodes and {1} flows, merged {2} '
+                 'transformers.'.format(len(report['removed_nodes']), len(removed_flows),
+                                        sum(len(labels) for labels in merged.values())))
+    pruned.pruning = report
+
+    return pruned, report
+
+
+def add_report(energysystem):
+    r"""
+    Adds the report of `prune_energysystem` to the meta results of a pruned
+    energy system. Does nothing if the energy system is not pruned.
+    """
+    report = getattr(energysystem, 'pruning', None)
+    if report is not None:
+        energysystem.results['meta']['pruning'] = report
+
+
+def get_kept_flows(energysystem, flows):
+    r"""
+    Returns the flows of a list of (source, target) nodes that are still in
+    a pruned energy system. The other flows have been removed because they
+    can only be zero, so constraints on them can be skipped.
+    """
+    nodes = set(energysystem.nodes)
+
+    return [(source, target) for source, target in flows
+            if source in nodes and target in nodes and target in source.outputs]
@@ -0,0 +1,294 @@
+"""
+Columnar store for the results of oemof models.
+
+The results are written to a directory. Every column of the sequences of a
+flow or node is stored in its own uncompressed numpy file, so that a single
+flow or a time window can be read by memory-mapping without loading the
+other sequences. Scalars, the meta results and the list of columns are
+kept in a small json index.
+
+    <name>.results/
+        index.json
+        timeindex.npy
+        main/00000.npy
+        ...
+        param/00000.npy
+        ...
+
+The keys of the results are stored as strings, like
+`outputlib.views.convert_keys_to_strings` does.
+
+"""
+
+from collections.abc import Mapping
+import json
+import numbers
+import os
+
+import numpy as np
+import pandas as pd
+
+
+INDEX_FILE = 'index.json'
+TIMEINDEX_FILE = 'timeindex.npy'
+GROUPS = ['main', 'param']
+
+
+def _to_builtin(value):
+    r"""
+    Converts a scalar value, or a list or dict of them, into a type that
+    can be stored in json.
+    """
+    if value is None or isinstance(value, (bool, str)):
+        return value
+    if isinstance(value, dict):
+        return {str(k): _to_builtin(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_to_builtin(v) for v in value]
+    if isinstance(value, (np.bool_,)):
+        return bool(value)
+    if isinstance(value, numbers.Integral):
+        return int(value)
+    if isinstance(value, numbers.Real):
+        value = float(value)
+        # json has no nan, use None instead
+        return None if np.isnan(value) else value
+
+    return str(value)
+
+
+def _key_to_strings(key):
+    if isinstance(key, tuple):
+        return [str(k) for k in key]
+
+    return [str(key)]
+
+
+def write_results(results, path, groups=GROUPS):
+    r"""
+    Writes the results of an energy system to a results store.
+
+    Parameters
+    ----------
+    results : dict
+        `energysystem.results` with the groups 'main', 'param' and 'meta'.
+
+    path : path
+        Directory of the results store. It is created if it does not exist.
+
+    groups : list of str
+        Groups of the results to store.
+
+    Returns
+    -------
+    path : path
+    """
+    if not os.path.exists(path):
+        os.makedirs(path)
+
+    index = {'groups': {}, 'meta': {}}
+    timeindex = None
+    n_columns = 0
+
+    for group in groups:
+        if group not in results:
+            continue
+        group_path = os.path.join(path, group)
+        if not os.path.exists(group_path):
+            os.makedirs(group_path)
+
+        entries = []
+        for key, value in results[group].items():
+            entry = {'key': _key_to_strings(key), 'columns': [], 'scalars': {}}
+
+            scalars = value.get('scalars')
+            if scalars is not None:
+                entry['scalars'] = {str(name): _to_builtin(v) for name, v in scalars.items()}
+
+            sequences = value.get('sequences')
+            if sequences is not None and not sequences.empty:
+                if (isinstance(sequences.index, pd.DatetimeIndex) and
+                        (timeindex is None or len(sequences.index) > len(timeindex))):
+                    timeindex = sequences.index
+                for column in sequences.columns:
+                    filename = '{0}/{1:05d}.npy'.format(group, n_columns)
+                    n_columns += 1
+                    np.save(os.path.join(path, filename),
+                            np.ascontiguousarray(sequences[column].values, dtype=float))
+                    entry['columns'].append({'name': str(column),
+                                             'file': filename,
+                                             'length': len(sequences)})
+            entries.append(entry)
+
+        index['groups'][group] = entries
+
+    if timeindex is not None:
+        np.save(os.path.join(path, TIMEINDEX_FILE), timeindex.values.astype('datetime64[ns]'))
+
+    for group, values in results.get('meta', {}).items():
+        if isinstance(values, dict):
+            index['meta'][group] = {str(k): _to_builtin(v) for k, v in values.items()}
+        else:
+            index['meta'][group] = _to_builtin(values)
+
+    with open(os.path.join(path, INDEX_FILE), 'w') as f:
+        json.dump(index, f, indent=1)
+
+    return path
+
+
+class ResultsStore(object):
+    r"""
+    Reads a results store written by `write_results`.
+
+    Only the index is read on initialisation. Sequences are memory-mapped
+    and only the requested flows and the requested time window are copied
+    into memory.
+
+    Parameters
+    ----------
+    path : path
+        Directory of the results store.
+    """
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, INDEX_FILE), 'r') as f:
+            self.index = json.load(f)
+        self.meta = self.index['meta']
+        self._entries = {group: {tuple(entry['key']): entry for entry in entries}
+                         for group, entries in self.index['groups'].items()}
+        self._timeindex = None
+
+    @property
+    def timeindex(self):
+        if self._timeindex is None:
+            filename = os.path.join(self.path, TIMEINDEX_FILE)
+            if os.path.exists(filename):
+                self._timeindex = pd.DatetimeIndex(np.load(filename))
+            else:
+                self._timeindex = pd.DatetimeIndex([])
+        return self._timeindex
+
+    def keys(self, group='main'):
+        return list(self._entries[group].keys())
+
+    def _read_column(self, column, start=None, end=None):
+        values = np.load(os.path.join(self.path, column['file']), mmap_mode='r')
+
+        return np.array(values[start:end])
+
+    def _window(self, length, start=None, end=None):
+        r"""
+        Returns the time index of a column of the given length, cut to the
+        window.
+        """
+        timeindex = self.timeindex
+        if len(timeindex) >= length:
+            return timeindex[:length][start:end]
+
+        return pd.RangeIndex(length)[start:end]
+
+    def sequences(self, key, group='main', start=None, end=None):
+        r"""
+        Returns the sequences of one key as a DataFrame.
+
+        Parameters
+        ----------
+        key : tuple of str
+            E.g. ('pv', 'electricity') or ('storage', 'None').
+
+        start, end : int
+            Positions of the first and after the last timestep to read.
+        """
+        entry = self._entries[group][tuple(key)]
+        if not entry['columns']:
+            return pd.DataFrame()
+
+        index = self._window(entry['columns'][0]['length'], start, end)
+        data = {column['name']: self._read_column(column, start, end)
+                for column in entry['columns']}
+
+        return pd.DataFrame(data, index=index, columns=[c['name'] for c in entry['columns']])
+
+    def scalars(self, key, group='main'):
+        r"""
+        Returns the scalars of one key as a Series.
+        """
+        return pd.Series(self._entries[group][tuple(key)]['scalars'], dtype=object).infer_objects()
+
+    def string_results(self, group='main', start=None, end=None):
+        r"""
+        Returns the results with string keys, like
+        `outputlib.views.convert_keys_to_strings`. The sequences of a key are
+        read when the key is accessed.
+        """
+        return _LazyResults(self, group, start, end)
+
+    def node(self, label, group='main', start=None, end=None):
+        r"""
+        Returns all sequences and scalars of a node, like
+        `outputlib.views.node`.
+
+        Parameters
+        ----------
+        label : str
+            Label of the node.
+
+        start, end : int
+            Positions of the first and after the last timestep to read.
+
+        Returns
+        -------
+        dict with the DataFrame 'sequences' and the Series 'scalars'
+        """
+        keys = sorted(key for key in self._entries[group] if label in key)
+
+        sequences = []
+        columns = []
+        scalars = {}
+        for key in keys:
+            for column in self._entries[group][key]['columns']:
+                index = self._window(column['length'], start, end)
+                sequences.append(pd.Series(self._read_column(column, start, end), index=index))
+                columns.append((key, column['name']))
+            for name, value in self._entries[group][key]['scalars'].items():
+                scalars[(key, name)] = value
+
+        if sequences:
+            df = pd.concat(sequences, axis=1)
+            df.columns = pd.MultiIndex.from_tuples(columns)
+        else:
+            df = pd.DataFrame()
+
+        if scalars:
+            series = pd.Series(list(scalars.values()),
+                               index=pd.MultiIndex.from_tuples(list(scalars.keys())))
+        else:
+            series = pd.Series(dtype=float)
+
+        return {'sequences': df, 'scalars': series}
+
+
+class _LazyResults(Mapping):
+    r"""
+    Mapping of string keys to the results of a key, read on access.
+    """
+    def __init__(self, store, group, start, end):
+        self.store = store
+        self.group = group
+        self.start = start
+        self.end = end
+
+    def __getitem__(self, key):
+        key = tuple(key)
+        if key not in self.store._entries[self.group]:
+            raise KeyError(key)
+
+        return {'sequences': self.store.sequences(key, self.group, self.start, self.end),
+                'scalars': self.store.scalars(key, self.group)}
+
+    def __iter__(self):
+        return iter(self.store.keys(self.group))
+
+    def __len__(self):
+        return len(self.store._entries[self.group])
@@ -0,0 +1,250 @@
+"""
+Solvers for single models and for sequences of similar models.
+
+`solve_model` solves a model like `solph.Model.solve`. With the solver
+'highs' the model is passed to the in-memory HiGHS interface of pyomo
+(appsi) instead of writing an LP file, starting a solver process and
+reading its solution file. If HiGHS is not available, the model is solved
+with cbc. The solver is set with `solver:` in the experiment configs.
+
+In a sweep, consecutive models differ only in a few costs or bounds. The
+`SweepSolver` keeps an in-memory HiGHS instance (pyomo appsi) for the model
+and passes only the changes to it. HiGHS keeps the optimal basis of the
+previous solve, so the next solve starts from it instead of from scratch.
+If HiGHS is not available, the models are solved by `solph.Model.solve`
+with the given solver, e.g. cbc, which always starts cold.
+
+The solve time of every scenario is recorded. The time saved by a warm
+start is the difference to the cold solve of the same model, which is
+either the first solve after the model has been built or, with
+`compare_cold=True`, an additional cold solve of every scenario.
+
+"""
+
+import logging
+import os
+import time
+
+import pandas as pd
+
+try:
+    from pyomo.contrib.appsi.solvers import Highs
+    from pyomo.contrib.appsi.base import TerminationCondition as AppsiTerminationCondition
+except ImportError:
+    Highs = None
+
+try:
+    from pyomo.opt import SolverResults, SolverStatus, TerminationCondition
+except ImportError:
+    SolverResults = None
+
+
+def highs_available():
+    r"""
+    Returns True if the in-memory HiGHS interface can be used.
+    """
+    if Highs is None:
+        return False
+    try:
+        return bool(Highs().available())
+    except Exception:
+        return False
+
+
+def to_solver_results(model, appsi_results, wallclock_time):
+    r"""
+    Converts the results of an appsi solver into pyomo `SolverResults`, so
+    that `outputlib.processing.meta_results` works like after
+    `solph.Model.solve`.
+    """
+    results = SolverResults()
+    results.problem.name = model.name
+    results.problem.lower_bound = appsi_results.best_objective_bound
+    results.problem.upper_bound = appsi_results.best_feasible_objective
+    results.problem.number_of_variables = model.nvariables()
+    results.problem.number_of_constraints = model.nconstraints()
+    results.problem.number_of_objectives = 1
+
+    optimal = appsi_results.termination_condition == AppsiTerminationCondition.optimal
+    results.solver.name = 'highs (appsi)'
+    results.solver.status = SolverStatus.ok if optimal else SolverStatus.warning
+    results.solver.termination_condition = (
+        TerminationCondition.optimal if optimal else TerminationCondition.unknown)
+    results.solver.wallclock_time = wallclock_time
+
+    return results
+
+
+def solve_model(model, solver='cbc', solve_kwargs=None, cmdline_options=None,
+                fallback='cbc'):
+    r"""
+    Solves a model in memory with HiGHS or with a file based solver.
+
+    Parameters
+    ----------
+    model : solph.Model
+
+    solver : str
+        'highs' for the in-memory HiGHS interface, otherwise the solver of
+        `solph.Model.solve`, e.g. 'cbc'.
+
+    solve_kwargs : dict
+        Keyword arguments for `solph.Model.solve`. With HiGHS only 'tee' is
+        used, to show the solver output.
+
+    cmdline_options : dict
+        Command line options of the file based solver, not used by HiGHS.
+
+    fallback : str
+        Solver that is used if HiGHS is not available.
+
+    Returns
+    -------
+    solver : str
+        The solver that solved the model.
+    """
+    solve_kwargs = solve_kwargs or {}
+
+    if solver == 'highs':
+        if highs_available():
+            highs = Highs()
+            highs.config.stream_solver = solve_kwargs.get('tee', False)
+            starttime = time.time()
+            appsi_results = highs.solve(model)
+            model.es.results = to_solver_results(model, appsi_results, time.time() - starttime)
+            model.solver_results = model.es.results
+            return 'highs'
+
+        logging.warning('HiGHS is not available, the model is solved with {0}.'.format(fallback))
+        solver = fallback
+
+    model.solve(solver=solver, solve_kwargs=solve_kwargs,
+                cmdline_options=cmdline_options or {})
+
+    return solver
+
+
+class SweepSolver(object):
+    r"""
+    Solves the models of a sweep and warm starts every solve of the same
+    model from the previous solution.
+
+    Parameters
+    ----------
+    solver : str
+        Solver of `solve_model`, used if HiGHS is not available or
+        `warm_start` is False.
+
+    solve_kwargs : dict
+        Keyword arguments for `solph.Model.solve`, e.g. {'tee': True}.
+
+    warm_start : bool
+        Use the in-memory HiGHS interface to warm start.
+
+    compare_cold : bool
+        Additionally solve every warm started scenario cold, to measure the
+        time saved exactly instead of estimating it.
+    """
+    def __init__(self, solver='cbc', solve_kwargs=None, warm_start=True,
+                 compare_cold=False):
+        self.solver = solver
+        self.solve_kwargs = solve_kwargs or {}
+        self.warm_start = warm_start and highs_available()
+        self.compare_cold = compare_cold
+        self.records = []
+        self._model = None
+        self._highs = None
+        self._cold_time = None
+
+        if warm_start and not self.warm_start:
+            logging.warning('HiGHS is not available, the models are solved '
+                            'with {0} without warm start.'.format(solver))
+
+    def _solve_highs(self, model, highs):
+        starttime = time.time()
+        appsi_results = highs.solve(model)
+        elapsed = time.time() - starttime
+
+        model.es.results = to_solver_results(model, appsi_results, elapsed)
+        model.solver_results = model.es.results
+
+        return elapsed
+
+    def solve(self, model, scenario):
+        r"""
+        Solves a model and records the solve time.
+
+        Parameters
+        ----------
+        model : solph.Model
+            The model. If it is the same object as in the previous call,
+            the solve is warm started.
+
+        scenario : str or int
+            Name of the scenario for the report.
+
+        Returns
+        -------
+        elapsed : float
+            Solve time in seconds.
+        """
+        if not self.warm_start:
+            starttime = time.time()
+            solver = solve_model(model, self.solver, self.solve_kwargs)
+            elapsed = time.time() - starttime
+            self.records.append({'scenario': scenario, 'solver': solver,
+                                 'warm_start': False, 'solve_time': elapsed,
+                                 'cold_solve_time': elapsed, 'time_saved': 0.})
+            return elapsed
+
+        cold_time = None
+        if model is not self._model:
+            # a new model has no previous basis
+            self._model = model
+            self._highs = Highs()
+            self._highs.config.stream_solver = self.solve_kwargs.get('tee', False)
+            elapsed = self._solve_highs(model, self._highs)
+            self._cold_time = elapsed
+            warm = False
+            cold_time = elapsed
+        else:
+            if self.compare_cold:
+                cold_time = self._solve_highs(model, Highs())
+            elapsed = self._solve_highs(model, self._highs)
+            warm = True
+            if cold_time is None:
+                cold_time = self._cold_time
+
+        self.records.append({'scenario': scenario, 'solver': 'highs',
+                             'warm_start': warm, 'solve_time': elapsed,
+                             'cold_solve_time': cold_time,
+                             'time_saved': cold_time - elapsed})
+        logging.info('Solved scenario {0} in {1:.2f} sec ({2}).'.format(
+            scenario, elapsed, 'warm start' if warm else 'cold start'))
+
+        return elapsed
+
+    def report(self, filename=None):
+        r"""
+        Returns the solve times of all scenarios and optionally writes them
+        to a csv file.
+
+        Returns
+        -------
+        report : pd.DataFrame
+            Columns 'scenario', 'solver', 'warm_start', 'solve_time',
+            'cold_solve_time' and 'time_saved' in seconds.
+        """
+        report = pd.DataFrame(self.records, columns=[
+            'scenario', 'solver', 'warm_start', 'solve_time',
+            'cold_solve_time', 'time_saved'])
+
+        if filename is not None:
+            directory = os.path.dirname(filename)
+            if directory and not os.path.exists(directory):
+                os.makedirs(directory)
+            report.to_csv(filename, index=False)
+            logging.info('Time saved by warm starts: {0:.2f} sec.'.format(
+                report['time_saved'].sum()))
+
+        return report
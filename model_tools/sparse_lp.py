@@ -0,0 +1,454 @@
+"""
+Linear program of an energy system as sparse matrices.
+
+`solph.Model` creates a pyomo object for every variable, constraint and
+term, so for a year of hourly timesteps building the model often takes as
+long as solving it. For energy systems that consist only of buses,
+sources, sinks, transformers and generic storages, with or without
+investment, `build_lp` assembles the same linear program directly as
+scipy.sparse matrices. The rows of a constraint family are created for all
+timesteps at once with numpy. `solve_lp` passes the matrices to HiGHS in
+the same process (`scipy.optimize.linprog`) and `get_results` maps the
+solution back to the structure of `outputlib.processing.results` and
+`meta_results`, so the plots and analyses of the results keep working:
+
+    if not sparse_lp.get_unsupported(energysystem):
+        lp = sparse_lp.build_lp(energysystem)
+        solution = sparse_lp.solve_lp(lp)
+        energysystem.results = sparse_lp.get_results(lp, solution)
+
+The constraints follow oemof.solph 0.2: balanced buses, the linear relation
+of every input and output of a transformer, the cyclic storage balance
+with the initial capacity as content of the last timestep, the bounds,
+summed maxima and minima of flows and the investment flows and storages.
+Components with binary variables (nonconvex flows, GenericCHP) or with
+their own constraint blocks (e.g. ExtractionTurbineCHP) and flow gradients
+are not supported, `get_unsupported` lists them and the model has to be
+built with `solph.Model`.
+
+"""
+
+import logging
+import time
+
+import numpy as np
+import pandas as pd
+
+try:
+    import scipy.sparse as sparse
+    from scipy.optimize import linprog
+except ImportError:
+    sparse = None
+    linprog = None
+
+try:
+    import oemof.solph as solph
+except ImportError:
+    solph = None
+
+
+def _values(value, n_timesteps):
+    r"""
+    Returns the values of a solph sequence, a sequence or a scalar for all
+    timesteps as float array, None if the value is None.
+    """
+    if value is None:
+        return None
+    if hasattr(value, 'default') and not value.default_changed:
+        # scalar solph sequence, which returns its default for every index
+        if value.default is None:
+            return None
+        return np.full(n_timesteps, value.default, dtype=float)
+    if np.isscalar(value):
+        return np.full(n_timesteps, value, dtype=float)
+    if hasattr(value, 'default'):
+        return np.array([value[t] for t in range(n_timesteps)], dtype=float)
+
+    return np.asarray(value, dtype=float)[:n_timesteps]
+
+
+def get_unsupported(energysystem):
+    r"""
+    Returns the reasons why the linear program of an energy system can not
+    be built by `build_lp`.
+
+    Returns
+    -------
+    reasons : list of str
+        Empty if all components and flows are supported.
+    """
+    reasons = []
+    for node in energysystem.nodes:
+        if type(node) not in (solph.Bus, solph.Source, solph.Sink, solph.Transformer,
+                              solph.components.GenericStorage):
+            reasons.append('{0} is a {1}'.format(node.label, type(node).__name__))
+
+    for (source, target), flow in energysystem.flows().items():
+        label = '{0} -> {1}'.format(source.label, target.label)
+        if getattr(flow, 'nonconvex', None) is not None:
+            reasons.append('{0} is nonconvex'.format(label))
+        if getattr(flow, 'integer', False):
+            reasons.append('{0} is integer'.format(label))
+        for gradient in ('positive_gradient', 'negative_gradient'):
+            if getattr(flow, gradient, {'ub': [None]})['ub'][0] is not None:
+                reasons.append('{0} has a {1}'.format(label, gradient.replace('_', ' ')))
+
+    return reasons
+
+
+class _Rows(object):
+    r"""
+    Rows of a sparse constraint matrix, collected as coordinates.
+    """
+    def __init__(self):
+        self.rows, self.cols, self.data, self.rhs = [], [], [], []
+        self.number = 0
+
+    def add(self, terms, rhs):
+        r"""
+        Adds one row per element of rhs.
+
+        Parameters
+        ----------
+        terms : list of tuple
+            Columns and coefficients of one term of every row, arrays of the
+            length of rhs or scalars.
+
+        rhs : array
+        """
+        rhs = np.asarray(rhs, dtype=float)
+        rows = np.arange(self.number, self.number + len(rhs))
+        for cols, coefs in terms:
+            self.rows.append(rows)
+            self.cols.append(np.broadcast_to(cols, rows.shape))
+            self.data.append(np.broadcast_to(np.asarray(coefs, dtype=float), rows.shape))
+        self.rhs.append(rhs)
+        self.number += len(rhs)
+
+    def add_sum(self, cols, coefs, rhs):
+        r"""
+        Adds one row with the terms of cols and coefs.
+        """
+        self.rows.append(np.full(len(cols), self.number))
+        self.cols.append(np.asarray(cols))
+        self.data.append(np.broadcast_to(np.asarray(coefs, dtype=float), (len(cols),)))
+        self.rhs.append(np.array([rhs], dtype=float))
+        self.number += 1
+
+    def to_matrix(self, n_variables):
+        if not self.number:
+            return None, None
+        matrix = sparse.coo_matrix(
+            (np.concatenate(self.data), (np.concatenate(self.rows), np.concatenate(self.cols))),
+            shape=(self.number, n_variables)).tocsr()
+
+        return matrix, np.concatenate(self.rhs)
+
+
+def _get_timeincrement(timeindex):
+    try:
+        return timeindex.freq.nanos / 3.6e12
+    except AttributeError:
+        logging.warning('Could not get the timeincrement from the timeindex. Setting it to 1.')
+        return 1.
+
+
+def build_lp(energysystem, objective_weighting=None):
+    r"""
+    Builds the linear program of an energy system.
+
+    Parameters
+    ----------
+    energysystem : solph.EnergySystem
+        Energy system with supported components only, see `get_unsupported`.
+
+    objective_weighting : sequence
+        Weight of every timestep in the variable costs like the argument of
+        `solph.Model`. Defaults to the timeincrement.
+
+    Returns
+    -------
+    lp : dict
+        'c', 'A_ub', 'b_ub', 'A_eq', 'b_eq' and 'bounds' of the linear
+        program (min c x), the energy system and the positions of the
+        variables of every flow and storage.
+    """
+    reasons = get_unsupported(energysystem)
+    if reasons:
+        raise ValueError('The energy system can not be built as sparse LP: '
+                         '{0}.'.format(', '.join(reasons)))
+
+    n_timesteps = len(energysystem.timeindex)
+    timesteps = np.arange(n_timesteps)
+    timeincrement = np.full(n_timesteps, _get_timeincrement(energysystem.timeindex))
+    weights = (timeincrement if objective_weighting is None
+               else np.asarray(objective_weighting, dtype=float)[:n_timesteps])
+    # the capacity of the first timestep depends on the last one
+    previous = np.roll(timesteps, 1)
+
+    flows = list(energysystem.flows().items())
+    storages = [node for node in energysystem.nodes
+                if isinstance(node, solph.components.GenericStorage)]
+    invest_flows = [edge for edge, flow in flows if flow.investment is not None]
+    invest_storages = [node for node in storages if node.investment is not None]
+
+    # positions of the variables
+    flow_index = {edge: number * n_timesteps for number, (edge, _) in enumerate(flows)}
+    offset = len(flows) * n_timesteps
+    capacity_index = {node: offset + number * n_timesteps for number, node in enumerate(storages)}
+    offset += len(storages) * n_timesteps
+    invest_index = {edge: offset + number for number, edge in enumerate(invest_flows)}
+    offset += len(invest_flows)
+    invest_index.update({node: offset + number for number, node in enumerate(invest_storages)})
+    n_variables = offset + len(invest_storages)
+
+    c = np.zeros(n_variables)
+    lower = np.zeros(n_variables)
+    upper = np.full(n_variables, np.inf)
+    eq, ub = _Rows(), _Rows()
+
+    def columns(edge):
+        return flow_index[edge] + timesteps
+
+    # flows: bounds, costs and summed limits
+    for edge, flow in flows:
+        cols = columns(edge)
+        if getattr(flow, 'bidirectional', False):
+            lower[cols] = -np.inf
+        actual_value = _values(flow.actual_value, n_timesteps)
+        variable_costs = _values(flow.variable_costs, n_timesteps)
+        if variable_costs is not None:
+            c[cols] = variable_costs * weights
+
+        if flow.investment is not None:
+            invest = invest_index[edge]
+            existing = flow.investment.existing
+            lower[invest], upper[invest] = flow.investment.minimum, flow.investment.maximum
+            if flow.investment.ep_costs is not None:
+                c[invest] = flow.investment.ep_costs
+
+            if flow.fixed:
+                # the actual value may exceed max, e.g. for a profile that is
+                # not normalised, so a fixed flow gets no max and min rows
+                eq.add([(cols, 1), (invest, -actual_value)], actual_value * existing)
+            else:
+                maximum = _values(flow.max, n_timesteps)
+                ub.add([(cols, 1), (invest, -maximum)], maximum * existing)
+                minimum = _values(flow.min, n_timesteps)
+                if minimum.any():
+                    ub.add([(cols, -1), (invest, minimum)], -minimum * existing)
+            if flow.summed_max is not None:
+                ub.add_sum(np.append(cols, invest),
+                           np.append(timeincrement, -flow.summed_max),
+                           flow.summed_max * existing)
+            if flow.summed_min is not None:
+                ub.add_sum(np.append(cols, invest),
+                           np.append(-timeincrement, flow.summed_min),
+                           -flow.summed_min * existing)
+            continue
+
+        if flow.nominal_value is None:
+            continue
+        upper[cols] = _values(flow.max, n_timesteps) * flow.nominal_value
+        lower[cols] = _values(flow.min, n_timesteps) * flow.nominal_value
+        if flow.fixed and actual_value is not None:
+            lower[cols] = upper[cols] = actual_value * flow.nominal_value
+        if flow.summed_max is not None:
+            ub.add_sum(cols, timeincrement, flow.summed_max * flow.nominal_value)
+        if flow.summed_min is not None:
+            ub.add_sum(cols, -timeincrement, -flow.summed_min * flow.nominal_value)
+
+    for node in energysystem.nodes:
+        inputs = [(source, node) for source in node.inputs]
+        outputs = [(node, target) for target in node.outputs]
+
+        # balance of the buses
+        if isinstance(node, solph.Bus):
+            if getattr(node, 'balanced', True) and inputs + outputs:
+                eq.add([(columns(edge), timeincrement) for edge in inputs] +
+                       [(columns(edge), -timeincrement) for edge in outputs],
+                       np.zeros(n_timesteps))
+
+        # relation of every input and output of the transformers:
+        # flow(i, n, t) * conversion_factor(o, t) = flow(n, o, t) * conversion_factor(i, t)
+        elif type(node) is solph.Transformer:
+            factors = {bus: _values(factor, n_timesteps)
+                       for bus, factor in node.conversion_factors.items()}
+            for edge_out in outputs:
+                for edge_in in inputs:
+                    eq.add([(columns(edge_in), factors[edge_out[1]]),
+                            (columns(edge_out), -factors[edge_in[0]])],
+                           np.zeros(n_timesteps))
+
+        elif isinstance(node, solph.components.GenericStorage):
+            _add_storage(node, inputs[0], outputs[0], eq, ub, c, lower, upper,
+                         capacity_index[node] + timesteps, previous, timeincrement,
+                         invest_index, columns, n_timesteps)
+
+    A_eq, b_eq = eq.to_matrix(n_variables)
+    A_ub, b_ub = ub.to_matrix(n_variables)
+
+    return {'c': c, 'A_ub': A_ub, 'b_ub': b_ub, 'A_eq': A_eq, 'b_eq': b_eq,
+            'bounds': np.column_stack([lower, upper]),
+            'energysystem': energysystem,
+            'flows': flow_index, 'capacities': capacity_index, 'invest': invest_index}
+
+
+def _add_storage(node, edge_in, edge_out, eq, ub, c, lower, upper, cols, previous,
+                 timeincrement, invest_index, columns, n_timesteps):
+    r"""
+    Adds the variables and constraints of a generic storage.
+    """
+    capacity_loss = _values(node.capacity_loss, n_timesteps)
+    capacity_min = _values(node.capacity_min, n_timesteps)
+    capacity_max = _values(node.capacity_max, n_timesteps)
+
+    # capacity(t) = capacity(t - 1) * (1 - loss) + flow_in * eta_in - flow_out / eta_out
+    eq.add([(cols, 1),
+            (cols[previous], -(1 - capacity_loss)),
+            (columns(edge_in), -_values(node.inflow_conversion_factor, n_timesteps) *
+             timeincrement),
+            (columns(edge_out), timeincrement /
+             _values(node.outflow_conversion_factor, n_timesteps))],
+           np.zeros(n_timesteps))
+
+    if node.investment is None:
+        lower[cols] = node.nominal_capacity * capacity_min
+        upper[cols] = node.nominal_capacity * capacity_max
+        if node.initial_capacity is not None:
+            lower[cols[-1]] = upper[cols[-1]] = node.initial_capacity * node.nominal_capacity
+        return
+
+    invest = invest_index[node]
+    existing = node.investment.existing
+    upper[invest] = node.investment.maximum
+    lower[invest] = 0
+    if node.investment.ep_costs is None:
+        raise ValueError('Missing value for investment costs of {0}!'.format(node.label))
+    c[invest] = node.investment.ep_costs
+
+    if node.initial_capacity is not None:
+        eq.add([(cols[-1:], 1), (invest, -node.initial_capacity)],
+               [node.initial_capacity * existing])
+    ub.add([(cols, 1), (invest, -capacity_max)], capacity_max * existing)
+    if capacity_min.sum() > 0:
+        ub.add([(cols, -1), (invest, capacity_min)], -capacity_min * existing)
+
+    # coupling of the invested input power, output power and capacity
+    flow_in, flow_out = edge_in[0].outputs[edge_in[1]], edge_out[0].outputs[edge_out[1]]
+    if node.invest_relation_input_output is not None:
+        ratio = node.invest_relation_input_output
+        eq.add([(invest_index[edge_out], ratio), (invest_index[edge_in], -1)],
+               [flow_in.investment.existing - ratio * flow_out.investment.existing])
+    if node.invest_relation_input_capacity is not None:
+        ratio = node.invest_relation_input_capacity
+        eq.add([(invest_index[edge_in], 1), (invest, -ratio)],
+               [ratio * existing - flow_in.investment.existing])
+    if node.invest_relation_output_capacity is not None:
+        ratio = node.invest_relation_output_capacity
+        eq.add([(invest_index[edge_out], 1), (invest, -ratio)],
+               [ratio * existing - flow_out.investment.existing])
+
+
+def solve_lp(lp, **options):
+    r"""
+    Solves the linear program with HiGHS in this process.
+
+    Parameters
+    ----------
+    lp : dict
+        Return value of `build_lp`.
+
+    options :
+        Options of `scipy.optimize.linprog` with method 'highs', e.g.
+        `disp=True` to show the solver output or `time_limit`.
+
+    Returns
+    -------
+    solution : scipy.optimize.OptimizeResult
+        With the solve time as 'solve_time'.
+    """
+    starttime = time.time()
+    solution = linprog(lp['c'], A_ub=lp['A_ub'], b_ub=lp['b_ub'], A_eq=lp['A_eq'],
+                       b_eq=lp['b_eq'], bounds=lp['bounds'], method='highs',
+                       options=options or None)
+    solution.solve_time = time.time() - starttime
+
+    if solution.status != 0:
+        raise ValueError('The linear program could not be solved: {0}'.format(
+            solution.message))
+
+    return solution
+
+
+def get_results(lp, solution):
+    r"""
+    Maps the solution to the results of the energy system.
+
+    Returns
+    -------
+    results : dict
+        'main' like `outputlib.processing.results`, the flows with the
+        column 'flow', the storages (node, None) with the column 'capacity'
+        and the investments as scalar 'invest', and 'meta' like
+        `outputlib.processing.meta_results`.
+    """
+    energysystem = lp['energysystem']
+    timeindex = energysystem.timeindex
+    n_timesteps = len(timeindex)
+    x = solution.x
+
+    def scalars(key):
+        if key in lp['invest']:
+            return pd.Series({'invest': x[lp['invest'][key]]})
+        return pd.Series(dtype=float)
+
+    main = {}
+    for edge, position in lp['flows'].items():
+        main[edge] = {'scalars': scalars(edge),
+                      'sequences': pd.DataFrame({'flow': x[position:position + n_timesteps]},
+                                                index=timeindex)}
+    for node, position in lp['capacities'].items():
+        main[(node, None)] = {
+            'scalars': scalars(node),
+            'sequences': pd.DataFrame({'capacity': x[position:position + n_timesteps]},
+                                      index=timeindex)}
+
+    n_constraints = sum(matrix.shape[0] for matrix in (lp['A_eq'], lp['A_ub'])
+                        if matrix is not None)
+    n_nonzeros = sum(matrix.nnz for matrix in (lp['A_eq'], lp['A_ub']) if matrix is not None)
+    meta = {'objective': solution.fun,
+            'problem': {'Name': 'sparse_lp',
+                        'Lower bound': solution.fun,
+                        'Upper bound': solution.fun,
+                        'Number of objectives': 1,
+                        'Number of constraints': n_constraints,
+                        'Number of variables': len(x),
+                        'Number of nonzeros': n_nonzeros,
+                        'Sense': 'minimize'},
+            'solver': {'Name': 'highs (scipy.optimize.linprog)',
+                       'Status': 'ok',
+                       'Termination condition': 'optimal',
+                       'Message': solution.message,
+                       'Time': solution.solve_time}}
+
+    return {'main': main, 'meta': meta}
+
+
+def solve(energysystem, objective_weighting=None, **options):
+    r"""
+    Builds and solves the linear program and stores the results in the
+    energy system.
+
+    Returns
+    -------
+    results : dict
+        'main' and 'meta' results, see `get_results`.
+    """
+    lp = build_lp(energysystem, objective_weighting=objective_weighting)
+    logging.info('Sparse LP: {0} variables, {1} equality and {2} inequality rows.'.format(
+        len(lp['c']), 0 if lp['A_eq'] is None else lp['A_eq'].shape[0],
+        0 if lp['A_ub'] is None else lp['A_ub'].shape[0]))
+    energysystem.results = get_results(lp, solve_lp(lp, **options))
+
+    return energysystem.results
@@ -0,0 +1,255 @@
+"""
+Binary store of the input time series of all models.
+
+The models read their profiles from csv files at every start. The store
+keeps every profile under a key as a directory with one .npy file per
+column and the index, and a `meta.json` with the columns, the dtype and
+the source file. The columns are memory-mapped, so a model that needs two
+columns of the first 200 timesteps only reads these values:
+
+    data = timeseries_store.read_csv('data_input/example_wat3.csv', sep=';',
+                                     columns=['pv', 'demand_wat'], n_timesteps=200)
+
+`read_csv` is a replacement of `pd.read_csv`. It converts the csv file
+into the store at the first call and again if the size or modification
+time of the file or the read options change. Numeric columns can be stored
+as float32 to halve the size, at the cost of about 7 significant digits.
+
+"""
+
+import hashlib
+import json
+import logging
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+
+STORE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'timeseries_data')
+META_FILE = 'meta.json'
+# version of the layout of a stored time series, a time series of another
+# version is converted again by `read_csv`
+VERSION = 2
+
+
+def get_default_key(filename):
+    r"""
+    Returns the name of a file with a short hash of its absolute path, so
+    that files with the same name in different directories, e.g. the
+    results directories of System B, get different keys.
+    """
+    name = os.path.splitext(os.path.basename(filename))[0]
+    digest = hashlib.sha1(os.path.abspath(filename).encode()).hexdigest()[:8]
+
+    return '{0}_{1}'.format(name, digest)
+
+
+def _column_file(key_dir, number):
+    return os.path.join(key_dir, 'column_{0}.npy'.format(number))
+
+
+def _to_array(values, dtype):
+    if pd.api.types.is_integer_dtype(values):
+        return np.asarray(values, dtype=np.int64)
+    if pd.api.types.is_numeric_dtype(values) and not pd.api.types.is_bool_dtype(values):
+        return np.asarray(values, dtype=dtype)
+
+    return np.asarray(values).astype(str)
+
+
+def write(key, data, dtype='float64', source=None, store_dir=STORE_DIR):
+    r"""
+    Stores a time series under a key and replaces an existing one.
+
+    Parameters
+    ----------
+    key : str
+
+    data : pd.DataFrame or pd.Series
+
+    dtype : str
+        'float64' or 'float32' for the float columns. Integer columns are
+        stored as int64, other columns as strings.
+
+    source : dict
+        Description of the source, used by `read_csv` to detect changes.
+
+    Returns
+    -------
+    key_dir : path
+    """
+    if isinstance(data, pd.Series):
+        data = data.to_frame()
+
+    key_dir = os.path.join(store_dir, key)
+    # write into a new directory first, so that a parallel reader never
+    # sees a half written time series
+    tmp_dir = '{0}.tmp{1}'.format(key_dir, os.getpid())
+    if os.path.exists(tmp_dir):
+        shutil.rmtree(tmp_dir)
+    os.makedirs(tmp_dir)
+
+    for number, column in enumerate(data.columns):
+        np.save(_column_file(tmp_dir, number), _to_array(data[column], dtype))
+
+    index = data.index
+    if isinstance(index, pd.RangeIndex):
+        index_type = 'range'
+        index_info = [index.start, index.step]
+    elif isinstance(index, pd.DatetimeIndex):
+        index_type = 'datetime'
+        index_info = str(index.tz) if index.tz is not None else None
+        # an index with time zone is stored in UTC, the local time is
+        # ambiguous at the change from daylight saving time
+        if index.tz is not None:
+            index = index.tz_convert('UTC').tz_localize(None)
+        np.save(os.path.join(tmp_dir, 'index.npy'),
+                index.values.astype('datetime64[ns]').astype(np.int64))
+    else:
+        index_type = 'values'
+        index_info = None
+        np.save(os.path.join(tmp_dir, 'index.npy'), _to_array(index, 'float64'))
+
+    meta = {'key': key,
+            'version': VERSION,
+            'columns': [str(column) for column in data.columns],
+            'length': len(data),
+            'dtype': dtype,
+            'index_type': index_type,
+            'index_info': index_info,
+            'index_name': None if index.name is None else str(index.name),
+            'source': source}
+    with open(os.path.join(tmp_dir, META_FILE), 'w') as f:
+        json.dump(meta, f, indent=1)
+
+    if os.path.exists(key_dir):
+        shutil.rmtree(key_dir, ignore_errors=True)
+    try:
+        os.rename(tmp_dir, key_dir)
+    except OSError:
+        # another process stored the same time series at the same time
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    return key_dir
+
+
+def get_meta(key, store_dir=STORE_DIR):
+    r"""
+    Returns the description of a stored time series, None if the key is
+    not in the store.
+    """
+    filename = os.path.join(store_dir, key, META_FILE)
+    if not os.path.exists(filename):
+        return None
+    with open(filename, 'r') as f:
+        return json.load(f)
+
+
+def keys(store_dir=STORE_DIR):
+    r"""
+    Returns the keys of all stored time series.
+    """
+    if not os.path.exists(store_dir):
+        return []
+
+    return sorted(name for name in os.listdir(store_dir)
+                  if os.path.exists(os.path.join(store_dir, name, META_FILE)))
+
+
+def read(key, columns=None, start=0, stop=None, store_dir=STORE_DIR):
+    r"""
+    Reads columns and a range of rows of a stored time series.
+
+    Parameters
+    ----------
+    key : str
+
+    columns : list of str
+        Columns to read, all if None.
+
+    start, stop : int
+        Range of the rows, e.g. stop=number_of_time_steps.
+
+    Returns
+    -------
+    data : pd.DataFrame
+    """
+    meta = get_meta(key, store_dir)
+    if meta is None:
+        raise KeyError("There is no time series '{0}' in {1}.".format(key, store_dir))
+    key_dir = os.path.join(store_dir, key)
+
+    if columns is None:
+        columns = meta['columns']
+    missing = [column for column in columns if column not in meta['columns']]
+    if missing:
+        raise KeyError('The time series {0} has no columns {1}.'.format(key, missing))
+
+    rows = slice(start, stop)
+    data = {}
+    for column in columns:
+        values = np.load(_column_file(key_dir, meta['columns'].index(column)), mmap_mode='r')
+        data[column] = np.array(values[rows])
+
+    start, stop, _ = rows.indices(meta['length'])
+    if meta['index_type'] == 'range':
+        first, step = meta['index_info']
+        index = pd.RangeIndex(first + start * step, first + stop * step, step)
+    else:
+        values = np.array(np.load(os.path.join(key_dir, 'index.npy'), mmap_mode='r')[start:stop])
+        if meta['index_type'] == 'datetime':
+            index = pd.DatetimeIndex(values.astype('datetime64[ns]'))
+            if meta['index_info'] is not None:
+                index = index.tz_localize('UTC').tz_convert(meta['index_info'])
+        else:
+            index = pd.Index(values)
+    index.name = meta['index_name']
+
+    return pd.DataFrame(data, index=index, columns=columns)
+
+
+def read_csv(filename, key=None, columns=None, n_timesteps=None, dtype='float64',
+             store_dir=STORE_DIR, **kwargs):
+    r"""
+    Reads a csv file through the store.
+
+    Parameters
+    ----------
+    filename : path
+
+    key : str
+        Key in the store, defaults to `get_default_key`.
+
+    columns : list of str
+        Columns to read, all if None.
+
+    n_timesteps : int
+        Number of rows to read, all if None.
+
+    dtype : str
+        'float64' or 'float32', see `write`.
+
+    kwargs
+        Options of `pd.read_csv`, e.g. sep=';'.
+
+    Returns
+    -------
+    data : pd.DataFrame
+    """
+    if key is None:
+        key = get_default_key(filename)
+    source = {'filename': os.path.abspath(filename),
+              'size': os.path.getsize(filename),
+              'mtime': os.path.getmtime(filename),
+              'options': json.loads(json.dumps(kwargs, sort_keys=True, default=str))}
+
+    meta = get_meta(key, store_dir)
+    if (meta is None or meta.get('version') != VERSION or meta['source'] != source or
+            meta['dtype'] != dtype):
+        logging.info('Store {0} as time series {1}.'.format(filename, key))
+        write(key, pd.read_csv(filename, **kwargs), dtype=dtype, source=source,
+              store_dir=store_dir)
+
+    return read(key, columns=columns, stop=n_timesteps, store_dir=store_dir)